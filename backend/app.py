@@ -1,24 +1,54 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, abort, current_app, jsonify, request, send_file, send_from_directory, stream_with_context
 from flask_migrate import Migrate
-from models import db, Road, Contractor, Milestone, Photo, User, Notification, RoadStats,AccessibilitySetting
-from utils import sort_and_search_roads, calculate_road_stats, format_currency, format_date
-from datetime import datetime
+from models import db, Road, Contractor, Milestone, Photo, User, Notification, AccessibilitySetting, road_query, road_contractor
+from models import ROAD_SUMMARY_ROWS, ROAD_DETAIL_ROWS, CONTRACTOR_ROWS, PHOTO_ROWS, NOTIFICATION_ROWS, row_dicts, road_detail_dicts
+from utils import format_currency, format_date, encode_cursor, decode_cursor, like_pattern, RoadIndex
+from benchmarks import bench
+from bulk import import_roads, read_csv, read_ndjson
+from streaming import stream_json, json_parts, wants_ndjson, YIELD_PER
+from config import config
+from cache import CachedPayload, payload_cache, payload_response, response_cache
+from geometry import lod_level, build_lod, bounding_box, boundary_ring, GridIndex, LineMetricsCache, MERU_BOUNDARY
+from serialization import FastJSONProvider
+from suggest import SuggestIndex, KINDS as SUGGEST_KINDS
+from tiles import tile_cache, tile_bounds, encode_layer, road_tile_features, MAX_ZOOM as MAX_TILE_ZOOM
+import click
+import compression
+import database
+import events
+import media
+import notifications
+import routing
+import search
+import stats
+import versions
+from sqlalchemy import func, tuple_
+from datetime import datetime, date
+from functools import partial
 from flask_cors import CORS
+import json
+import math
 import os
+import time
+
+api = Blueprint('api', __name__, cli_group=None)
+migrate = Migrate(include_object=search.include_object)
 
-app = Flask(__name__)
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'meru_roads.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-CORS(app)
-db.init_app(app)
-migrate = Migrate(app, db)
+# In-process index of sortable road columns, loaded on first use.
+# Each worker keeps its own copy, updates it after its own road writes and
+# rebuilds it when another process changes roads (see versions.py).
+road_index = RoadIndex()
+spatial_index = GridIndex()
+road_metrics = LineMetricsCache(boundary_ring(MERU_BOUNDARY))
+suggestions = SuggestIndex()
 
 # CLI command to initialize database
-@app.cli.command('initdb')
+@api.cli.command('initdb')
 def init_db():
     """Initialize the database with sample data"""
     db.create_all()
+    with db.engine.begin() as connection:
+        search.install(connection)
     
     # Create sample contractors
     contractors = [
@@ -105,47 +135,240 @@ def init_db():
     ]
     
     # Add all to session and commit
+    # Road inserts are tallied into the live RoadStats row once committed
     db.session.add_all(contractors + milestones + roads + photos + [admin_user] + notifications)
     db.session.commit()
-    
-    # Calculate and save stats
-    stats_data = calculate_road_stats(Road.query.all())
-    road_stats = RoadStats(
-        total_roads=stats_data['total_roads'],
-        completed_roads=stats_data['completed_roads'],
-        in_progress_roads=stats_data['in_progress_roads'],
-        planned_roads=stats_data['planned_roads'],
-        budget_allocated=stats_data['budget_allocated'],
-        budget_spent=stats_data['budget_spent']
-    )
-    db.session.add(road_stats)
-    db.session.commit()
+    stats.stats_worker.flush()
     
     print("Database initialized with sample data")
 
+@api.cli.command('snapshot-stats')
+def snapshot_stats():
+    """Record the live road statistics as a history snapshot"""
+    snapshot = stats.snapshot_road_stats()
+    print("No live statistics to snapshot" if snapshot is None else f"Snapshot {snapshot.id} recorded")
+
+@api.cli.command('compact-stats')
+@click.option('--keep-days', default=30, help='Keep every snapshot newer than this many days')
+def compact_stats(keep_days):
+    """Keep one statistics snapshot per day for history older than --keep-days"""
+    removed = stats.compact_road_stats(keep_days)
+    print(f"Removed {removed} statistics snapshots")
+
+@api.cli.command('reconcile-stats')
+@click.option('--fix', is_flag=True, help='Overwrite the live totals with the recomputed values')
+def reconcile_stats(fix):
+    """Verify incremental road statistics against a full recompute"""
+    mismatches = stats.reconcile_road_stats(fix=fix)
+    if not mismatches:
+        print("Road statistics are consistent")
+        return
+    for field, (live, expected) in mismatches.items():
+        print(f"{field}: live={live} expected={expected}")
+    if fix:
+        print("Live statistics corrected")
+    else:
+        raise SystemExit(1)
+
+@api.cli.command('reconcile-unread')
+@click.option('--fix', is_flag=True, help='Overwrite the counters with the recounted values')
+def reconcile_unread(fix):
+    """Verify per-user unread notification counters against a recount"""
+    mismatches = notifications.reconcile_unread(fix=fix)
+    if not mismatches:
+        print("Unread counters are consistent")
+        return
+    for user_id, (counter, expected) in mismatches.items():
+        print(f"user {user_id}: counter={counter} expected={expected}")
+    if fix:
+        print("Unread counters corrected")
+    else:
+        raise SystemExit(1)
+
+@api.cli.command('generate-thumbnails')
+def generate_thumbnails():
+    """Make thumbnails for uploaded photos that have none, e.g. after the upload backlog was full"""
+    # Photos sharing content share one stored original, so one URL per hash gives its extension
+    pending = (db.session.query(Photo.content_hash, func.min(Photo.url))
+               .filter(Photo.content_hash.isnot(None), Photo.srcset.is_(None))
+               .group_by(Photo.content_hash))
+    hashes = []
+    for content_hash, url in pending.all():
+        if media.thumbnail_queue.resubmit(content_hash, os.path.splitext(url)[1]):
+            hashes.append(content_hash)
+    # Waits for every queued job
+    media.thumbnail_queue.shutdown()
+    count = Photo.query.filter(Photo.content_hash.in_(hashes), Photo.srcset.isnot(None)).count() if hashes else 0
+    print(f"Made thumbnails for {count} photos")
+
+@api.cli.command('simplify-road-geometry')
+@click.option('--all', 'rebuild_all', is_flag=True, help='Recompute every road, not only those missing levels')
+def simplify_road_geometry(rebuild_all):
+    """Store simplified per-zoom geometry for roads written before it existed"""
+    query = Road.query.filter(Road.map_coordinates.isnot(None))
+    if not rebuild_all:
+        query = query.filter(Road.map_coordinates_lod.is_(None))
+    count = 0
+    for road in query.yield_per(YIELD_PER):
+        road.map_coordinates_lod = build_lod(road.map_coordinates)
+        count += 1
+    db.session.commit()
+    print(f"Simplified geometry for {count} roads")
+
+@api.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Create the full-text search index if missing and re-index every road, contractor and milestone"""
+    with db.engine.begin() as connection:
+        search.install(connection)
+        search.rebuild(connection)
+    print("Search index rebuilt")
+
 # ========================
 # ROADS ENDPOINTS
 # ========================
-@app.route('/api/roads', methods=['GET'])
+ROADS_PAGE_SIZE = 100
+ROADS_MAX_PAGE_SIZE = 1000
+
+# Columns clients may sort on; each is paired with Road.id so keyset pages are stable
+ROAD_SORT_COLUMNS = {
+    'name': Road.name,
+    'length': Road.length,
+    'budget': Road.budget,
+    'status': Road.status,
+    'start_date': Road.start_date,
+    'end_date': Road.end_date,
+    'progress': Road.progress
+}
+
+def coerce_sort_value(column, value):
+    """Convert a query-string or cursor value to the column's Python type"""
+    python_type = column.type.python_type
+    if python_type is date:
+        return date.fromisoformat(value) if isinstance(value, str) else value
+    return python_type(value)
+
+@api.route('/api/roads', methods=['GET'])
 def get_roads():
-    roads = Road.query.all()
     search_query = request.args.get('search')
     sort_by = request.args.get('sort', 'name')
     reverse = request.args.get('order', 'asc') == 'desc'
+    view = request.args.get('view', 'detail')
+    limit = max(1, min(request.args.get('limit', ROADS_PAGE_SIZE, type=int), ROADS_MAX_PAGE_SIZE))
+    
+    sort_column = ROAD_SORT_COLUMNS.get(sort_by)
+    if sort_column is None:
+        return jsonify({'error': f'Cannot sort by {sort_by}'}), 400
+    if view not in ('summary', 'detail'):
+        return jsonify({'error': f'Unknown view {view}'}), 400
+    
+    query = Road.query
+    if search_query:
+        if sort_by in ['name', 'status']:
+            # For string fields, use partial matching
+            query = query.filter(sort_column.ilike(like_pattern(search_query), escape='\\'))
+        else:
+            # For numeric and date fields, use exact match
+            try:
+                query = query.filter(sort_column == coerce_sort_value(sort_column, search_query))
+            except ValueError:
+                return jsonify([])
+    
+    after = request.args.get('after')
+    if after:
+        try:
+            last_value, last_id = decode_cursor(after)
+            last_value = coerce_sort_value(sort_column, last_value)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        position = tuple_(sort_column, Road.id)
+        boundary = tuple_(last_value, last_id)
+        query = query.filter(position < boundary if reverse else position > boundary)
+    
+    if reverse:
+        query = query.order_by(sort_column.desc(), Road.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Road.id.asc())
+    
+    # Peek at the keys of the page's last row and the row after it, so the
+    # cursor header is known before the body starts streaming
+    headers = {}
+    edge = query.with_entities(sort_column, Road.id).offset(limit - 1).limit(2).all()
+    if len(edge) > 1:
+        headers['X-Next-Cursor'] = encode_cursor(*edge[0])
+    
+    # Plain column rows: no ORM objects are built for a page of roads
+    if view == 'summary':
+        rows = query.with_entities(*ROAD_SUMMARY_ROWS.columns).limit(limit).yield_per(YIELD_PER)
+        roads = row_dicts(rows, ROAD_SUMMARY_ROWS)
+    else:
+        rows = query.with_entities(*ROAD_DETAIL_ROWS.columns).limit(limit).yield_per(YIELD_PER)
+        roads = road_detail_dicts(db.session, rows, YIELD_PER)
+    return stream_json(roads, headers=headers)
+
+@api.route('/api/roads/range', methods=['GET'])
+def get_roads_in_range():
+    field = request.args.get('field', 'budget')
+    reverse = request.args.get('order', 'asc') == 'desc'
     
-    result = sort_and_search_roads(roads, sort_by, search_query, reverse)
+    column = ROAD_SORT_COLUMNS.get(field)
+    if column is None:
+        return jsonify({'error': f'Cannot query range of {field}'}), 400
     
-    if isinstance(result, Road):  # Single road from search
-        return jsonify([result.serialize()])
+    try:
+        low = request.args.get('min')
+        high = request.args.get('max')
+        low = coerce_sort_value(column, low) if low is not None else None
+        high = coerce_sort_value(column, high) if high is not None else None
+    except ValueError:
+        return jsonify({'error': 'Invalid range bounds'}), 400
     
-    return jsonify([road.serialize() for road in result])
+    ids = get_road_index().range(field, low, high, reverse)
+    rows = db.session.query(*ROAD_DETAIL_ROWS.columns).filter(Road.id.in_(ids)) if ids else ()
+    roads = {road['id']: road for road in road_detail_dicts(db.session, rows, YIELD_PER)}
+    return jsonify([roads[road_id] for road_id in ids if road_id in roads])
 
-@app.route('/api/roads/<int:road_id>', methods=['GET'])
+@api.route('/api/roads/geometry-report', methods=['GET'])
+def get_geometry_report():
+    """Surveyed length, bounding box and share inside the county boundary for every road"""
+    min_difference = request.args.get('min_difference', type=float)
+    rows = db.session.query(Road.id, Road.name, Road.length).order_by(Road.id).all()
+    metrics = get_road_metrics().get_many([row.id for row in rows], load_road_coordinates)
+    
+    def serialize(row):
+        measured = metrics[row.id]
+        report = {'id': row.id, 'name': row.name, 'length': row.length,
+                  'measured_length': None, 'length_difference': None, 'bbox': None, 'inside_boundary': None}
+        if measured is not None:
+            report['measured_length'] = round(measured['length'], 3)
+            report['length_difference'] = round(measured['length'] - row.length, 3) if row.length is not None else None
+            report['bbox'] = measured['bbox']
+            report['inside_boundary'] = round(measured['inside_share'], 4) if measured['inside_share'] is not None else None
+        return report
+    
+    if min_difference is not None:
+        rows = [row for row in rows if metrics[row.id] is not None and row.length is not None
+                and abs(metrics[row.id]['length'] - row.length) >= min_difference]
+    return stream_json(rows, serialize)
+
+@api.route('/api/roads/<int:road_id>', methods=['GET'])
 def get_road(road_id):
-    road = Road.query.get_or_404(road_id)
-    return jsonify(road.serialize())
+    # road_detail aborts with 404 for unknown ids, so only real roads are counted;
+    # counted outside the cache so cached hits still rank roads in suggestions
+    response = road_detail(road_id=road_id)
+    suggestions.record_view(road_id)
+    stats.view_counter.record(road_id)
+    return response
+
+@response_cache.cached('road:{road_id}', 'roads')
+def road_detail(road_id):
+    rows = db.session.query(*ROAD_DETAIL_ROWS.columns).filter(Road.id == road_id)
+    road = next(road_detail_dicts(db.session, rows), None)
+    if road is None:
+        abort(404)
+    return jsonify(road)
 
-@app.route('/api/roads', methods=['POST'])
+@api.route('/api/roads', methods=['POST'])
 def create_road():
     data = request.json
     required_fields = ['name', 'length', 'budget', 'status', 'start_date', 'end_date', 'description']
@@ -153,17 +376,20 @@ def create_road():
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    new_road = Road(
-        name=data['name'],
-        length=data['length'],
-        budget=data['budget'],
-        status=data['status'],
-        start_date=datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        end_date=datetime.strptime(data['end_date'], '%Y-%m-%d'),
-        progress=data.get('progress', 0),
-        description=data['description'],
-        map_coordinates=data.get('map_coordinates')
-    )
+    try:
+        new_road = Road(
+            name=data['name'],
+            length=data['length'],
+            budget=data['budget'],
+            status=data['status'],
+            start_date=datetime.strptime(data['start_date'], '%Y-%m-%d'),
+            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d'),
+            progress=data.get('progress') or 0,
+            description=data['description'],
+            map_coordinates=data.get('map_coordinates')
+        )
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     
     # Handle contractors
     for contractor_id in data.get('contractor_ids', []):
@@ -177,15 +403,40 @@ def create_road():
         if milestone:
             new_road.milestones.append(milestone)
     
+    contractor_ids = [contractor.id for contractor in new_road.contractors]
     db.session.add(new_road)
     db.session.commit()
-    
-    # Update stats
-    update_road_stats()
+    after_road_commit(new_road, contractor_ids)
     
     return jsonify(new_road.serialize()), 201
 
-@app.route('/api/roads/<int:road_id>/progress', methods=['PATCH'])
+@api.route('/api/roads/bulk', methods=['POST'])
+def bulk_import_roads():
+    content_type = request.mimetype
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        rows = read_ndjson(request.stream)
+    elif content_type == 'text/csv':
+        rows = read_csv(request.stream)
+    else:
+        return jsonify({'error': 'Send application/x-ndjson or text/csv'}), 415
+    
+    batch_size = request.args.get('batch_size', current_app.config['BULK_IMPORT_BATCH_SIZE'], type=int)
+    batch_size = max(1, min(batch_size, 5000))
+    
+    def generate():
+        summary = {'created': 0, 'updated': 0, 'error': 0}
+        for result in import_roads(rows, batch_size):
+            summary[result['status']] += 1
+            yield json.dumps(result) + '\n'
+        if summary['created'] or summary['updated']:
+            # One stats refresh and index reload for the whole import
+            stats.stats_worker.request_recompute()
+            after_bulk_road_commit()
+        yield json.dumps({'summary': summary}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api.route('/api/roads/<int:road_id>/progress', methods=['PATCH'])
 def update_road_progress(road_id):
     road = Road.query.get_or_404(road_id)
     data = request.json
@@ -199,24 +450,56 @@ def update_road_progress(road_id):
     
     road.progress = new_progress
     db.session.commit()
-    
-    # Update stats
-    update_road_stats()
+    after_road_commit(road)
     
     return jsonify(road.serialize())
 
+# ========================
+# SEARCH
+# ========================
+SEARCH_MAX_RESULTS = 100
+
+@api.route('/api/search', methods=['GET'])
+def search_everything():
+    """Ranked full-text matches over road names and descriptions, contractors and milestones"""
+    query = request.args.get('q', '').strip()
+    if not search.search_terms(query):
+        return jsonify({'error': 'q is required'}), 400
+    kinds = request.args.get('type')
+    if kinds:
+        kinds = kinds.split(',')
+        unknown = [kind for kind in kinds if kind not in search.KINDS]
+        if unknown:
+            return jsonify({'error': f"Unknown type {', '.join(unknown)}"}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), SEARCH_MAX_RESULTS))
+    return jsonify(search.search(db.session, query, kinds, limit))
+
+SUGGEST_MAX_RESULTS = 20
+
+@api.route('/api/suggest', methods=['GET'])
+def suggest_names():
+    """Typeahead matches for road, contractor and place names, served from memory"""
+    kinds = request.args.get('type')
+    kinds = kinds.split(',') if kinds else SUGGEST_KINDS
+    unknown = [kind for kind in kinds if kind not in SUGGEST_KINDS]
+    if unknown:
+        return jsonify({'error': f"Unknown type {', '.join(unknown)}"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), SUGGEST_MAX_RESULTS))
+    return jsonify(get_suggest_index().suggest(request.args.get('q', ''), limit, kinds))
+
 # ========================
 # CONTRACTORS ENDPOINTS
 # ========================
-@app.route('/api/contractors', methods=['GET'])
+@api.route('/api/contractors', methods=['GET'])
+@response_cache.cached('contractors')
 def get_contractors():
-    contractors = Contractor.query.all()
-    return jsonify([contractor.serialize() for contractor in contractors])
+    rows = db.session.query(*CONTRACTOR_ROWS.columns).order_by(Contractor.id).yield_per(YIELD_PER)
+    return stream_json(row_dicts(rows, CONTRACTOR_ROWS))
 
 # ========================
 # PHOTOS ENDPOINTS
 # ========================
-@app.route('/api/roads/<int:road_id>/photos', methods=['POST'])
+@api.route('/api/roads/<int:road_id>/photos', methods=['POST'])
 def add_road_photo(road_id):
     road = Road.query.get_or_404(road_id)
     data = request.json
@@ -232,22 +515,77 @@ def add_road_photo(road_id):
     
     db.session.add(new_photo)
     db.session.commit()
+    response_cache.invalidate(f'road:{road_id}', 'photos')
+    return jsonify(new_photo.serialize()), 201
+
+@api.route('/api/roads/<int:road_id>/photos/upload', methods=['POST'])
+def upload_road_photo(road_id):
+    """Store a photo sent as the raw request body; its srcset is filled in once thumbnails are made"""
+    road = Road.query.get_or_404(road_id)
+    max_bytes = current_app.config['MEDIA_MAX_UPLOAD_BYTES']
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Photos are limited to {max_bytes // (1024 * 1024)} MB'}), 413
+    
+    try:
+        upload = media.receive_upload(request.stream, current_app.config['MEDIA_SPOOL_DIR'], max_bytes)
+    except media.UploadTooLarge as error:
+        return jsonify({'error': str(error)}), 413
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    try:
+        url = media.thumbnail_queue.store(upload)
+        # The same picture uploaded before already has its thumbnails
+        srcset = media.known_srcset(db.session, upload.content_hash)
+        new_photo = Photo(
+            url=url,
+            caption=request.args.get('caption', ''),
+            road=road,
+            content_hash=upload.content_hash,
+            srcset=srcset
+        )
+        db.session.add(new_photo)
+        db.session.commit()
+    except BaseException:
+        os.remove(upload.path)
+        raise
+    response_cache.invalidate(f'road:{road_id}', 'photos')
+    
+    if srcset is None:
+        # Queued after the commit so the job finds the photo when it finishes
+        media.thumbnail_queue.submit(upload.content_hash, upload.extension, upload.path)
+    else:
+        os.remove(upload.path)
     return jsonify(new_photo.serialize()), 201
 
+# Stored media never changes under its content-addressed key
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+@api.route('/api/media/<path:key>', methods=['GET'])
+def get_media(key):
+    if current_app.config['MEDIA_STORAGE'] != 'local':
+        abort(404)
+    response = send_from_directory(current_app.config['MEDIA_ROOT'], key, max_age=MEDIA_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
 # ========================
 # STATS ENDPOINTS
 # ========================
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
 def get_road_stats():
-    stats = RoadStats.query.order_by(RoadStats.last_updated.desc()).first()
-    if not stats:
+    live_stats = stats.get_live_stats()
+    if not live_stats:
         return jsonify({'error': 'No statistics available'}), 404
     
-    return jsonify(stats.serialize())
+    payload = live_stats.serialize()
+    payload['staleness'] = stats.stats_worker.staleness()
+    # Totals move with every stats flush, so this is built per request; the ETag still allows 304s
+    return payload_response(CachedPayload(current_app.json.dumps(payload).encode('utf-8'), 'application/json', None))
 # ========================
 # ADDITIONAL ENDPOINTS
 # ========================
-@app.route('/api/user', methods=['GET'])
+@api.route('/api/user', methods=['GET'])
 def get_current_user():
     # In real app, you'd get user from session
     admin_user = User.query.filter_by(email="admin@meruroads.co.ke").first()
@@ -255,49 +593,212 @@ def get_current_user():
         return jsonify({"error": "User not found"}), 404
     return jsonify(admin_user.serialize())
 
-@app.route('/api/notifications', methods=['GET'])
+@api.route('/api/notifications', methods=['GET'])
 def get_notifications():
     user = User.query.filter_by(email="admin@meruroads.co.ke").first()
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    notifications = Notification.query.filter_by(user_id=user.id, is_read=False).all()
-    return jsonify([n.serialize() for n in notifications])
+    rows = db.session.query(*NOTIFICATION_ROWS.columns).filter_by(user_id=user.id, is_read=False)
+    return jsonify(list(row_dicts(rows, NOTIFICATION_ROWS)))
+
+NOTIFICATIONS_PAGE_SIZE = 50
+NOTIFICATIONS_MAX_PAGE_SIZE = 200
 
-@app.route('/api/photos', methods=['GET'])
+# Ids accepted by one mark-read call
+NOTIFICATIONS_READ_BATCH_LIMIT = 1000
+
+@api.route('/api/notifications/unread-count', methods=['GET'])
+def get_unread_count():
+    """Badge count read from the user's maintained counter"""
+    unread = (db.session.query(User.unread_notifications)
+              .filter_by(email="admin@meruroads.co.ke").scalar())
+    if unread is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify({'unread': unread})
+
+@api.route('/api/notifications/history', methods=['GET'])
+def get_notification_history():
+    """All notifications newest first, a keyset page at a time"""
+    user = User.query.filter_by(email="admin@meruroads.co.ke").first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    limit = max(1, min(request.args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int), NOTIFICATIONS_MAX_PAGE_SIZE))
+    
+    query = db.session.query(*NOTIFICATION_ROWS.columns).filter(Notification.user_id == user.id)
+    after = request.args.get('after')
+    if after:
+        try:
+            last_id, = decode_cursor(after)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(Notification.id < last_id)
+    
+    page = list(row_dicts(query.order_by(Notification.id.desc()).limit(limit + 1), NOTIFICATION_ROWS))
+    headers = {}
+    if len(page) > limit:
+        del page[limit:]
+        headers['X-Next-Cursor'] = encode_cursor(page[-1]['id'])
+    return jsonify(page), 200, headers
+
+@api.route('/api/notifications/read', methods=['POST'])
+def mark_notifications_read():
+    """Mark a batch of notifications read by id list and/or a `before` id watermark"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    before = data.get('before')
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    if len(ids) > NOTIFICATIONS_READ_BATCH_LIMIT:
+        return jsonify({'error': f'At most {NOTIFICATIONS_READ_BATCH_LIMIT} ids per request'}), 400
+    if before is not None and (not isinstance(before, int) or isinstance(before, bool)):
+        return jsonify({'error': 'before must be an integer'}), 400
+    if not ids and before is None:
+        return jsonify({'error': 'Provide ids or before'}), 400
+    
+    user = User.query.filter_by(email="admin@meruroads.co.ke").first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    marked = notifications.mark_read(db.session, user.id, ids, before)
+    unread = notifications.unread_count(db.session, user.id)
+    db.session.commit()
+    return jsonify({'marked': marked, 'unread': unread})
+
+# Missed notifications replayed to a resuming stream; older gaps need a full reload
+NOTIFICATION_REPLAY_LIMIT = 500
+
+@api.route('/api/notifications/stream', methods=['GET'])
+def stream_notifications():
+    """Server-Sent Events carrying each new notification as it is committed"""
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    user = User.query.filter_by(email="admin@meruroads.co.ke").first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    # Subscribe before reading the backlog so nothing committed in between is lost
+    subscription = events.broker.subscribe(events.notification_topic(user.id))
+    if subscription is None:
+        return jsonify({'error': 'Too many open streams'}), 503, {'Retry-After': '5'}
+    replay = []
+    if last_event_id is not None:
+        rows = (db.session.query(*NOTIFICATION_ROWS.columns)
+                .filter(Notification.user_id == user.id, Notification.id > last_event_id)
+                .order_by(Notification.id).limit(NOTIFICATION_REPLAY_LIMIT))
+        replay = list(row_dicts(rows, NOTIFICATION_ROWS))
+    
+    dumps = current_app.json.dumps
+    last_sent = [last_event_id or 0]
+    
+    def render(notification):
+        # Rows committed during the replay query arrive twice
+        if notification['id'] <= last_sent[0]:
+            return None
+        last_sent[0] = notification['id']
+        return events.sse_event(notification, dumps, notification['id'], 'notification')
+    
+    # Not stream_with_context: the request's database session is released before streaming starts
+    stream = events.event_stream(events.broker, subscription, render, replay, current_app.config['SSE_HEARTBEAT_S'])
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # A HEAD request, or a client gone before the first byte, never starts the stream, so its finally never runs
+    response.call_on_close(partial(events.broker.unsubscribe, subscription))
+    return response
+
+@api.route('/api/roads/events', methods=['GET'])
+def stream_road_events():
+    """Server-Sent Events carrying batched road progress/status changes and stats deltas"""
+    subscription = events.broker.subscribe(events.ROADS_TOPIC)
+    if subscription is None:
+        return jsonify({'error': 'Too many open streams'}), 503, {'Retry-After': '5'}
+    events.road_events.watch()
+    # Deltas are not kept, so a resuming client refetches what it missed
+    replay = [(None, {'reload': True})] if 'Last-Event-ID' in request.headers else []
+    dumps = current_app.json.dumps
+    
+    def render(item):
+        sequence, message = item
+        return events.sse_event(message, dumps, sequence, 'roads')
+    
+    stream = events.event_stream(events.broker, subscription, render, replay, current_app.config['SSE_HEARTBEAT_S'])
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(partial(events.broker.unsubscribe, subscription))
+    return response
+
+def photo_list_tags():
+    # Parsed so ?road_id=01 is tagged road:1, the tag writers invalidate
+    road_id = request.args.get('road_id', type=int)
+    return [f'road:{road_id}'] if road_id is not None else ['photos']
+
+@api.route('/api/photos', methods=['GET'])
+@response_cache.cached(photo_list_tags)
 def get_photos():
-    road_id = request.args.get('road_id')
-    if road_id:
-        photos = Photo.query.filter_by(road_id=road_id).all()
+    road_id = request.args.get('road_id', type=int)
+    if road_id is None and request.args.get('road_id'):
+        return jsonify({'error': 'road_id must be an integer'}), 400
+    rows = db.session.query(*PHOTO_ROWS.columns)
+    if road_id is not None:
+        rows = rows.filter_by(road_id=road_id).yield_per(YIELD_PER)
     else:
-        photos = Photo.query.limit(6).all()
-    return jsonify([p.serialize() for p in photos])
+        rows = rows.limit(6)
+    return stream_json(row_dicts(rows, PHOTO_ROWS))
 
-@app.route('/api/map/roads', methods=['GET'])
+@api.route('/api/map/roads', methods=['GET'])
 def get_map_roads():
-    roads = Road.query.all()
-    features = []
-    for road in roads:
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "id": road.id,
-                "name": road.name,
-                "status": road.status,
-                "progress": road.progress
-            },
-            "geometry": {
-                "type": "LineString",
-                "coordinates": road.map_coordinates
-            }
-        })
+    level = lod_level(request.args.get('zoom', type=int))
+    profile = 'map' if level is None else 'map_lod'
+    serialize = partial(Road.serialize_feature, zoom=level)
     
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": features
-    })
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            bbox = tuple(float(value) for value in bbox.split(','))
+        except ValueError:
+            bbox = ()
+        # float() also accepts inf and nan, which no grid cell range can cover
+        if len(bbox) != 4 or not all(map(math.isfinite, bbox)) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify({'error': 'bbox must be minx,miny,maxx,maxy'}), 400
+        ids = get_spatial_index().query(bbox)
+        roads = roads_by_ids(road_query(profile), ids)
+        if wants_ndjson():
+            return stream_json(roads, serialize)
+        return stream_json(roads, serialize, envelope={"type": "FeatureCollection"}, key="features")
+    
+    if wants_ndjson():
+        roads = road_query(profile).yield_per(YIELD_PER)
+        return stream_json(roads, serialize)
+    
+    def build():
+        roads = road_query(profile).yield_per(YIELD_PER)
+        return ''.join(json_parts(roads, serialize, envelope={"type": "FeatureCollection"}, key="features"))
+    
+    variant = 'full' if level is None else f'z{level}'
+    version = versions.tracker.current(versions.ROADS)
+    return payload_response(payload_cache.get('map_roads', variant, build, version))
 
-@app.route('/api/road/<int:road_id>/milestones', methods=['GET'])
+@api.route('/api/map/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_map_tile(z, x, y):
+    if z > MAX_TILE_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Tile out of range'}), 404
+    
+    def build():
+        ids = get_spatial_index().query(tile_bounds(z, x, y))
+        profile = 'map' if lod_level(z) is None else 'map_lod'
+        roads = roads_by_ids(road_query(profile), ids)
+        return encode_layer('roads', road_tile_features(roads, z, x, y))
+    
+    path = tile_cache.get(versions.tracker.current(versions.ROADS), z, x, y, build)
+    return send_file(path, mimetype='application/vnd.mapbox-vector-tile', conditional=True, max_age=60)
+
+@api.route('/api/road/<int:road_id>/milestones', methods=['GET'])
+@response_cache.cached('road:{road_id}', 'roads')
 def get_road_milestones(road_id):
     road = Road.query.get_or_404(road_id)
     return jsonify({
@@ -332,12 +833,13 @@ def init_db():
 # HELPER FUNCTIONS
 # ========================
 
-@app.route('/api/contractors/<int:contractor_id>', methods=['GET'])
+@api.route('/api/contractors/<int:contractor_id>', methods=['GET'])
+@response_cache.cached('contractor:{contractor_id}')
 def get_contractor(contractor_id):
     contractor = Contractor.query.get_or_404(contractor_id)
     return jsonify(contractor.serialize())
 
-@app.route('/api/contractors', methods=['POST'])
+@api.route('/api/contractors', methods=['POST'])
 def create_contractor():
     data = request.get_json()
     name = data.get('name')
@@ -358,6 +860,7 @@ def create_contractor():
 
     db.session.add(contractor)
     db.session.commit()
+    after_contractor_commit(contractor)
 
     return jsonify(contractor.serialize()), 201
 
@@ -365,21 +868,112 @@ def create_contractor():
 
 
 
-def update_road_stats():
-    roads = Road.query.all()
-    stats_data = calculate_road_stats(roads)
-    
-    new_stats = RoadStats(
-        total_roads=stats_data['total_roads'],
-        completed_roads=stats_data['completed_roads'],
-        in_progress_roads=stats_data['in_progress_roads'],
-        planned_roads=stats_data['planned_roads'],
-        budget_allocated=stats_data['budget_allocated'],
-        budget_spent=stats_data['budget_spent']
-    )
-    
-    db.session.add(new_stats)
-    db.session.commit()
+# The getters read the shared version before the rows, so an index built
+# while another write commits is labelled with the older version and rebuilt.
+
+def get_road_index():
+    """Return the in-process road index, (re)loading it when the shared road data has moved on"""
+    version = versions.tracker.current(versions.ROADS)
+    if not road_index.loaded or road_index.version != version:
+        columns = [getattr(Road, column) for column in road_index.columns]
+        rows = db.session.query(Road.id, *columns)
+        road_index.build(row._asdict() for row in rows)
+        road_index.version = version
+    return road_index
+
+def get_spatial_index():
+    """Return the in-process grid of road bounding boxes, (re)loading it when the shared road data has moved on"""
+    version = versions.tracker.current(versions.ROADS)
+    if not spatial_index.loaded or spatial_index.version != version:
+        rows = db.session.query(Road.id, Road.map_coordinates).filter(Road.map_coordinates.isnot(None))
+        spatial_index.build(rows.yield_per(YIELD_PER))
+        spatial_index.version = version
+    return spatial_index
+
+def get_road_metrics():
+    """Return the in-process line metrics, emptied when the shared road data has moved on"""
+    version = versions.tracker.current(versions.ROADS)
+    if road_metrics.version != version:
+        road_metrics.clear()
+        road_metrics.version = version
+    return road_metrics
+
+def get_suggest_index():
+    """Return the in-process typeahead index, (re)loading it when the shared road data has moved on"""
+    version = versions.tracker.current(versions.ROADS)
+    if not suggestions.loaded or suggestions.version != version:
+        suggestions.build(
+            db.session.query(Road.id, Road.name, Road.view_count).yield_per(YIELD_PER),
+            db.session.query(Contractor.id, Contractor.name),
+            db.session.query(road_contractor.c.road_id, road_contractor.c.contractor_id).yield_per(YIELD_PER)
+        )
+        suggestions.version = version
+        suggestions.views_read = time.monotonic()
+    elif time.monotonic() - suggestions.views_read >= current_app.config['SUGGEST_VIEWS_REFRESH_S']:
+        # Views counted by other workers change no version, so they are read on a timer
+        suggestions.update_views(stats.load_view_counts(db.session))
+        suggestions.views_read = time.monotonic()
+    return suggestions
+
+def roads_by_ids(query, ids, chunk_size=YIELD_PER):
+    """Yield roads for ids with one IN query per chunk, keeping bind counts bounded"""
+    for start in range(0, len(ids), chunk_size):
+        yield from query.filter(Road.id.in_(ids[start:start + chunk_size])).order_by(Road.id)
+
+def load_road_coordinates(ids):
+    """(road_id, coordinates) pairs for ids, fetched in chunked IN queries"""
+    return roads_by_ids(db.session.query(Road.id, Road.map_coordinates), ids)
+
+def advance(index, version):
+    """Move index to the version this worker's commit made if it held the version just before.
+
+    Returns True if the caller should apply the write in place. An index
+    already rebuilt at that version is left alone; one further behind missed
+    another process's write and is rebuilt on next use.
+    """
+    if version is not None and index.version == version:
+        return False
+    if version is not None and index.version == version - 1:
+        index.version = version
+        return True
+    index.version = None
+    return False
+
+def after_road_commit(road, contractor_ids=None):
+    """Keep in-process road indexes and cached payloads current after a road write commits"""
+    version = versions.committed(db.session, versions.ROADS)
+    if advance(road_index, version):
+        road_index.upsert(road)
+    if advance(suggestions, version):
+        suggestions.upsert_road(road.id, road.name, contractor_ids)
+    if advance(spatial_index, version):
+        old_box = spatial_index.upsert(road.id, road.map_coordinates)
+        # Only tiles the road covered before or covers now carry stale properties
+        tile_cache.advance(version - 1, version, [old_box, bounding_box(road.map_coordinates)])
+    if advance(road_metrics, version):
+        road_metrics.discard(road.id)
+    response_cache.invalidate(f'road:{road.id}')
+
+def after_contractor_commit(contractor):
+    """Keep in-process indexes and cached payloads current after a contractor write commits"""
+    version = versions.committed(db.session, versions.ROADS)
+    # Contractors only feed suggestions; the other indexes hold the same rows at the new version
+    for index in (road_index, spatial_index, road_metrics):
+        advance(index, version)
+    if advance(suggestions, version):
+        suggestions.upsert_contractor(contractor.id, contractor.name)
+    response_cache.invalidate('contractors', f'contractor:{contractor.id}')
+
+def after_bulk_road_commit():
+    """Drop in-process road indexes and cached payloads after many roads changed"""
+    road_index.loaded = False
+    spatial_index.loaded = False
+    suggestions.loaded = False
+    road_metrics.clear()
+    response_cache.invalidate('roads')
+    events.road_events.reload()
+
+
 
 from flask import Blueprint, request, jsonify
 from models import db, User
@@ -424,14 +1018,14 @@ def delete_user(user_id):
     db.session.commit()
     return jsonify({'message': 'User deleted'})
 
-@app.route('/api/accessibility/<int:user_id>', methods=['GET'])
+@api.route('/api/accessibility/<int:user_id>', methods=['GET'])
 def get_accessibility_settings(user_id):
     settings = AccessibilitySetting.query.filter_by(user_id=user_id).first()
     if not settings:
         return jsonify({'error': 'Settings not found'}), 404
     return jsonify(settings.serialize())
 
-@app.route('/api/accessibility/<int:user_id>', methods=['POST'])
+@api.route('/api/accessibility/<int:user_id>', methods=['POST'])
 def update_accessibility_settings(user_id):
     data = request.get_json()
     settings = AccessibilitySetting.query.filter_by(user_id=user_id).first()
@@ -447,82 +1041,62 @@ def update_accessibility_settings(user_id):
     db.session.commit()
     return jsonify(settings.serialize())
 
-@app.route('/api/map/meru-boundary', methods=['GET'])
-def get_meru_boundary():
-    """Return GeoJSON for Meru County boundary"""
-    meru_boundary = {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "properties": {
-                    "name": "Meru County",
-                    "id": "meru-county"
-                },
-                "geometry": {
-                    "type": "Polygon",
-                    "coordinates": [
-                        [
-                            # Simplified boundary coordinates for Meru County
-                            [37.5, 0.25],   # North-West
-                            [38.2, 0.25],   # North-East
-                            [38.2, -0.25],  # South-East
-                            [37.5, -0.25],  # South-West
-                            [37.5, 0.25]    # Back to North-West
-                        ]
-                    ]
-                }
-            }
-        ]
-    }
-    return jsonify(meru_boundary)
-
-@app.route('/api/map/meru-boundary', methods=['GET'])
+@api.route('/api/map/meru-boundary', methods=['GET'])
 def get_meru_boundary():
     """Return GeoJSON for Meru County boundary"""
-    meru_boundary = {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "properties": {
-                    "name": "Meru County",
-                    "id": "meru-county",
-                    "area": "6936 km²",
-                    "population": "1.5 million"
-                },
-                "geometry": {
-                    "type": "Polygon",
-                    "coordinates": [
-                        [
-                            # Actual approximate coordinates for Meru County
-                            [37.550, 0.050],  # Meru town area
-                            [37.850, 0.400],  # North
-                            [38.150, 0.350],  # North-East
-                            [38.250, 0.100],  # East
-                            [38.150, -0.150], # South-East
-                            [37.850, -0.250], # South
-                            [37.600, -0.200], # South-West
-                            [37.450, -0.050], # West
-                            [37.550, 0.050]   # Close polygon
-                        ]
-                    ]
-                }
-            }
-        ]
-    }
-    return jsonify(meru_boundary)
+    return payload_response(payload_cache.get('meru_boundary', 'all', lambda: current_app.json.dumps(MERU_BOUNDARY)))
+
+# ========================
+# METRICS
+# ========================
+@api.route('/api/metrics/db-pool', methods=['GET'])
+def get_db_pool_metrics():
+    """Connection pool usage and checkout waits for this worker process"""
+    return jsonify({'pid': os.getpid(), 'engines': database.pool_metrics()})
 
 # ========================
 # ERROR HANDLERS
 # ========================
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Resource not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def server_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+# ========================
+# APPLICATION FACTORY
+# ========================
+def create_app(config_object=config):
+    """Build the app from a config class; the pool is sized per process"""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(config_object)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database.engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config))
+    app.config.setdefault('SQLALCHEMY_BINDS', {
+        key: {'url': url, **database.engine_options(url, app.config)}
+        for key, url in routing.replica_binds(app.config['DATABASE_REPLICA_URLS']).items()
+    })
+    CORS(app, expose_headers=['X-Next-Cursor'])
+    db.init_app(app)
+    database.init_app(app)
+    routing.init_app(app)
+    migrate.init_app(app, db)
+    app.cli.add_command(bench)
+    # Before stats and events, whose commit hooks read the version each commit made
+    versions.init_app(app)
+    stats.init_app(app)
+    events.init_app(app)
+    media.thumbnail_queue.init_app(app)
+    notifications.init_app(app)
+    compression.init_app(app)
+    response_cache.init_app(app)
+    tile_cache.root = app.config['TILE_CACHE_DIR']
+    app.register_blueprint(api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
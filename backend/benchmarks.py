@@ -0,0 +1,478 @@
+import json
+import math
+import random
+import time
+import tracemalloc
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import click
+import numpy as np
+from flask import current_app, jsonify
+from flask.json.provider import DefaultJSONProvider
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, raiseload, selectinload
+
+from compression import CODECS
+from coordinates import ENCODINGS, LineCoordinates, coordinates_to_list, encode_coordinates
+from geometry import EARTH_RADIUS_KM, boundary_ring, line_metrics
+import search
+from models import (db, Contractor, Milestone, Photo, Road, road_contractor, road_milestone,
+                    ROAD_SUMMARY_ROWS, ROAD_DETAIL_ROWS, PHOTO_ROWS, row_dicts, road_detail_dicts)
+from streaming import YIELD_PER, stream_json
+from suggest import SuggestIndex
+from utils import RoadIndex
+
+bench = AppGroup('bench', help='Micro-benchmarks for backend hot paths')
+
+STATUSES = ('ongoing', 'completed', 'planned')
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+def timed(func, *args, repeat=3):
+    """Return the best wall time in milliseconds over repeat runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def fake_roads(count, seed=42):
+    """Generate lightweight road-like objects with realistic duplicate values"""
+    rng = random.Random(seed)
+    return [
+        SimpleNamespace(
+            id=i + 1,
+            name=f"Road {i:06d}",
+            length=round(rng.uniform(0.5, 40), 1),
+            budget=rng.randrange(50, 5000) * 1_000_000,
+            status=rng.choice(STATUSES),
+            start_date=None,
+            end_date=None,
+            progress=rng.randrange(0, 101)
+        )
+        for i in range(count)
+    ]
+
+
+# Reference copies of the sort/search helpers RoadIndex replaced
+def legacy_quick_sort(arr, key_func, reverse=False):
+    if len(arr) <= 1:
+        return arr
+    pivot = arr[len(arr) // 2]
+    if reverse:
+        left = [x for x in arr if key_func(x) > key_func(pivot)]
+        middle = [x for x in arr if key_func(x) == key_func(pivot)]
+        right = [x for x in arr if key_func(x) < key_func(pivot)]
+    else:
+        left = [x for x in arr if key_func(x) < key_func(pivot)]
+        middle = [x for x in arr if key_func(x) == key_func(pivot)]
+        right = [x for x in arr if key_func(x) > key_func(pivot)]
+    return legacy_quick_sort(left, key_func, reverse) + middle + legacy_quick_sort(right, key_func, reverse)
+
+
+def legacy_binary_search(arr, x, key_func):
+    low, high = 0, len(arr) - 1
+    while low <= high:
+        mid = (high + low) // 2
+        mid_val = key_func(arr[mid])
+        if mid_val < x:
+            low = mid + 1
+        elif mid_val > x:
+            high = mid - 1
+        else:
+            return arr[mid]
+    return None
+
+
+@bench.command('road-index')
+@click.option('--sizes', default='1000,10000,100000', help='Comma-separated road counts')
+def bench_road_index(sizes):
+    """Compare RoadIndex against the legacy quick_sort/binary_search helpers"""
+    key_func = lambda road: road.budget
+    click.echo(f"{'roads':>8} {'operation':<28} {'legacy ms':>10} {'index ms':>10}")
+    for size in parse_sizes(sizes):
+        roads = fake_roads(size)
+        index = RoadIndex()
+        index.build(roads)
+        legacy_sorted = legacy_quick_sort(roads, key_func)
+        low, high = 500_000_000, 600_000_000
+        target = roads[size // 2].budget
+
+        rows = [
+            ('sort by budget',
+             timed(legacy_quick_sort, roads, key_func),
+             timed(index.build, roads)),
+            ('exact budget lookup',
+             timed(legacy_binary_search, legacy_sorted, target, key_func),
+             timed(index.range, 'budget', target, target)),
+            ('budget between X and Y',
+             timed(lambda: [r for r in legacy_quick_sort(roads, key_func) if low <= r.budget <= high]),
+             timed(index.range, 'budget', low, high)),
+            ('single progress update',
+             timed(legacy_quick_sort, roads, key_func),
+             timed(index.upsert, roads[0])),
+        ]
+        for operation, legacy_ms, index_ms in rows:
+            click.echo(f"{size:>8} {operation:<28} {legacy_ms:>10.3f} {index_ms:>10.3f}")
+        matches = len(index.range('budget', target, target))
+        click.echo(f"{size:>8} {'(exact matches found)':<28} {1:>10} {matches:>10}")
+
+
+def model_roads(count, vertices=50, seed=42):
+    """Transient Road objects with a realistic description and geometry"""
+    rng = random.Random(seed)
+    roads = []
+    for i, fake in enumerate(fake_roads(count, seed)):
+        lon, lat = 37.5 + rng.random() * 0.7, -0.25 + rng.random() * 0.5
+        roads.append(Road(
+            id=fake.id, name=fake.name, length=fake.length, budget=fake.budget,
+            status=fake.status, progress=fake.progress,
+            start_date=date(2024, 1, 1), end_date=date(2025, 1, 1),
+            description='Upgrade to bitumen standard including drainage works. ' * 4,
+            map_coordinates=[[lon + j * 1e-3, lat + j * 1e-3] for j in range(vertices)]
+        ))
+    return roads
+
+
+def drain(build):
+    """Build a response and consume its body; return (first byte, total) seconds"""
+    start = time.perf_counter()
+    response = build()
+    first_byte = None
+    for _ in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+    return first_byte, time.perf_counter() - start
+
+
+def measure_response(build):
+    """Return (time to first byte ms, total ms, peak traced MiB) for a response builder"""
+    first_byte, total = drain(build)
+    # Memory is traced in a separate pass so tracing overhead does not skew timings
+    tracemalloc.start()
+    drain(build)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte * 1000, total * 1000, peak / 2 ** 20
+
+
+@bench.command('streaming')
+@click.option('--sizes', default='1000,10000,50000', help='Comma-separated road counts')
+def bench_streaming(sizes):
+    """Compare jsonify of a full list with the streamed JSON array and NDJSON bodies.
+
+    Peak memory is measured with tracemalloc (Python allocations made while
+    building and draining the response), which excludes the input rows so it
+    isolates what each mode holds on top of them.
+    """
+    click.echo(f"{'roads':>8} {'mode':<10} {'ttfb ms':>10} {'total ms':>10} {'peak MiB':>10}")
+    for size in parse_sizes(sizes):
+        roads = model_roads(size)
+        modes = [
+            ('jsonify', lambda: jsonify([road.serialize_feature() for road in roads]), '*/*'),
+            ('array', lambda: stream_json(roads, Road.serialize_feature), 'application/json'),
+            ('ndjson', lambda: stream_json(roads, Road.serialize_feature), 'application/x-ndjson'),
+        ]
+        for mode, build, accept in modes:
+            with current_app.test_request_context(headers={'Accept': accept}):
+                ttfb, total, peak = measure_response(build)
+            click.echo(f"{size:>8} {mode:<10} {ttfb:>10.1f} {total:>10.1f} {peak:>10.1f}")
+
+
+@bench.command('coordinates')
+@click.option('--roads', default=1000, help='Number of road geometries')
+@click.option('--vertices', default=500, help='Vertices per road')
+def bench_coordinates(roads, vertices):
+    """Compare JSON text with packed coordinate encodings: size and decode time"""
+    rng = random.Random(42)
+    traces = []
+    for _ in range(roads):
+        lon, lat = 37.5 + rng.random() * 0.7, -0.25 + rng.random() * 0.5
+        trace = []
+        for _ in range(vertices):
+            lon += rng.uniform(-1e-4, 1e-4)
+            lat += rng.uniform(-1e-4, 1e-4)
+            trace.append([round(lon, 7), round(lat, 7)])
+        traces.append(trace)
+    total_vertices = roads * vertices
+
+    click.echo(f"{'format':<8} {'bytes/vertex':>13} {'to lists ms':>12} {'to array ms':>12}")
+    texts = [json.dumps(trace) for trace in traces]
+    to_lists = timed(lambda: [json.loads(text) for text in texts])
+    to_array = timed(lambda: [np.asarray(json.loads(text)) for text in texts])
+    size = sum(len(text) for text in texts) / total_vertices
+    click.echo(f"{'json':<8} {size:>13.1f} {to_lists:>12.1f} {to_array:>12.1f}")
+
+    for encoding in ENCODINGS:
+        blobs = [encode_coordinates(trace, encoding) for trace in traces]
+        to_lists = timed(lambda: [LineCoordinates(blob).tolist() for blob in blobs])
+        to_array = timed(lambda: [LineCoordinates(blob).array for blob in blobs])
+        size = sum(len(blob) for blob in blobs) / total_vertices
+        click.echo(f"{encoding:<8} {size:>13.1f} {to_lists:>12.1f} {to_array:>12.1f}")
+
+
+def loop_line_metrics(lines, ring):
+    """Per-vertex pure Python equivalent of geometry.line_metrics, for comparison"""
+    edges = list(zip(ring.tolist(), np.roll(ring, -1, axis=0).tolist()))
+    results = []
+    for line in lines:
+        length = inside = 0.0
+        for (lon1, lat1), (lon2, lat2) in zip(line, line[1:]):
+            a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2
+                 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+            segment = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+            x, y = (lon1 + lon2) / 2, (lat1 + lat2) / 2
+            crossings = 0
+            for (x1, y1), (x2, y2) in edges:
+                if y1 != y2 and (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    crossings += 1
+            length += segment
+            inside += segment if crossings % 2 else 0.0
+        lons = [point[0] for point in line]
+        lats = [point[1] for point in line]
+        results.append({'length': length, 'bbox': [min(lons), min(lats), max(lons), max(lats)],
+                        'inside_share': inside / length if length else None})
+    return results
+
+
+@bench.command('geometry')
+@click.option('--roads', default=50000, help='Number of road geometries')
+@click.option('--vertices', default=50, help='Vertices per road')
+@click.option('--loop-sample', default=2000, help='Roads timed with the Python loop; the total is extrapolated')
+def bench_geometry(roads, vertices, loop_sample):
+    """Compare batched numpy line metrics with a per-vertex Python loop"""
+    rng = np.random.default_rng(42)
+    origins = np.column_stack((rng.uniform(37.3, 38.4, roads), rng.uniform(-0.4, 0.5, roads)))
+    steps = rng.uniform(-1e-3, 1e-3, (roads, vertices, 2))
+    traces = origins[:, None, :] + np.cumsum(steps, axis=1)
+    ring = boundary_ring()
+
+    packed = [LineCoordinates(encode_coordinates(trace, 'f64')) for trace in traces]
+    lists = [trace.tolist() for trace in traces[:loop_sample]]
+    vectorized = timed(line_metrics, packed, ring, repeat=1)
+    loop = timed(loop_line_metrics, lists, ring, repeat=1) * roads / max(len(lists), 1)
+
+    expected = loop_line_metrics(lists[:100], ring)
+    actual = line_metrics(packed[:100], ring)
+    error = max(abs(a['length'] - b['length']) for a, b in zip(actual, expected))
+    click.echo(f"{'roads':>8} {'vertices':>9} {'numpy ms':>10} {'loop ms (est.)':>15} {'max km diff':>12}")
+    click.echo(f"{roads:>8} {vertices:>9} {vectorized:>10.1f} {loop:>15.1f} {error:>12.2e}")
+
+
+COMPRESSION_URLS = (
+    '/api/roads',
+    '/api/map/roads',
+    '/api/map/roads?zoom=9',
+    '/api/map/meru-boundary',
+    '/api/stats',
+    '/api/roads/geometry-report'
+)
+
+
+@bench.command('compression')
+@click.option('--urls', default=','.join(COMPRESSION_URLS), help='Comma-separated endpoints to request')
+@click.option('--requests', 'count', default=20, help='Requests per endpoint and encoding')
+def bench_compression(urls, count):
+    """Bytes on the wire and CPU per request for each endpoint and content encoding.
+
+    Runs against the configured database, so load representative data first
+    (e.g. with POST /api/roads/bulk). The first request per encoding is not
+    timed, which lets cached endpoints show their repeat-hit cost.
+    """
+    client = current_app.test_client()
+    click.echo(f"{'endpoint':<30} {'encoding':<9} {'bytes':>10} {'ratio':>7} {'cpu ms/req':>11}")
+    for url in urls.split(','):
+        identity_size = None
+        for encoding in ('identity', *CODECS):
+            headers = {'Accept-Encoding': encoding}
+            response = client.get(url, headers=headers)
+            size = len(response.get_data())
+            response.close()
+            if response.status_code != 200:
+                click.echo(f"{url:<30} {encoding:<9} {'HTTP ' + str(response.status_code):>10}")
+                break
+            sent = response.headers.get('Content-Encoding', 'identity')
+            identity_size = identity_size or size
+            start = time.process_time()
+            for _ in range(count):
+                client.get(url, headers=headers).close()
+            cpu = (time.process_time() - start) * 1000 / count
+            click.echo(f"{url:<30} {sent:<9} {size:>10} {size / identity_size:>7.2f} {cpu:>11.2f}")
+
+
+PLACES = ('Meru', 'Maua', 'Nkubu', 'Timau', 'Chuka', 'Mitunguu', 'Kianjai', 'Laare', 'Muthara', 'Kangeta',
+          'Githongo', 'Kibirichia', 'Makutano', 'Gatimbi', 'Kanyakine', 'Igembe', 'Tigania', 'Imenti')
+ROAD_KINDS = ('Road', 'Highway', 'Bypass', 'Link', 'Access Road', 'Feeder Road')
+SYLLABLES = ('ka', 'ki', 'ma', 'mu', 'ne', 'ri', 'ta', 'to', 'ga', 'gi', 'ru', 'ny', 'ba', 'la', 'se', 'wa')
+
+
+def word_list(rng, count, syllables=3):
+    return sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, syllables))) for _ in range(count)})
+
+
+@bench.command('search')
+@click.option('--docs', default=100000, help='Number of roads indexed (plus 1% contractors and milestones each)')
+@click.option('--runs', default=100, help='Timed runs per query')
+def bench_search(docs, runs):
+    """Full-text search latency over a generated in-memory SQLite database.
+
+    Descriptions draw words Zipf-style from a few thousand terms, like real
+    prose, so common words match a large share of documents and rare ones
+    a handful. Ranking cost grows with the number of matches, which the
+    hits column below does not show (it is capped by the page size).
+    """
+    rng = random.Random(42)
+    places = PLACES + tuple(name.title() for name in word_list(rng, 400))
+    vocabulary = word_list(rng, 5000, 4)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        db.metadata.create_all(connection)
+        search.install(connection)
+        roads = []
+        for i in range(docs):
+            ends = rng.sample(places, 2)
+            words = rng.choices(vocabulary, weights, k=25) + rng.sample(places, 2)
+            roads.append({
+                'name': f'{ends[0]}-{ends[1]} {rng.choice(ROAD_KINDS)} {i}', 'length': 1.0, 'budget': 1,
+                'status': 'planned', 'start_date': date(2024, 1, 1), 'end_date': date(2025, 1, 1),
+                'description': ' '.join(rng.sample(words, len(words)))
+            })
+        connection.execute(insert(Road), roads)
+        connection.execute(insert(Contractor), [{'name': f'{rng.choice(places)} Builders {i}', 'contact_email': 'x'} for i in range(docs // 100)])
+        connection.execute(insert(Milestone), [{'name': f'{rng.choice(vocabulary).title()} {i}', 'description': ' '.join(rng.sample(vocabulary, 6))} for i in range(docs // 100)])
+        search.rebuild(connection)
+
+    queries = ['maua', 'kian', 'meru highway', places[100], vocabulary[1], vocabulary[300][:3], f'{vocabulary[40]} {places[50]}', 'builders', 'zzz']
+    click.echo(f"{'query':<20} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    with Session(engine) as session:
+        for query in queries:
+            matches = search.search(session, query, limit=docs)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                search.search(session, query, limit=20)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            click.echo(f"{query:<20} {len(matches):>8} {timings[len(timings) // 2]:>8.2f} {timings[int(len(timings) * 0.99)]:>8.2f}")
+
+
+@bench.command('suggest')
+@click.option('--roads', default=100000, help='Number of road names indexed (plus 1% contractors)')
+@click.option('--queries', default=5000, help='Timed lookups per prefix length')
+def bench_suggest(roads, queries):
+    """Typeahead lookup latency by prefix length, plus the cost of an incremental write"""
+    rng = random.Random(42)
+    places = PLACES + tuple(name.title() for name in word_list(rng, 400))
+    contractors = [(i, f'{rng.choice(places)} Builders {i}') for i in range(1, roads // 100 + 1)]
+    names = [(i, f'{"-".join(rng.sample(places, 2))} {rng.choice(ROAD_KINDS)} {i}', rng.randint(0, 50))
+             for i in range(1, roads + 1)]
+    links = [(road_id, rng.choice(contractors)[0]) for road_id, _, _ in names]
+    index = SuggestIndex()
+    start = time.perf_counter()
+    index.build(names, contractors, links)
+    click.echo(f'build: {len(index)} names in {time.perf_counter() - start:.2f}s')
+
+    click.echo(f"{'prefix':<10} {'p50 ms':>8} {'p99 ms':>8}")
+    for length in (1, 2, 3, 5):
+        prefixes = [rng.choice(places)[:length] for _ in range(queries)]
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.suggest(prefix)
+            timings.append((time.perf_counter() - start) * 1000)
+            if rng.random() < 0.05:
+                # Writes land between reads and keep cached top lists current
+                index.record_view(rng.randint(1, roads))
+        timings.sort()
+        click.echo(f"{length} chars{'':<3} {timings[len(timings) // 2]:>8.3f} {timings[int(len(timings) * 0.99)]:>8.3f}")
+
+    timings = []
+    for i in range(200):
+        start = time.perf_counter()
+        index.upsert_road(roads + i + 1, f'{"-".join(rng.sample(places, 2))} Road {roads + i + 1}', [1])
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    click.echo(f"upsert_road: p50 {timings[100]:.3f} ms  p99 {timings[198]:.3f} ms")
+
+
+# How get_roads loaded and serialized ORM rows before it read plain column rows
+LEGACY_DETAIL_OPTIONS = (selectinload(Road.contractors), selectinload(Road.milestones), selectinload(Road.photos), raiseload('*'))
+
+def legacy_summary(road):
+    return {
+        'id': road.id,
+        'name': road.name,
+        'length': road.length,
+        'budget': road.budget,
+        'status': road.status,
+        'start_date': str(road.start_date),
+        'end_date': str(road.end_date),
+        'progress': road.progress
+    }
+
+@bench.command('serialization')
+@click.option('--roads', default=5000, help='Roads in the generated database')
+@click.option('--photos', default=4, help='Photos per road')
+@click.option('--vertices', default=50, help='Vertices per road geometry')
+def bench_serialization(roads, photos, vertices):
+    """Rows/sec for the get_roads and get_photos bodies: ORM serialize() + stdlib json vs column rows + orjson"""
+    rng = random.Random(42)
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        db.metadata.create_all(connection)
+        connection.execute(insert(Contractor), [{'name': f'Contractor {i}', 'contact_email': 'x@y'} for i in range(20)])
+        connection.execute(insert(Milestone), [{'name': f'Milestone {i}', 'description': 'Phase'} for i in range(5)])
+        road_rows = [
+            {'id': road.id + 1, 'name': road.name, 'length': road.length, 'budget': road.budget, 'status': road.status,
+             'start_date': road.start_date, 'end_date': road.end_date, 'progress': road.progress,
+             'description': road.description, 'map_coordinates': coordinates_to_list(road.map_coordinates)}
+            for road in model_roads(roads, vertices)
+        ]
+        connection.execute(insert(Road), road_rows)
+        connection.execute(insert(road_contractor), [{'road_id': i, 'contractor_id': rng.randint(1, 20)} for i in range(1, roads + 1)])
+        connection.execute(insert(road_milestone), [{'road_id': i, 'milestone_id': m} for i in range(1, roads + 1) for m in range(1, 4)])
+        connection.execute(insert(Photo), [
+            {'url': f'https://example.com/{i}.jpg', 'caption': 'Site visit', 'date_taken': datetime(2025, 1, 1, 9, 30), 'road_id': i % roads + 1}
+            for i in range(roads * photos)
+        ])
+
+    legacy_dumps = DefaultJSONProvider(current_app._get_current_object()).dumps
+    dumps = current_app.json.dumps
+    paths = {
+        'get_roads detail': (
+            lambda session: (legacy_dumps(road.serialize()) for road in
+                             session.query(Road).options(*LEGACY_DETAIL_OPTIONS).order_by(Road.name, Road.id).yield_per(YIELD_PER)),
+            lambda session: (dumps(road) for road in road_detail_dicts(
+                session, session.query(*ROAD_DETAIL_ROWS.columns).order_by(Road.name, Road.id).yield_per(YIELD_PER), YIELD_PER)),
+        ),
+        'get_roads summary': (
+            lambda session: (legacy_dumps(legacy_summary(road)) for road in
+                             session.query(Road).options(raiseload('*')).order_by(Road.name, Road.id).yield_per(YIELD_PER)),
+            lambda session: (dumps(road) for road in row_dicts(
+                session.query(*ROAD_SUMMARY_ROWS.columns).order_by(Road.name, Road.id).yield_per(YIELD_PER), ROAD_SUMMARY_ROWS)),
+        ),
+        'get_photos': (
+            lambda session: (legacy_dumps(photo.serialize()) for photo in session.query(Photo).yield_per(YIELD_PER)),
+            lambda session: (dumps(photo) for photo in row_dicts(session.query(*PHOTO_ROWS.columns).yield_per(YIELD_PER), PHOTO_ROWS)),
+        ),
+    }
+    click.echo(f"{'endpoint':<20} {'rows':>7} {'before rows/s':>14} {'after rows/s':>13} {'speedup':>8}")
+    for name, (before, after) in paths.items():
+        rates = []
+        for path in (before, after):
+            best = math.inf
+            for _ in range(3):
+                with Session(engine) as session:
+                    start = time.perf_counter()
+                    count = sum(1 for _ in path(session))
+                    best = min(best, time.perf_counter() - start)
+            rates.append(count / best)
+        click.echo(f"{name:<20} {count:>7} {rates[0]:>14,.0f} {rates[1]:>13,.0f} {rates[1] / rates[0]:>7.1f}x")
@@ -0,0 +1,246 @@
+import csv
+import json
+import math
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from coordinates import normalize_coordinates, validate_coordinates
+from geometry import build_lod
+from models import db, Road, Contractor, Milestone, road_contractor, road_milestone
+import versions
+
+REQUIRED_FIELDS = ['name', 'length', 'budget', 'status', 'start_date', 'end_date', 'description']
+
+# Every insert row carries the same keys so the whole batch is one executemany
+ROAD_COLUMNS = REQUIRED_FIELDS + ['progress', 'map_coordinates', 'map_coordinates_lod']
+
+
+def parse_string(value):
+    if not isinstance(value, str):
+        raise ValueError('Expected a string')
+    return value
+
+
+def parse_integer(value):
+    """Whole numbers only: 1900 and "1900.0" pass, 1.9 is an error rather than 1"""
+    if isinstance(value, bool):
+        raise ValueError('Expected an integer')
+    if isinstance(value, int):
+        return value
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError('Expected an integer')
+    if not number.is_finite() or number != number.to_integral_value():
+        raise ValueError('Expected an integer')
+    return int(number)
+
+
+def parse_length(value):
+    """Kilometres: a finite number that is not negative, so NaN never reaches the NOT NULL column"""
+    if isinstance(value, bool):
+        raise ValueError('Expected a number')
+    length = float(value)
+    if not math.isfinite(length) or length < 0:
+        raise ValueError('Expected a non-negative number')
+    return length
+
+
+ROW_PARSERS = {
+    'name': parse_string,
+    'length': parse_length,
+    'budget': parse_integer,
+    'status': parse_string,
+    'start_date': lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+    'end_date': lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+    'progress': parse_integer,
+    'description': parse_string,
+    'map_coordinates': lambda value: validate_coordinates(
+        normalize_coordinates(json.loads(value) if isinstance(value, str) else value))
+}
+
+
+def read_ndjson(stream):
+    """Yield (line_number, dict) pairs from a newline-delimited JSON byte stream"""
+    for line_number, raw_line in enumerate(stream, start=1):
+        raw_line = raw_line.strip()
+        if not raw_line:
+            continue
+        try:
+            data = json.loads(raw_line)
+        except ValueError:
+            yield line_number, ValueError('Invalid JSON')
+            continue
+        yield line_number, data if isinstance(data, dict) else ValueError('Expected a JSON object')
+
+
+def read_csv(stream):
+    """Yield (line_number, dict) pairs from a CSV byte stream with a header row.
+
+    contractor_ids and milestone_ids are ';'-separated; map_coordinates is JSON.
+    Bytes that are not UTF-8 make their row an error instead of ending the stream.
+    """
+    lines = (raw_line.decode('utf-8', errors='replace') for raw_line in stream)
+    reader = csv.DictReader(lines)
+    for data in reader:
+        if any('\ufffd' in text for item in data.items() for text in item if isinstance(text, str)):
+            yield reader.line_num, ValueError('Invalid UTF-8')
+            continue
+        data = {key: value for key, value in data.items() if value not in (None, '')}
+        for key in ('contractor_ids', 'milestone_ids'):
+            if key in data:
+                data[key] = [item for item in data[key].split(';') if item.strip()]
+        yield reader.line_num, data
+
+
+def parse_road_row(data, existing):
+    """Validate one input row; return (values, contractor_ids, milestone_ids)"""
+    if not data.get('name'):
+        raise ValueError('Missing required fields')
+    if not isinstance(data['name'], str):
+        raise ValueError('Invalid name')
+    if data['name'] not in existing:
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    values = {}
+    for field, parse in ROW_PARSERS.items():
+        if field in data:
+            try:
+                values[field] = parse(data[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {field}')
+    if not 0 <= values.get('progress', 0) <= 100:
+        raise ValueError('Progress must be between 0 and 100')
+    if 'map_coordinates' in values:
+        # Bulk statements bypass Road's validator, so simplify here
+        values['map_coordinates_lod'] = build_lod(values['map_coordinates'])
+    try:
+        contractor_ids = [int(i) for i in data['contractor_ids']] if 'contractor_ids' in data else None
+        milestone_ids = [int(i) for i in data['milestone_ids']] if 'milestone_ids' in data else None
+    except (TypeError, ValueError):
+        raise ValueError('Invalid contractor or milestone ids')
+    return values, contractor_ids, milestone_ids
+
+
+def existing_ids(model, ids):
+    """Resolve a batch of ids with a single IN query"""
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(model.id).where(model.id.in_(ids))))
+
+
+def replace_links(table, column, links):
+    """Replace association rows for the given roads with one DELETE and one executemany"""
+    road_ids = list(links)
+    if not road_ids:
+        return
+    db.session.execute(delete(table).where(table.c.road_id.in_(road_ids)))
+    rows = [{'road_id': road_id, column: other_id} for road_id, ids in links.items() for other_id in ids]
+    if rows:
+        db.session.execute(insert(table), rows)
+
+
+def import_batch(batch):
+    """Upsert one batch of (line_number, data) rows; return one result dict per row"""
+    results = {}
+    # Other name values are rejected row by row in parse_road_row
+    names = [data['name'] for _, data in batch if isinstance(data, dict) and isinstance(data.get('name'), str)]
+    existing = dict(db.session.execute(select(Road.name, Road.id).where(Road.name.in_(names))).all()) if names else {}
+
+    parsed = []
+    seen = set()
+    for line_number, data in batch:
+        try:
+            if isinstance(data, Exception):
+                raise data
+            values, contractor_ids, milestone_ids = parse_road_row(data, existing)
+            if values['name'] in seen:
+                raise ValueError('Duplicate name in batch')
+            seen.add(values['name'])
+            parsed.append((line_number, values, contractor_ids, milestone_ids))
+        except ValueError as error:
+            results[line_number] = {'line': line_number, 'status': 'error', 'error': str(error)}
+
+    contractors = existing_ids(Contractor, {i for _, _, ids, _ in parsed for i in ids or ()})
+    milestones = existing_ids(Milestone, {i for _, _, _, ids in parsed for i in ids or ()})
+
+    try:
+        road_ids = write_rows(parsed, existing, contractors, milestones)
+        if parsed:
+            # Bulk statements skip the flush hook that bumps the version
+            versions.touch(db.session, versions.ROADS)
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        written = import_rows_singly(parsed, existing, contractors, milestones, results)
+    else:
+        written = [(row, road_ids) for row in parsed]
+    for (line_number, values, _, _), road_ids in written:
+        status = 'updated' if values['name'] in existing else 'created'
+        results[line_number] = {'line': line_number, 'status': status, 'id': road_ids[values['name']]}
+    return [results[line_number] for line_number, _ in batch]
+
+
+def import_rows_singly(parsed, existing, contractors, milestones, results):
+    """Write each row in its own savepoint after a batch failed, so the good rows
+    still land and each bad one reports its own database error"""
+    written = []
+    for row in parsed:
+        try:
+            with db.session.begin_nested():
+                road_ids = write_rows([row], existing, contractors, milestones)
+            written.append((row, road_ids))
+        except SQLAlchemyError as error:
+            results[row[0]] = {'line': row[0], 'status': 'error', 'error': str(getattr(error, 'orig', error))}
+    try:
+        if written:
+            versions.touch(db.session, versions.ROADS)
+        db.session.commit()
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        for (line_number, _, _, _), _ in written:
+            results[line_number] = {'line': line_number, 'status': 'error', 'error': type(error).__name__}
+        return []
+    return written
+
+
+def write_rows(parsed, existing, contractors, milestones):
+    """Insert or update parsed rows and replace their links; return {name: road_id}"""
+    inserts = [values for _, values, _, _ in parsed if values['name'] not in existing]
+    updates = [values for _, values, _, _ in parsed if values['name'] in existing]
+    road_ids = dict(existing)
+    if inserts:
+        rows = [{column: values.get(column) for column in ROAD_COLUMNS} for values in inserts]
+        for row in rows:
+            row['progress'] = row['progress'] or 0
+        created = db.session.execute(insert(Road).returning(Road.id, Road.name), rows)
+        road_ids.update({name: road_id for road_id, name in created})
+    if updates:
+        db.session.execute(update(Road), [dict(values, id=existing[values['name']]) for values in updates])
+
+    contractor_links = {}
+    milestone_links = {}
+    for _, values, contractor_ids, milestone_ids in parsed:
+        road_id = road_ids[values['name']]
+        if contractor_ids is not None:
+            contractor_links[road_id] = [i for i in dict.fromkeys(contractor_ids) if i in contractors]
+        if milestone_ids is not None:
+            milestone_links[road_id] = [i for i in dict.fromkeys(milestone_ids) if i in milestones]
+    replace_links(road_contractor, 'contractor_id', contractor_links)
+    replace_links(road_milestone, 'milestone_id', milestone_links)
+    return road_ids
+
+
+def import_roads(rows, batch_size):
+    """Import (line_number, data) rows in batches, yielding each row's result as it lands"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield from import_batch(batch)
@@ -0,0 +1,301 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request
+
+from compression import COMPRESSIBLE_MIMETYPES, compress, negotiate_encoding
+from streaming import wants_ndjson
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class CachedPayload:
+    """A fully encoded response body with its strong ETag and compressed copies"""
+
+    __slots__ = ('body', 'etag', 'mimetype', 'version', 'compressed')
+
+    def __init__(self, body, mimetype, version, etag=None, compressed=None):
+        self.body = body
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.mimetype = mimetype
+        self.version = version
+        self.compressed = compressed or {}
+
+    def encoded(self, encoding):
+        """Body compressed with encoding, compressed on first request and kept with the payload"""
+        data = self.compressed.get(encoding)
+        if data is None:
+            data = self.compressed[encoding] = compress(self.body, encoding, cached=True)
+        return data
+
+
+class PayloadCache:
+    """Pre-serialized payloads tagged with the version of the data they were built from.
+
+    Callers pass the current version of the payload's source data, e.g. the
+    shared road version from versions.py, which moves whichever worker
+    writes. Readers get the stored bytes back with no database work until
+    it moves. Read the version before the rows a payload is built from: a
+    write landing in between then leaves an entry tagged older than its
+    contents, which the next read rebuilds.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, variant, build, version=0, mimetype='application/json'):
+        """Return the cached payload for (namespace, variant), building it if not at version.
+
+        build returns the body as str or bytes.
+        """
+        entry = self._entries.get((namespace, variant))
+        if entry is not None and entry.version == version:
+            return entry
+        body = build()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        entry = CachedPayload(body, mimetype, version)
+        with self._lock:
+            self._entries[(namespace, variant)] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+def payload_response(payload):
+    """Serve a cached payload, answering If-None-Match with 304 Not Modified"""
+    encoding = None
+    if payload.mimetype in COMPRESSIBLE_MIMETYPES:
+        encoding = negotiate_encoding(len(payload.body))
+    if encoding is None:
+        response = Response(payload.body, mimetype=payload.mimetype)
+        response.set_etag(payload.etag)
+    else:
+        response = Response(payload.encoded(encoding), mimetype=payload.mimetype)
+        response.headers['Content-Encoding'] = encoding
+        # Each representation needs its own strong ETag
+        response.set_etag(f'{payload.etag}-{encoding}')
+    if payload.mimetype in COMPRESSIBLE_MIMETYPES:
+        response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+class MemoryBackend:
+    """Per-process LRU of payloads with a TTL; each tag maps to the keys it covers"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, payload, tags, ttl):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (payload, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class RedisPayload(CachedPayload):
+    """A payload read from Redis that writes each compressed copy back to its entry"""
+
+    __slots__ = ('_backend', '_key')
+
+    def __init__(self, backend, key, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._backend = backend
+        self._key = key
+
+    def encoded(self, encoding):
+        if encoding not in self.compressed:
+            self._backend.store_encoding(self._key, encoding, super().encoded(encoding))
+        return self.compressed[encoding]
+
+
+class RedisBackend:
+    """Payloads shared by every worker in Redis; each tag is a Redis set of the keys it covers.
+
+    An entry is a hash of the body, its mimetype and ETag, and an
+    'encoded:<encoding>' field for each compressed copy made so far, so a
+    body is compressed once per encoding for all workers.
+    """
+
+    ENCODED_PREFIX = b'encoded:'
+    # Adds the field only while the entry exists, so an encoding written just
+    # after the entry expired never leaves a stray hash behind. Plain EXISTS
+    # and HSET, unlike EXPIRE ... NX, work on every Redis version.
+    STORE_ENCODING_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            return redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        end
+        return 0
+    """
+
+    def __init__(self, url, prefix='meru:response:'):
+        if redis is None:
+            raise RuntimeError('RESPONSE_CACHE_URL is set but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self._store_encoding = self._client.register_script(self.STORE_ENCODING_SCRIPT)
+        self.prefix = prefix
+
+    def _tag_key(self, tag):
+        return f'{self.prefix}tag:{tag}'
+
+    def get(self, key):
+        fields = self._client.hgetall(self.prefix + key)
+        body = fields.get(b'body')
+        if body is None:
+            return None
+        compressed = {
+            name[len(self.ENCODED_PREFIX):].decode(): data for name, data in fields.items()
+            if name.startswith(self.ENCODED_PREFIX)
+        }
+        etag = fields.get(b'etag')
+        return RedisPayload(self, key, body, fields[b'mimetype'].decode(), None,
+                            etag.decode() if etag else None, compressed)
+
+    def store_encoding(self, key, encoding, data):
+        self._store_encoding(keys=[self.prefix + key], args=[f'encoded:{encoding}', data])
+
+    def set(self, key, payload, tags, ttl):
+        with self._client.pipeline() as pipe:
+            pipe.delete(self.prefix + key)
+            pipe.hset(self.prefix + key, mapping={'body': payload.body, 'mimetype': payload.mimetype, 'etag': payload.etag})
+            pipe.expire(self.prefix + key, ttl)
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.expire(self._tag_key(tag), ttl)
+            pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        # Read and drop the tag sets in one transaction so keys tagged meanwhile land in fresh sets
+        with self._client.pipeline() as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            pipe.delete(*tag_keys)
+            *members, _ = pipe.execute()
+        keys = {self.prefix + key.decode() for keys in members for key in keys}
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(f'{self.prefix}*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+class ResponseCache:
+    """Whole GET responses keyed by view, arguments and query string, evicted by tag.
+
+    Views declare tags such as 'road:{road_id}' (filled from the view
+    arguments) or a callable returning tags; writers call invalidate() with
+    the tags of the entities they changed after committing. The default
+    backend is per process, so other workers see a write when their entries
+    expire; RESPONSE_CACHE_URL shares one Redis store between all of them.
+    """
+
+    CACHEABLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 300
+        # Bumped by every invalidation, so a response built across one is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        url = app.config.get('RESPONSE_CACHE_URL')
+        self.backend = RedisBackend(url) if url else MemoryBackend(app.config['RESPONSE_CACHE_SIZE'])
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+        self.backend.invalidate(tags)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.backend.clear()
+
+    def key(self, view, kwargs):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        variant = 'ndjson' if wants_ndjson() else 'json'
+        return f"{view.__name__}:{sorted(kwargs.items())}:{args}:{variant}"
+
+    def entry_tags(self, tags, kwargs):
+        entry_tags = set()
+        for tag in tags:
+            entry_tags.update(tag(**kwargs) if callable(tag) else [tag.format(**kwargs)])
+        return entry_tags
+
+    def cached(self, *tags):
+        """Decorate a GET view so successful JSON responses are served from the cache"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not current_app.config['RESPONSE_CACHE_ENABLED'] or request.method not in ('GET', 'HEAD'):
+                    return view(**kwargs)
+                key = self.key(view, kwargs)
+                payload = self.backend.get(key)
+                if payload is None:
+                    generation = self._generation
+                    response = current_app.make_response(view(**kwargs))
+                    if response.status_code != 200 or response.mimetype not in self.CACHEABLE_MIMETYPES:
+                        return response
+                    payload = CachedPayload(response.get_data(), response.mimetype, None)
+                    if self._generation == generation:
+                        self.backend.set(key, payload, self.entry_tags(tags, kwargs), self.ttl)
+                return payload_response(payload)
+            return wrapper
+        return decorator
+
+
+payload_cache = PayloadCache()
+response_cache = ResponseCache()
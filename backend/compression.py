@@ -0,0 +1,118 @@
+"""Negotiated response compression: gzip always, brotli and zstd when installed.
+
+Cached payloads are compressed once at a high level and the bytes kept next
+to the body (see cache.CachedPayload); everything else is compressed per
+request at a cheaper level, streamed responses chunk by chunk.
+"""
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/geo+json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/html',
+    'text/plain'
+}
+
+
+def _gzip(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _brotli(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+
+
+# name: (compressor factory, per-request level, cached payload level)
+CODECS = {'gzip': (_gzip, 6, 9)}
+if brotli is not None:
+    CODECS['br'] = (_brotli, 4, 11)
+if zstandard is not None:
+    CODECS['zstd'] = (_zstd, 3, 19)
+
+
+def compress(data, encoding, cached=False):
+    """Compress bytes in one shot; cached payloads use the slower, denser level"""
+    factory, level, cached_level = CODECS[encoding]
+    write, _, finish = factory(cached_level if cached else level)
+    return write(data) + finish()
+
+
+def iter_compressed(chunks, encoding):
+    """Compress a body chunk by chunk, flushing each so clients can decode as it arrives"""
+    factory, level, _ = CODECS[encoding]
+    write, flush, finish = factory(level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield write(chunk) + flush()
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def negotiate_encoding(size=None):
+    """Best encoding the client accepts for a body of size bytes, or None to send it as-is"""
+    if size is not None and size < current_app.config.get('COMPRESSION_MIN_SIZE', 1024):
+        return None
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in current_app.config.get('COMPRESSION_ENCODINGS', ('br', 'zstd', 'gzip')):
+        # Ties go to the server's order of preference
+        if encoding in CODECS and accepted[encoding] > best_quality:
+            best, best_quality = encoding, accepted[encoding]
+    return best
+
+
+def compress_response(response):
+    """after_request hook compressing responses that were not encoded already"""
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code in (204, 206)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers
+            or response.direct_passthrough):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        encoding = negotiate_encoding()
+        if encoding is not None:
+            response.response = iter_compressed(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    encoding = negotiate_encoding(len(data))
+    if encoding is not None:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
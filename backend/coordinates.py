@@ -0,0 +1,194 @@
+"""Compact binary storage for LineString coordinates.
+
+Stored values start with one format byte:
+  0x01  little-endian float64 lon/lat pairs (16 bytes per vertex, exact)
+  0x02  little-endian float32 lon/lat pairs (8 bytes per vertex, ~0.5 m)
+  0x03  varint vertex count, then zigzag varint deltas at 1e-7 degrees
+        (typically 4-6 bytes per vertex for surveyed traces, ~1 cm)
+"""
+from collections.abc import Sequence
+
+import numpy as np
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+FLOAT64 = 1
+FLOAT32 = 2
+VARINT = 3
+
+ENCODINGS = {'f64': FLOAT64, 'f32': FLOAT32, 'varint': VARINT}
+
+VARINT_SCALE = 10_000_000
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def normalize_coordinates(value):
+    """Accept a bare coordinate list or a GeoJSON LineString geometry object"""
+    if isinstance(value, dict):
+        return value.get('coordinates')
+    return value
+
+
+def validate_coordinates(coordinates):
+    """Return coordinates if they are finite [lon, lat] degree pairs, else raise ValueError"""
+    if coordinates is None or len(coordinates) == 0:
+        return coordinates
+    try:
+        points = np.asarray(coordinates, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError('map_coordinates must be a list of [lon, lat] pairs')
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError('map_coordinates must be a list of [lon, lat] pairs')
+    if not (np.isfinite(points).all() and (np.abs(points[:, 0]) <= 180).all() and (np.abs(points[:, 1]) <= 90).all()):
+        raise ValueError('map_coordinates must be longitudes within 180 and latitudes within 90 degrees')
+    return coordinates
+
+
+def encode_coordinates(coordinates, encoding='f64'):
+    """Pack [lon, lat] pairs into bytes using the named encoding"""
+    points = np.asarray(normalize_coordinates(coordinates), dtype=float).reshape(-1, 2)
+    fmt = ENCODINGS[encoding]
+    if fmt == FLOAT64:
+        return bytes([FLOAT64]) + points.astype('<f8').tobytes()
+    if fmt == FLOAT32:
+        return bytes([FLOAT32]) + points.astype('<f4').tobytes()
+    fixed = np.round(points * VARINT_SCALE).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=[[0, 0]]).ravel()
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    out = bytearray([VARINT])
+    out += _varint(len(points))
+    for value in zigzag.tolist():
+        out += _varint(value)
+    return bytes(out)
+
+
+def decode_array(data):
+    """Decode packed bytes to an (n, 2) float64 array; zero-copy for float64 rows"""
+    fmt = data[0]
+    if fmt == FLOAT64:
+        return np.frombuffer(data, dtype='<f8', offset=1).reshape(-1, 2)
+    if fmt == FLOAT32:
+        return np.frombuffer(data, dtype='<f4', offset=1).astype(np.float64).reshape(-1, 2)
+    if fmt == VARINT:
+        count, offset = _read_varint(data, 1)
+        if count == 0:
+            return np.empty((0, 2))
+        raw = np.frombuffer(data, dtype=np.uint8, offset=offset)
+        # Vectorized varint decode: split on terminating bytes, OR shifted 7-bit groups
+        ends = np.flatnonzero(raw < 0x80)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        position = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+        groups = (raw & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+        values = np.bitwise_or.reduceat(groups, starts).astype(np.int64)
+        deltas = (values >> 1) ^ -(values & 1)
+        return np.cumsum(deltas.reshape(-1, 2), axis=0) / VARINT_SCALE
+    raise ValueError(f'Unknown coordinate format {fmt}')
+
+
+def vertex_count(data):
+    fmt = data[0]
+    if fmt == FLOAT64:
+        return (len(data) - 1) // 16
+    if fmt == FLOAT32:
+        return (len(data) - 1) // 8
+    return _read_varint(data, 1)[0]
+
+
+class LineCoordinates(Sequence):
+    """[lon, lat] pairs backed by packed bytes and decoded on first use.
+
+    np.asarray() gives the (n, 2) float64 array directly, so geometry code
+    never builds nested Python lists; tolist() produces GeoJSON output.
+    """
+
+    __slots__ = ('data', '_array')
+
+    def __init__(self, data):
+        self.data = data
+        self._array = None
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = decode_array(self.data)
+        return self._array
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None or np.dtype(dtype) == self.array.dtype else self.array.astype(dtype)
+
+    def __len__(self):
+        return vertex_count(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.array[index].tolist()
+        return self.array[index].tolist()
+
+    def __eq__(self, other):
+        if isinstance(other, LineCoordinates):
+            return self.data == other.data
+        if isinstance(other, (list, tuple)):
+            return self.tolist() == [list(point) for point in other]
+        return NotImplemented
+
+    def __repr__(self):
+        return f'LineCoordinates({len(self)} vertices)'
+
+    def tolist(self):
+        return self.array.tolist()
+
+
+def coordinates_to_list(value):
+    """GeoJSON-ready nested lists for either packed or plain coordinates"""
+    return value.tolist() if isinstance(value, LineCoordinates) else value
+
+
+class PackedCoordinates(TypeDecorator):
+    """Stores LineString coordinates as a packed BLOB instead of JSON text"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, encoding='f64'):
+        super().__init__()
+        if encoding not in ENCODINGS:
+            raise ValueError(f'Unknown coordinate encoding {encoding}')
+        self.encoding = encoding
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, LineCoordinates) and value.data[0] == ENCODINGS[self.encoding]:
+            return value.data
+        return encode_coordinates(value, self.encoding)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return LineCoordinates(bytes(value))
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return coordinates_to_list(x) == coordinates_to_list(y)
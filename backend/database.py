@@ -0,0 +1,100 @@
+"""Engine and connection pool configuration, with pool wait metrics for sizing workers"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records checkouts, timeouts and how long callers waited"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return connection
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                'pool_size': self.size(),
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_ms_avg': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'wait_ms_max': round(self.wait_max * 1000, 3)
+            }
+
+
+def is_sqlite_memory(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def engine_options(uri, config):
+    """Engine options for a database URI, sized from the DB_* and SQLITE_* config"""
+    options = {}
+    if uri.startswith('sqlite'):
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+        if is_sqlite_memory(uri):
+            # Flask-SQLAlchemy pins in-memory databases to a single StaticPool connection
+            return options
+    else:
+        options['pool_pre_ping'] = config['DB_POOL_PRE_PING']
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+    options.update(
+        poolclass=MeteredQueuePool,
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT']
+    )
+    return options
+
+
+def sqlite_pragmas(busy_timeout_ms):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside the single writer instead of blocking on it
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
+    return on_connect
+
+
+def pool_metrics():
+    """Pool metrics for each engine in this process, keyed by bind name"""
+    return {
+        bind or 'default': engine.pool.metrics() if isinstance(engine.pool, MeteredQueuePool) else {'pool': engine.pool.status()}
+        for bind, engine in db.engines.items()
+    }
+
+
+def init_app(app):
+    """Apply per-connection settings to every engine db.init_app created"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', sqlite_pragmas(app.config['SQLITE_BUSY_TIMEOUT_MS']))
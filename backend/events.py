@@ -0,0 +1,350 @@
+"""In-process pub/sub with Server-Sent Events streams.
+
+Writers publish after their transaction commits; every open stream
+subscribed to the topic gets the event. Between events a stream only blocks
+on its queue and holds no database connection, so under gevent workers
+(gunicorn -k gevent, which patches threading and queue) an idle connection
+costs one parked greenlet. Sync workers spend a thread per stream, so keep
+SSE_MAX_CONNECTIONS small there.
+
+The broker only sees commits made in its own process. While road streams
+are open, the shared roads version (versions.py) is polled too, and a move
+this process did not commit itself (another worker, a CLI command) is sent
+as a reload. Clients resume with Last-Event-ID and endpoints replay what
+they missed from the database.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+
+from models import db, Notification, Road, NOTIFICATION_ROWS
+from stats import road_stats_delta
+from utils import ROAD_STATS_FIELDS
+import versions
+
+HEARTBEAT = ': keepalive\n\n'
+
+# Sent once per stream; EventSource waits this long before reconnecting
+RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One stream's queue of events not yet sent"""
+
+    __slots__ = ('topic', 'events', 'overflowed')
+
+    def __init__(self, topic, backlog):
+        self.topic = topic
+        self.events = queue.Queue(maxsize=backlog)
+        self.overflowed = False
+
+
+class Broker:
+    """Fans events out to the subscriptions of a topic, capping open streams per process"""
+
+    def __init__(self, max_connections=1000, backlog=256):
+        self.max_connections = max_connections
+        self.backlog = backlog
+        self._topics = defaultdict(set)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_connections = app.config['SSE_MAX_CONNECTIONS']
+        self.backlog = app.config['SSE_BACKLOG']
+
+    def connections(self):
+        return self._count
+
+    def has_subscribers(self, topic):
+        return topic in self._topics
+
+    def subscribe(self, topic):
+        """New subscription to topic, or None when this process is at its stream cap"""
+        with self._lock:
+            if self._count >= self.max_connections:
+                return None
+            subscription = Subscription(topic, self.backlog)
+            self._topics[topic].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Drop a subscription; safe to call more than once"""
+        with self._lock:
+            subscriptions = self._topics.get(subscription.topic)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._topics[subscription.topic]
+            self._count -= 1
+
+    def publish(self, topic, item):
+        with self._lock:
+            subscriptions = list(self._topics.get(topic, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.events.put_nowait(item)
+            except queue.Full:
+                # A stalled client; its stream ends and it resumes from Last-Event-ID
+                subscription.overflowed = True
+
+
+def sse_event(data, dumps, event_id=None, event_type=None):
+    """One Server-Sent Events message carrying data as JSON"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event_type is not None:
+        lines.append(f'event: {event_type}')
+    lines.append(f'data: {dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(broker, subscription, render, replay=(), heartbeat=15):
+    """Yield SSE text for replayed then live events until the client disconnects.
+
+    render turns an event into message text, or None to skip it. Comments
+    are sent while idle so proxies keep the connection open and a dead
+    client is noticed on the next write.
+    """
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        for item in replay:
+            message = render(item)
+            if message is not None:
+                yield message
+        while True:
+            try:
+                item = subscription.events.get(timeout=heartbeat)
+            except queue.Empty:
+                if subscription.overflowed:
+                    return
+                yield HEARTBEAT
+                continue
+            message = render(item)
+            if message is not None:
+                yield message
+            if subscription.overflowed and subscription.events.empty():
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+# ------------------------------------------------------------------
+# Notifications
+# ------------------------------------------------------------------
+def notification_topic(user_id):
+    return f'notifications:{user_id}'
+
+
+def collect_notifications(session, flush_context):
+    # Ids and server defaults are loaded by the flush (Notification has eager_defaults)
+    created = [obj for obj in session.new if isinstance(obj, Notification)]
+    if created:
+        pending = session.info.setdefault('new_notifications', [])
+        pending.extend({field: getattr(obj, field) for field in NOTIFICATION_ROWS.fields} for obj in created)
+
+
+def publish_notifications(session):
+    for notification in session.info.pop('new_notifications', ()):
+        broker.publish(notification_topic(notification['user_id']), notification)
+
+
+def discard_notifications(session):
+    session.info.pop('new_notifications', None)
+
+
+# ------------------------------------------------------------------
+# Road progress
+# ------------------------------------------------------------------
+ROADS_TOPIC = 'roads'
+
+# Road attributes dashboards patch in place
+ROAD_EVENT_FIELDS = ('id', 'progress', 'status')
+
+
+class RoadEventBatcher:
+    """Merges committed road changes and publishes them at most once per tick.
+
+    Like StatsWorker, the first change after an idle period starts a wait of
+    one tick; every commit during it lands in one message holding the latest
+    progress and status of each changed road and the summed RoadStats delta.
+    A bulk import sends a single reload message instead of per-road changes.
+
+    While road streams are open the shared roads version is also read every
+    poll interval. Versions above the last one read that this process did
+    not commit were written elsewhere, and clients are told to reload.
+    """
+
+    def __init__(self, tick_ms=250, poll_ms=1000):
+        self.tick = tick_ms / 1000
+        self.poll = poll_ms / 1000
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._sequence = 0
+        # Last shared roads version read, None while nobody listens, and the
+        # versions above it committed by this process
+        self._version = None
+        self._local = set()
+        self._checked = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._roads = {}
+        self._stats = dict.fromkeys(ROAD_STATS_FIELDS, 0)
+        self._reload = False
+        self._pending = False
+
+    def init_app(self, app):
+        self.app = app
+        self.tick = app.config['EVENTS_TICK_MS'] / 1000
+        self.poll = max(self.tick, app.config.get('DATA_VERSION_CHECK_MS', 1000) / 1000)
+
+    def _enqueue(self):
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so each forked gunicorn worker gets its own thread
+            self._thread = threading.Thread(target=self._run, name='road-events', daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def submit(self, roads, stats_delta):
+        """Queue the road changes and stats delta of one committed transaction"""
+        with self._lock:
+            for road in roads:
+                self._roads[road['id']] = road
+            for field in ROAD_STATS_FIELDS:
+                self._stats[field] += stats_delta[field]
+            self._pending = True
+        self._enqueue()
+
+    def watch(self):
+        """Start polling the shared version for a newly opened stream"""
+        self._enqueue()
+
+    def committed_locally(self, version):
+        """Record a roads version this process committed, so polling does not take it for a foreign write"""
+        with self._lock:
+            if self._version is not None and version > self._version:
+                self._local.add(version)
+
+    def check_version(self):
+        """Send a reload if the shared roads version moved without this process committing it"""
+        self._checked = time.monotonic()
+        if self.app is None or not broker.has_subscribers(ROADS_TOPIC):
+            with self._lock:
+                self._version = None
+                self._local = set()
+            return
+        try:
+            with self.app.app_context():
+                version = versions.tracker.current(versions.ROADS)
+        except Exception:
+            logger.exception("Failed to read the shared roads version")
+            return
+        with self._lock:
+            if self._version is None:
+                foreign = False
+            else:
+                foreign = any(v not in self._local for v in range(self._version + 1, version + 1))
+                version = max(version, self._version)
+            self._version = version
+            self._local = {v for v in self._local if v > version}
+        if foreign:
+            self.reload()
+
+    def reload(self):
+        """Tell clients to refetch, for changes too broad to send as deltas"""
+        with self._lock:
+            self._reload = True
+            self._pending = True
+        self._enqueue()
+
+    def flush(self):
+        """Publish everything pending now"""
+        with self._lock:
+            if not self._pending:
+                return
+            roads, stats_delta, reload = self._roads, self._stats, self._reload
+            self._reset()
+            self._sequence += 1
+            sequence = self._sequence
+        if reload:
+            message = {'reload': True}
+        else:
+            message = {'roads': list(roads.values())}
+            # Only the RoadStats fields that moved
+            stats_delta = {field: amount for field, amount in stats_delta.items() if amount}
+            if stats_delta:
+                message['stats'] = stats_delta
+        broker.publish(ROADS_TOPIC, (sequence, message))
+
+    def _run(self):
+        while True:
+            listening = broker.has_subscribers(ROADS_TOPIC)
+            if self._wakeup.wait(self.poll if listening else None):
+                time.sleep(self.tick)
+                self._wakeup.clear()
+                self.flush()
+            if not listening or time.monotonic() - self._checked >= self.poll:
+                self.check_version()
+
+
+road_events = RoadEventBatcher()
+
+
+def _road_changed(road, session):
+    if road in session.new:
+        return True
+    state = inspect(road)
+    return any(state.attrs[field].history.has_changes() for field in ('progress', 'status'))
+
+
+def collect_road_changes(session, flush_context):
+    roads = [obj for obj in (*session.new, *session.dirty) if isinstance(obj, Road) and _road_changed(obj, session)]
+    if not roads:
+        return
+    pending = session.info.setdefault('road_changes', {'roads': {}, 'stats': dict.fromkeys(ROAD_STATS_FIELDS, 0)})
+    for road in roads:
+        pending['roads'][road.id] = {field: getattr(road, field) for field in ROAD_EVENT_FIELDS}
+    for field, amount in road_stats_delta(session).items():
+        pending['stats'][field] += amount
+
+
+def publish_road_changes(session):
+    # Runs after versions.publish_versions (see create_app), so the commit's version is known
+    version = versions.committed(session, versions.ROADS)
+    if version is not None:
+        road_events.committed_locally(version)
+    pending = session.info.pop('road_changes', None)
+    if pending is not None:
+        road_events.submit(pending['roads'].values(), pending['stats'])
+
+
+def discard_road_changes(session):
+    session.info.pop('road_changes', None)
+
+
+def init_app(app):
+    """Publish committed notifications and road changes to open streams"""
+    broker.init_app(app)
+    road_events.init_app(app)
+    if not event.contains(db.session, 'after_flush', collect_notifications):
+        event.listen(db.session, 'after_flush', collect_notifications)
+        event.listen(db.session, 'after_commit', publish_notifications)
+        event.listen(db.session, 'after_rollback', discard_notifications)
+        event.listen(db.session, 'after_flush', collect_road_changes)
+        event.listen(db.session, 'after_commit', publish_road_changes)
+        event.listen(db.session, 'after_rollback', discard_road_changes)
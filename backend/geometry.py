@@ -0,0 +1,316 @@
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# Zoom levels with stored simplified geometry; deeper zooms get full resolution
+LOD_ZOOM_LEVELS = (6, 9, 12)
+
+# Largest deviation from the surveyed line allowed at a stored zoom, in screen pixels
+LOD_PIXEL_TOLERANCE = 1.0
+
+TILE_SIZE = 256
+
+# Mean earth radius (IUGG), as used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
+
+MERU_BOUNDARY = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "properties": {
+                "name": "Meru County",
+                "id": "meru-county",
+                "area": "6936 km²",
+                "population": "1.5 million"
+            },
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [
+                    [
+                        # Actual approximate coordinates for Meru County
+                        [37.550, 0.050],  # Meru town area
+                        [37.850, 0.400],  # North
+                        [38.150, 0.350],  # North-East
+                        [38.250, 0.100],  # East
+                        [38.150, -0.150], # South-East
+                        [37.850, -0.250], # South
+                        [37.600, -0.200], # South-West
+                        [37.450, -0.050], # West
+                        [37.550, 0.050]   # Close polygon
+                    ]
+                ]
+            }
+        }
+    ]
+}
+
+
+def tolerance_for_zoom(zoom):
+    """Degrees of longitude covered by LOD_PIXEL_TOLERANCE pixels at zoom"""
+    return 360.0 / (TILE_SIZE * 2 ** zoom) * LOD_PIXEL_TOLERANCE
+
+
+def lod_level(zoom):
+    """Stored level to serve for a requested zoom, or None for full resolution"""
+    if zoom is None:
+        return None
+    for level in LOD_ZOOM_LEVELS:
+        if zoom <= level:
+            return level
+    return None
+
+
+def simplify(coordinates, tolerance):
+    """Douglas-Peucker simplification of a LineString's [lon, lat] pairs.
+
+    Each split computes the distance of every point in the span to its chord
+    in one vectorized pass, so the Python loop runs once per kept vertex
+    rather than once per input vertex.
+    """
+    points = np.asarray(coordinates, dtype=float)
+    count = len(points)
+    if count < 3:
+        return points.tolist()
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, count - 1)]
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        origin = points[start]
+        chord = points[end] - origin
+        offsets = points[start + 1:end] - origin
+        length = np.hypot(chord[0], chord[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            spans.append((start, split))
+            spans.append((split, end))
+    return points[keep].tolist()
+
+
+def build_lod(coordinates):
+    """Simplified copies of a LineString for every stored zoom level"""
+    if not coordinates:
+        return None
+    return {str(level): simplify(coordinates, tolerance_for_zoom(level)) for level in LOD_ZOOM_LEVELS}
+
+
+def bounding_box(coordinates):
+    """(min_lon, min_lat, max_lon, max_lat) of a LineString, or None if it has no points"""
+    if not coordinates:
+        return None
+    points = np.asarray(coordinates, dtype=float)
+    low = points.min(axis=0)
+    high = points.max(axis=0)
+    return (float(low[0]), float(low[1]), float(high[0]), float(high[1]))
+
+
+def boxes_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def boundary_ring(boundary=MERU_BOUNDARY):
+    """Outer ring of the first polygon in a GeoJSON FeatureCollection as an (n, 2) array"""
+    return np.asarray(boundary['features'][0]['geometry']['coordinates'][0], dtype=float)
+
+
+def haversine_km(start, end):
+    """Great-circle distances in km between matching rows of two [lon, lat] arrays"""
+    lon1, lat1 = np.radians(start[:, 0]), np.radians(start[:, 1])
+    lon2, lat2 = np.radians(end[:, 0]), np.radians(end[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def points_in_polygon(points, ring):
+    """Even-odd ray casting for many points at once; the loop runs per polygon edge"""
+    x, y = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+
+def line_metrics(lines, ring):
+    """Length, bounding box and share inside ring for many LineStrings in one batched pass.
+
+    All vertices are concatenated into a single array, so haversine and
+    point-in-polygon run once over every segment rather than once per road;
+    per-road totals are then gathered with bincount. A segment counts as
+    inside when its midpoint is. Returns one dict per line, or None for
+    lines without coordinates.
+    """
+    arrays = [np.asarray(line, dtype=float).reshape(-1, 2) if line is not None and len(line) else None for line in lines]
+    present = [i for i, points in enumerate(arrays) if points is not None]
+    results = [None] * len(arrays)
+    if not present:
+        return results
+
+    counts = np.array([len(arrays[i]) for i in present])
+    points = np.concatenate([arrays[i] for i in present])
+    starts = np.cumsum(counts) - counts
+    owner = np.repeat(np.arange(len(present)), counts)
+
+    # Segment k joins points k and k+1; drop the ones that bridge two roads
+    same_line = owner[:-1] == owner[1:]
+    lengths = np.where(same_line, haversine_km(points[:-1], points[1:]), 0.0)
+    midpoints = (points[:-1] + points[1:]) / 2
+    inside = lengths * points_in_polygon(midpoints, ring)
+    total = np.bincount(owner[:-1], weights=lengths, minlength=len(present))
+    total_inside = np.bincount(owner[:-1], weights=inside, minlength=len(present))
+
+    low = np.minimum.reduceat(points, starts)
+    high = np.maximum.reduceat(points, starts)
+    for k, i in enumerate(present):
+        results[i] = {
+            'length': float(total[k]),
+            'bbox': [float(low[k, 0]), float(low[k, 1]), float(high[k, 0]), float(high[k, 1])],
+            'inside_share': float(total_inside[k] / total[k]) if total[k] > 0 else None
+        }
+    return results
+
+
+class LineMetricsCache:
+    """Per-road line_metrics results; only roads not yet cached are computed, as one batch"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self._metrics = {}
+        self._lock = threading.Lock()
+        # Shared data version (versions.py) the cached results match
+        self.version = None
+
+    def get_many(self, road_ids, load):
+        """Metrics for road_ids; load(missing_ids) yields (road_id, coordinates) pairs"""
+        with self._lock:
+            metrics = {road_id: self._metrics[road_id] for road_id in road_ids if road_id in self._metrics}
+        missing = [road_id for road_id in road_ids if road_id not in metrics]
+        if missing:
+            loaded = dict.fromkeys(missing)
+            loaded.update(load(missing))
+            computed = dict(zip(loaded, line_metrics(list(loaded.values()), self.ring)))
+            with self._lock:
+                self._metrics.update(computed)
+            metrics.update(computed)
+        return metrics
+
+    def discard(self, road_id):
+        with self._lock:
+            self._metrics.pop(road_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._metrics = {}
+
+
+class GridIndex:
+    """Uniform grid over road bounding boxes for viewport queries.
+
+    Every road is registered in each cell its bounding box overlaps, so a
+    bbox query only inspects roads in the cells it covers; cost follows the
+    number of visible roads rather than the county total. A box spanning
+    more than max_cells cells (a mistyped vertex can stretch a road across
+    the globe) is kept in a short list every query checks instead.
+    """
+
+    def __init__(self, cell_size=0.05, max_cells=1024):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self._boxes = {}
+        self._cells = defaultdict(set)
+        self._oversized = set()
+        self._lock = threading.RLock()
+        self.loaded = False
+        # Shared data version (versions.py) the contents match
+        self.version = None
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (range(math.floor(box[0] / size), math.floor(box[2] / size) + 1),
+                range(math.floor(box[1] / size), math.floor(box[3] / size) + 1))
+
+    def _insert(self, road_id, box):
+        self._boxes[road_id] = box
+        columns, rows = self._cell_range(box)
+        if len(columns) * len(rows) > self.max_cells:
+            self._oversized.add(road_id)
+            return
+        for x in columns:
+            for y in rows:
+                self._cells[(x, y)].add(road_id)
+
+    def _discard(self, road_id):
+        box = self._boxes.pop(road_id, None)
+        if box is None:
+            return None
+        if road_id in self._oversized:
+            self._oversized.discard(road_id)
+            return box
+        columns, rows = self._cell_range(box)
+        for x in columns:
+            for y in rows:
+                cell = self._cells.get((x, y))
+                if cell is not None:
+                    cell.discard(road_id)
+                    if not cell:
+                        del self._cells[(x, y)]
+        return box
+
+    def build(self, roads):
+        """Replace the index contents from (road_id, coordinates) pairs"""
+        with self._lock:
+            self._boxes = {}
+            self._cells = defaultdict(set)
+            self._oversized = set()
+            for road_id, coordinates in roads:
+                box = bounding_box(coordinates)
+                if box is not None:
+                    self._insert(road_id, box)
+            self.loaded = True
+
+    def upsert(self, road_id, coordinates):
+        """Re-register a road after its geometry changed; return its previous box"""
+        box = bounding_box(coordinates)
+        with self._lock:
+            old_box = self._discard(road_id)
+            if box is not None:
+                self._insert(road_id, box)
+        return old_box
+
+    def remove(self, road_id):
+        with self._lock:
+            return self._discard(road_id)
+
+    def bounds(self, road_id):
+        return self._boxes.get(road_id)
+
+    def query(self, bbox):
+        """Ids of roads whose bounding box intersects bbox, in id order"""
+        columns, rows = self._cell_range(bbox)
+        with self._lock:
+            if len(columns) * len(rows) > len(self._boxes):
+                # A viewport wider than the data is cheaper to answer by scanning boxes
+                candidates = self._boxes.keys()
+            else:
+                candidates = set(self._oversized)
+                for x in columns:
+                    for y in rows:
+                        candidates.update(self._cells.get((x, y), ()))
+            return sorted(road_id for road_id in candidates if boxes_intersect(self._boxes[road_id], bbox))
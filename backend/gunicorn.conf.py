@@ -0,0 +1,14 @@
+"""gunicorn settings, read automatically when started from backend/ as `gunicorn app:app`.
+
+gevent workers keep each idle Server-Sent Events stream down to a greenlet
+(see events.py); a sync worker would be tied up by a single one.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:' + os.getenv('PORT', '8000'))
+worker_class = 'gevent'
+# Requests are mostly database waits, which gevent overlaps inside a worker, so one per core is enough
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+# Open connections per worker, SSE streams included; keep above SSE_MAX_CONNECTIONS
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', str(int(os.getenv('SSE_MAX_CONNECTIONS', '1000')) + 100)))
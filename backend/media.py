@@ -0,0 +1,315 @@
+"""Content-addressed photo storage with thumbnails made off the request path.
+
+An upload is streamed to a spool file while it is hashed. Its SHA-256 names
+the stored original ("originals/ab/abcdef....jpg") and its thumbnails
+("thumbs/abcdef.../640.webp"), so the same picture uploaded twice is
+stored once and resized once.
+
+Resizing runs in a bounded process pool: the upload request returns as soon
+as the original is stored. When the thumbnails are stored, every Photo with
+that hash gets its srcset, so a process queues no second job for a hash
+while one is running. Jobs beyond MEDIA_THUMBNAIL_BACKLOG are not queued;
+their photos keep a NULL srcset until `flask generate-thumbnails` runs.
+
+Storage is a directory served by this app (MEDIA_ROOT, the default) or an
+S3-compatible bucket (MEDIA_STORAGE=s3, which needs boto3).
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update
+
+from cache import response_cache
+from models import db, Photo
+
+try:
+    import thumbnails
+except ImportError:
+    # Pillow is missing; uploads are stored but never resized
+    thumbnails = None
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the formats accepted for upload
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'RIFF', 'image/webp', '.webp'),
+)
+
+photo_table = Photo.__table__
+
+Upload = namedtuple('Upload', ['path', 'content_hash', 'size', 'mimetype', 'extension'])
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def sniff_image(head):
+    """(mimetype, extension) of an accepted image format, from its first bytes"""
+    for signature, mimetype, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature) and (mimetype != 'image/webp' or head[8:12] == b'WEBP'):
+            return mimetype, extension
+    raise ValueError('Upload a JPEG, PNG or WebP image')
+
+
+def receive_upload(stream, spool_dir, max_bytes):
+    """Copy a request body to a spool file, hashing it on the way; never holds it in memory"""
+    os.makedirs(spool_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=spool_dir, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            head = b''
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f'Photos are limited to {max_bytes // (1024 * 1024)} MB')
+                if len(head) < 16:
+                    head += chunk[:16]
+                digest.update(chunk)
+                spool.write(chunk)
+        if not size:
+            raise ValueError('Empty upload')
+        mimetype, extension = sniff_image(head)
+    except BaseException:
+        os.remove(path)
+        raise
+    return Upload(path, digest.hexdigest(), size, mimetype, extension)
+
+
+def original_key(content_hash, extension):
+    return f'originals/{content_hash[:2]}/{content_hash}{extension}'
+
+
+def thumbnail_key(content_hash, width):
+    return f'thumbs/{content_hash}/{width}{thumbnails.EXTENSION}'
+
+
+class LocalStorage:
+    """Files under root, served by the app at base_url"""
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, key, source, mimetype):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            # Rename into place so readers never see a partial file
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def download(self, key, destination):
+        shutil.copyfile(self.path(key), destination)
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket, linked at base_url (a CDN or the bucket's endpoint)"""
+
+    # Keys never change content, so caches may keep them for good
+    CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    def __init__(self, bucket, base_url, endpoint_url=None, access_key=None, secret_key=None):
+        if boto3 is None:
+            raise RuntimeError('MEDIA_STORAGE is s3 but the boto3 package is not installed')
+        self._client = boto3.client('s3', endpoint_url=endpoint_url,
+                                    aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        self.bucket = bucket
+        self.base_url = base_url.rstrip('/')
+
+    def exists(self, key):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+        except self._client.exceptions.ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def put(self, key, source, mimetype):
+        self._client.upload_file(source, self.bucket, key, ExtraArgs={
+            'ContentType': mimetype, 'CacheControl': self.CACHE_CONTROL
+        })
+
+    def download(self, key, destination):
+        self._client.download_file(self.bucket, key, destination)
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+
+def build_srcset(storage, content_hash, extension, original_width, widths):
+    candidates = [(width, storage.url(thumbnail_key(content_hash, width))) for width in sorted(widths)]
+    candidates.append((original_width, storage.url(original_key(content_hash, extension))))
+    return ', '.join(f'{url} {width}w' for width, url in candidates)
+
+
+class ThumbnailQueue:
+    """Resizes stored uploads in a bounded pool of worker processes"""
+
+    def __init__(self):
+        self.app = None
+        self.storage = None
+        self.widths = (320, 640, 1280)
+        self.workers = 2
+        self.spool_dir = None
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(64)
+        self._lock = threading.Lock()
+        self._pid = None
+        # Hashes with a job queued or running in this process
+        self._in_flight = set()
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        if config['MEDIA_STORAGE'] == 's3':
+            self.storage = S3Storage(config['MEDIA_BUCKET'], config['MEDIA_BASE_URL'], config['MEDIA_S3_ENDPOINT_URL'],
+                                     config['AWS_ACCESS_KEY_ID'], config['AWS_SECRET_ACCESS_KEY'])
+        else:
+            self.storage = LocalStorage(config['MEDIA_ROOT'], config['MEDIA_BASE_URL'])
+        self.widths = config['MEDIA_THUMBNAIL_WIDTHS']
+        self.workers = config['MEDIA_THUMBNAIL_WORKERS']
+        self.spool_dir = config['MEDIA_SPOOL_DIR']
+        self._slots = threading.BoundedSemaphore(config['MEDIA_THUMBNAIL_BACKLOG'])
+
+    def _pool(self):
+        with self._lock:
+            # Created lazily so each forked gunicorn worker gets its own pool
+            if self._executor is None or self._pid != os.getpid():
+                # spawn: forking a process that runs threads can copy held locks
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def store(self, upload):
+        """Store an upload's original unless that content is already stored; returns its URL"""
+        key = original_key(upload.content_hash, upload.extension)
+        if not self.storage.exists(key):
+            self.storage.put(key, upload.path, upload.mimetype)
+        return self.storage.url(key)
+
+    def submit(self, content_hash, extension, source, block=False):
+        """Queue resizing of a spool file, which is deleted once the job finishes.
+
+        Returns False, dropping the file, if the backlog is full (unless block)
+        or Pillow is missing. A hash that already has a job drops the file
+        too: that job gives every photo of the hash its srcset.
+        """
+        if thumbnails is None:
+            os.remove(source)
+            return False
+        with self._lock:
+            running = content_hash in self._in_flight
+            self._in_flight.add(content_hash)
+        if running:
+            os.remove(source)
+            return True
+        if not self._slots.acquire(blocking=block):
+            self._done(content_hash)
+            os.remove(source)
+            return False
+        out_dir = tempfile.mkdtemp(dir=self.spool_dir, suffix='.thumbs')
+        try:
+            future = self._pool().submit(thumbnails.render_thumbnails, source, self.widths, out_dir)
+        except BaseException:
+            self._slots.release()
+            self._done(content_hash)
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.remove(source)
+            raise
+        future.add_done_callback(lambda done: self._finish(done, content_hash, extension, source, out_dir))
+        return True
+
+    def resubmit(self, content_hash, extension):
+        """Queue resizing of an already stored original, waiting for a backlog slot"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        fd, source = tempfile.mkstemp(dir=self.spool_dir, suffix='.upload')
+        os.close(fd)
+        self.storage.download(original_key(content_hash, extension), source)
+        return self.submit(content_hash, extension, source, block=True)
+
+    def _done(self, content_hash):
+        with self._lock:
+            self._in_flight.discard(content_hash)
+
+    def _finish(self, future, content_hash, extension, source, out_dir):
+        try:
+            original_width, outputs = future.result()
+            for width, path in outputs:
+                self.storage.put(thumbnail_key(content_hash, width), path, thumbnails.MIMETYPE)
+            srcset = build_srcset(self.storage, content_hash, extension, original_width,
+                                  [width for width, _ in outputs])
+            # Released before the UPDATE: a photo committed after it queues its own job,
+            # one committed before it was skipped by submit() and is covered here
+            self._done(content_hash)
+            road_ids = set_srcset(self.app, content_hash, srcset)
+            response_cache.invalidate('photos', *(f'road:{road_id}' for road_id in road_ids))
+        except Exception:
+            logger.exception("Failed to make thumbnails for %s", content_hash)
+        finally:
+            self._done(content_hash)
+            self._slots.release()
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.remove(source)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def set_srcset(app, content_hash, srcset):
+    """Give every photo of this content its srcset; returns the ids of their roads"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(photo_table).where(photo_table.c.content_hash == content_hash).values(srcset=srcset)
+            )
+            return set(connection.execute(
+                select(photo_table.c.road_id).where(photo_table.c.content_hash == content_hash)
+            ).scalars())
+
+
+def known_srcset(session, content_hash):
+    """srcset already made for this content by an earlier upload, if any"""
+    return session.execute(
+        select(photo_table.c.srcset)
+        .where(photo_table.c.content_hash == content_hash, photo_table.c.srcset.isnot(None))
+        .limit(1)
+    ).scalar()
+
+
+thumbnail_queue = ThumbnailQueue()
@@ -0,0 +1,28 @@
+"""road progress not null
+
+Revision ID: 2c6e8a0b4d57
+Revises: 7b2d4e6f8a13
+Create Date: 2026-10-18 17:48:36.215907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6e8a0b4d57'
+down_revision = '7b2d4e6f8a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows with NULL progress fell outside every (progress, id) keyset page
+    op.execute('UPDATE road SET progress = 0 WHERE progress IS NULL')
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.alter_column('progress', existing_type=sa.Integer(), nullable=False, server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.alter_column('progress', existing_type=sa.Integer(), nullable=True, server_default=None)
@@ -0,0 +1,43 @@
+"""live road stats
+
+Revision ID: 3f1c9b7d2a64
+Revises: a4d5f527f8e8
+Create Date: 2026-10-17 09:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9b7d2a64'
+down_revision = 'a4d5f527f8e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows become history snapshots
+    with op.batch_alter_table('road_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_live', sa.Boolean(), nullable=False, server_default=sa.false()))
+    
+    # Seed the live row from the roads already there, so /api/stats answers straight away.
+    # The same totals as stats.compute_road_stats, spelled out so later app code cannot change this revision
+    op.execute("""
+        INSERT INTO road_stats (total_roads, completed_roads, in_progress_roads, planned_roads,
+                                budget_allocated, budget_spent, last_updated, is_live)
+        SELECT COUNT(id),
+               COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN status = 'ongoing' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN status = 'planned' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(budget), 0),
+               COALESCE(SUM(budget * COALESCE(progress, 0) / 100), 0),
+               CURRENT_TIMESTAMP,
+               TRUE
+        FROM road
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('road_stats', schema=None) as batch_op:
+        batch_op.drop_column('is_live')
@@ -0,0 +1,30 @@
+"""shared data versions
+
+Revision ID: 5e9c3a7f1b42
+Revises: d8a3f06b41e2
+Create Date: 2026-10-18 16:20:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9c3a7f1b42'
+down_revision = 'd8a3f06b41e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_version = op.create_table('data_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # Present from the start, so concurrent first writes only ever UPDATE it
+    op.bulk_insert(data_version, [{'name': 'roads', 'version': 1}])
+
+
+def downgrade():
+    op.drop_table('data_version')
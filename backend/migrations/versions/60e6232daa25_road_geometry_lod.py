@@ -0,0 +1,27 @@
+"""road geometry lod
+
+Revision ID: 60e6232daa25
+Revises: 3f1c9b7d2a64
+Create Date: 2026-10-17 11:05:42.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '60e6232daa25'
+down_revision = '3f1c9b7d2a64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows are filled in by `flask simplify-road-geometry`
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('map_coordinates_lod', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.drop_column('map_coordinates_lod')
@@ -0,0 +1,26 @@
+"""road view count
+
+Revision ID: 7b2d4e6f8a13
+Revises: 5e9c3a7f1b42
+Create Date: 2026-10-18 17:05:12.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2d4e6f8a13'
+down_revision = '5e9c3a7f1b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('view_count', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.drop_column('view_count')
@@ -0,0 +1,60 @@
+"""hot path indexes
+
+Revision ID: 8a8f93f5d948
+Revises: f849ac9803f8
+Create Date: 2026-10-17 16:02:11.418270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a8f93f5d948'
+down_revision = 'f849ac9803f8'
+branch_labels = None
+depends_on = None
+
+ROAD_SORT_COLUMNS = ('length', 'budget', 'status', 'start_date', 'end_date', 'progress')
+
+
+def upgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        for column in ROAD_SORT_COLUMNS:
+            batch_op.create_index(f'ix_road_{column}_id', [column, 'id'], unique=False)
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.create_index('ix_photo_road_id', ['road_id'], unique=False)
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_id_id', ['user_id', 'id'], unique=False)
+        batch_op.create_index('ix_notification_unread', ['user_id', 'id'], unique=False,
+                              sqlite_where=sa.text('is_read = 0'), postgresql_where=sa.text('NOT is_read'))
+
+    with op.batch_alter_table('road_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_road_stats_live', ['is_live'], unique=True,
+                              sqlite_where=sa.text('is_live = 1'), postgresql_where=sa.text('is_live'))
+        batch_op.create_index('ix_road_stats_is_live_last_updated', ['is_live', 'last_updated'], unique=False)
+
+    with op.batch_alter_table('accessibility_setting', schema=None) as batch_op:
+        batch_op.create_index('ix_accessibility_setting_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('accessibility_setting', schema=None) as batch_op:
+        batch_op.drop_index('ix_accessibility_setting_user_id')
+
+    with op.batch_alter_table('road_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_road_stats_is_live_last_updated')
+        batch_op.drop_index('ix_road_stats_live')
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_unread')
+        batch_op.drop_index('ix_notification_user_id_id')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_road_id')
+
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        for column in reversed(ROAD_SORT_COLUMNS):
+            batch_op.drop_index(f'ix_road_{column}_id')
@@ -0,0 +1,36 @@
+"""unread notification counter
+
+Revision ID: b52e7a1c9d30
+Revises: e011c9c294d1
+Create Date: 2026-10-18 09:41:07.228514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52e7a1c9d30'
+down_revision = 'e011c9c294d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'))
+    
+    # Seed the counters from the rows they count
+    user = sa.table('user', sa.column('id'), sa.column('unread_notifications'))
+    notification = sa.table('notification', sa.column('id'), sa.column('user_id'), sa.column('is_read'))
+    unread = (
+        sa.select(sa.func.count(notification.c.id))
+        .where(notification.c.user_id == user.c.id, notification.c.is_read == sa.false())
+        .scalar_subquery()
+    )
+    op.execute(user.update().values(unread_notifications=unread))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
@@ -0,0 +1,30 @@
+"""photo uploads
+
+Revision ID: d8a3f06b41e2
+Revises: b52e7a1c9d30
+Create Date: 2026-10-18 11:05:52.690137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a3f06b41e2'
+down_revision = 'b52e7a1c9d30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('srcset', sa.Text(), nullable=True))
+        batch_op.create_index('ix_photo_content_hash', ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_content_hash')
+        batch_op.drop_column('srcset')
+        batch_op.drop_column('content_hash')
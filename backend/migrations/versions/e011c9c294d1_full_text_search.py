@@ -0,0 +1,96 @@
+"""full text search
+
+Revision ID: e011c9c294d1
+Revises: 8a8f93f5d948
+Create Date: 2026-10-17 17:20:45.102938
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e011c9c294d1'
+down_revision = '8a8f93f5d948'
+branch_labels = None
+depends_on = None
+
+# The structures search.install() created at this revision, spelled out so
+# later changes to search.py cannot alter what this migration does.
+# FTS5 rowids are id * 3 + 0 for roads, + 1 for contractors, + 2 for milestones.
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS search_index_road_insert AFTER INSERT ON road BEGIN "
+    "INSERT INTO search_index(rowid, title, body) VALUES (new.id * 3 + 0, new.name, coalesce(new.description, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_road_update AFTER UPDATE OF name, description ON road BEGIN "
+    "UPDATE search_index SET title = new.name, body = coalesce(new.description, '') WHERE rowid = new.id * 3 + 0; END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_road_delete AFTER DELETE ON road BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 3 + 0; END",
+
+    "CREATE TRIGGER IF NOT EXISTS search_index_contractor_insert AFTER INSERT ON contractor BEGIN "
+    "INSERT INTO search_index(rowid, title, body) VALUES (new.id * 3 + 1, new.name, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_contractor_update AFTER UPDATE OF name ON contractor BEGIN "
+    "UPDATE search_index SET title = new.name, body = '' WHERE rowid = new.id * 3 + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_contractor_delete AFTER DELETE ON contractor BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 3 + 1; END",
+
+    "CREATE TRIGGER IF NOT EXISTS search_index_milestone_insert AFTER INSERT ON milestone BEGIN "
+    "INSERT INTO search_index(rowid, title, body) VALUES (new.id * 3 + 2, new.name, coalesce(new.description, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_milestone_update AFTER UPDATE OF name, description ON milestone BEGIN "
+    "UPDATE search_index SET title = new.name, body = coalesce(new.description, '') WHERE rowid = new.id * 3 + 2; END",
+    "CREATE TRIGGER IF NOT EXISTS search_index_milestone_delete AFTER DELETE ON milestone BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 3 + 2; END",
+
+    # Index the rows already there
+    "INSERT INTO search_index(rowid, title, body) SELECT id * 3 + 0, name, coalesce(description, '') FROM road",
+    "INSERT INTO search_index(rowid, title, body) SELECT id * 3 + 1, name, '' FROM contractor",
+    "INSERT INTO search_index(rowid, title, body) SELECT id * 3 + 2, name, coalesce(description, '') FROM milestone",
+    "INSERT INTO search_index(search_index) VALUES ('optimize')",
+]
+
+SQLITE_DOWNGRADE = [
+    *(f'DROP TRIGGER IF EXISTS search_index_{table}_{action}'
+      for table in ('road', 'contractor', 'milestone') for action in ('insert', 'update', 'delete')),
+    'DROP TABLE IF EXISTS search_index',
+]
+
+# Generated columns need no backfill: Postgres computes them for existing rows
+POSTGRES_UPGRADE = [
+    "ALTER TABLE road ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    'CREATE INDEX IF NOT EXISTS ix_road_search_vector ON road USING gin (search_vector)',
+
+    "ALTER TABLE contractor ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A')) STORED",
+    'CREATE INDEX IF NOT EXISTS ix_contractor_search_vector ON contractor USING gin (search_vector)',
+
+    "ALTER TABLE milestone ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    'CREATE INDEX IF NOT EXISTS ix_milestone_search_vector ON milestone USING gin (search_vector)',
+]
+
+POSTGRES_DOWNGRADE = [
+    *(statement for table in ('road', 'contractor', 'milestone') for statement in (
+        f'DROP INDEX IF EXISTS ix_{table}_search_vector',
+        f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector',
+    )),
+]
+
+
+def _run(postgres, sqlite):
+    connection = op.get_bind()
+    for statement in postgres if connection.dialect.name == 'postgresql' else sqlite:
+        connection.exec_driver_sql(statement)
+
+
+def upgrade():
+    # SQLite: FTS5 table plus sync triggers; Postgres: generated tsvector columns with GIN indexes
+    _run(POSTGRES_UPGRADE, SQLITE_UPGRADE)
+
+
+def downgrade():
+    _run(POSTGRES_DOWNGRADE, SQLITE_DOWNGRADE)
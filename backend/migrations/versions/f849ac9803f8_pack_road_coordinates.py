@@ -0,0 +1,68 @@
+"""pack road coordinates
+
+Revision ID: f849ac9803f8
+Revises: 60e6232daa25
+Create Date: 2026-10-17 13:27:09.551862
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from coordinates import decode_array, encode_coordinates, normalize_coordinates
+
+
+# revision identifiers, used by Alembic.
+revision = 'f849ac9803f8'
+down_revision = '60e6232daa25'
+branch_labels = None
+depends_on = None
+
+road = sa.table('road',
+    sa.column('id', sa.Integer),
+    sa.column('map_coordinates', sa.Text),
+    sa.column('map_coordinates_packed', sa.LargeBinary)
+)
+
+
+def upgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('map_coordinates_packed', sa.LargeBinary(), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(road.c.id, road.c.map_coordinates).where(road.c.map_coordinates.isnot(None))).all()
+    for road_id, text in rows:
+        # Some rows hold a whole GeoJSON geometry rather than its coordinates
+        coordinates = normalize_coordinates(json.loads(text) if isinstance(text, str) else text)
+        if coordinates:
+            connection.execute(
+                road.update().where(road.c.id == road_id)
+                .values(map_coordinates_packed=encode_coordinates(coordinates, 'f64'))
+            )
+
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.drop_column('map_coordinates')
+        batch_op.alter_column('map_coordinates_packed', new_column_name='map_coordinates')
+
+
+def downgrade():
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('map_coordinates_json', sa.JSON(), nullable=True))
+
+    road_json = sa.table('road',
+        sa.column('id', sa.Integer),
+        sa.column('map_coordinates', sa.LargeBinary),
+        sa.column('map_coordinates_json', sa.Text)
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(road_json.c.id, road_json.c.map_coordinates).where(road_json.c.map_coordinates.isnot(None))).all()
+    for road_id, data in rows:
+        connection.execute(
+            road_json.update().where(road_json.c.id == road_id)
+            .values(map_coordinates_json=json.dumps(decode_array(bytes(data)).tolist()))
+        )
+
+    with op.batch_alter_table('road', schema=None) as batch_op:
+        batch_op.drop_column('map_coordinates')
+        batch_op.alter_column('map_coordinates_json', new_column_name='map_coordinates')
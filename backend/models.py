@@ -1,9 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, load_only, raiseload, validates
 from sqlalchemy import func
 from datetime import datetime
+from collections import defaultdict, namedtuple
+from itertools import islice
+from geometry import build_lod, lod_level, simplify, tolerance_for_zoom
+from routing import RoutingSession
+from coordinates import PackedCoordinates, coordinates_to_list, normalize_coordinates, validate_coordinates
+from config import config
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Many-to-Many relationship tables
 road_contractor = db.Table('road_contractor',
@@ -24,16 +30,42 @@ class Road(db.Model):
     status = db.Column(db.String(20), nullable=False)  # ongoing, completed, planned
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
-    progress = db.Column(db.Integer, default=0)
+    # NOT NULL so keyset pages sorted on it never skip a road
+    progress = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     description = db.Column(db.Text, nullable=False)
-    map_coordinates = db.Column(db.JSON, nullable=True)  # Storing GeoJSON coordinates
+    map_coordinates = db.Column(PackedCoordinates(config.COORDINATE_ENCODING), nullable=True)  # GeoJSON LineString coordinates, packed
+    map_coordinates_lod = db.Column(db.JSON, nullable=True)  # Simplified copies keyed by zoom level
     contractor = db.Column(db.String(100), nullable=True)
+    # Detail views, added in batches by stats.view_counter; ranks roads in suggestions
+    view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     photos = relationship('Photo', back_populates='road')
     contractors = relationship('Contractor', secondary=road_contractor, back_populates='roads')
     milestones = relationship('Milestone', secondary=road_milestone, back_populates='roads')
     
+    # /api/roads pages by (sort column, id); name is covered by its unique index
+    __table_args__ = tuple(
+        db.Index(f'ix_road_{column}_id', column, 'id')
+        for column in ('length', 'budget', 'status', 'start_date', 'end_date', 'progress')
+    )
+    
+    @validates('map_coordinates')
+    def validate_map_coordinates(self, key, coordinates):
+        # Simplify once at write time so map reads never do it per request
+        coordinates = validate_coordinates(normalize_coordinates(coordinates))
+        self.map_coordinates_lod = build_lod(coordinates)
+        return coordinates
+    
+    def coordinates_for_zoom(self, zoom=None):
+        level = lod_level(zoom)
+        if level is None:
+            return coordinates_to_list(self.map_coordinates)
+        if self.map_coordinates_lod:
+            return self.map_coordinates_lod[str(level)]
+        # Rows written before simplified geometry was stored
+        return simplify(self.map_coordinates, tolerance_for_zoom(level)) if self.map_coordinates else self.map_coordinates
+    
     def serialize(self):
         return {
             'id': self.id,
@@ -45,11 +77,26 @@ class Road(db.Model):
             'end_date': str(self.end_date),
             'progress': self.progress,
             'description': self.description,
-            'map_coordinates': self.map_coordinates,
+            'map_coordinates': coordinates_to_list(self.map_coordinates),
             'contractors': [c.serialize() for c in self.contractors],
             'milestones': [m.serialize() for m in self.milestones],
             'photos': [p.serialize() for p in self.photos]
         }
+    
+    def serialize_feature(self, zoom=None):
+        return {
+            "type": "Feature",
+            "properties": {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "progress": self.progress
+            },
+            "geometry": {
+                "type": "LineString",
+                "coordinates": self.coordinates_for_zoom(zoom)
+            }
+        }
 
 class Contractor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -88,7 +135,11 @@ class Photo(db.Model):
     url = db.Column(db.String(255), nullable=False)
     caption = db.Column(db.String(200), nullable=True)
     date_taken = db.Column(db.DateTime, default=func.now())
-    road_id = db.Column(db.Integer, db.ForeignKey('road.id'), nullable=False)
+    road_id = db.Column(db.Integer, db.ForeignKey('road.id'), nullable=False, index=True)
+    # SHA-256 of an uploaded photo; NULL for photos linked by URL
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Thumbnail URLs with width descriptors, set once they have been made
+    srcset = db.Column(db.Text, nullable=True)
     
     road = relationship('Road', back_populates='photos')
     
@@ -98,7 +149,8 @@ class Photo(db.Model):
             'url': self.url,
             'caption': self.caption,
             'date_taken': self.date_taken.isoformat(),
-            'road_id': self.road_id
+            'road_id': self.road_id,
+            'srcset': self.srcset
         }
 
 class User(db.Model):
@@ -108,6 +160,8 @@ class User(db.Model):
     role = db.Column(db.String(50), nullable=False)  # County Engineer, Admin, etc.
     avatar_url = db.Column(db.String(255), nullable=True)
     last_login = db.Column(db.DateTime, nullable=True)
+    # Kept in step with Notification.is_read by the notifications module, so badges read one row
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     def serialize(self):
         return {
@@ -127,6 +181,16 @@ class Notification(db.Model):
     
     user = relationship('User')
     
+    # created_at comes back with the INSERT, so committed rows can be pushed without a reload
+    __mapper_args__ = {'eager_defaults': True}
+    
+    __table_args__ = (
+        db.Index('ix_notification_user_id_id', 'user_id', 'id'),
+        # Unread rows are the hot set and a small slice of the table
+        db.Index('ix_notification_unread', 'user_id', 'id',
+                 sqlite_where=db.text('is_read = 0'), postgresql_where=db.text('NOT is_read')),
+    )
+    
     def serialize(self):
         return {
             'id': self.id,
@@ -145,6 +209,15 @@ class RoadStats(db.Model):
     budget_allocated = db.Column(db.BigInteger, default=0)
     budget_spent = db.Column(db.BigInteger, default=0)
     last_updated = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    # The single live row holds running totals; every other row is a history snapshot
+    is_live = db.Column(db.Boolean, nullable=False, default=False)
+    
+    __table_args__ = (
+        # Finds the live row directly and guarantees there is only one
+        db.Index('ix_road_stats_live', 'is_live', unique=True,
+                 sqlite_where=db.text('is_live = 1'), postgresql_where=db.text('is_live')),
+        db.Index('ix_road_stats_is_live_last_updated', 'is_live', 'last_updated'),
+    )
     
     def serialize(self):
         return {
@@ -156,9 +229,14 @@ class RoadStats(db.Model):
             'budget_spent': self.budget_spent,
             'last_updated': self.last_updated.isoformat()
         }
+class DataVersion(db.Model):
+    """Counter bumped by every transaction that changes a dataset workers cache in process"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 class AccessibilitySetting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     high_contrast = db.Column(db.Boolean, default=False)
     text_size = db.Column(db.String(10), default='medium')  # 'small', 'medium', 'large'
     voice_navigation = db.Column(db.Boolean, default=False)
@@ -171,4 +249,87 @@ class AccessibilitySetting(db.Model):
             'highContrast': self.high_contrast,
             'textSize': self.text_size,
             'voiceNavigation': self.voice_navigation
-        }
\ No newline at end of file
+        }
+
+# Loader options paired with the serializer that reads exactly what they load.
+# raiseload('*') turns any relationship the serializer forgot into an error
+# instead of a silent per-row query.
+LoadProfile = namedtuple('LoadProfile', ['options', 'serialize'])
+
+ROAD_PROFILES = {
+    'map': LoadProfile(
+        options=[
+            load_only(Road.id, Road.name, Road.status, Road.progress, Road.map_coordinates),
+            raiseload('*')
+        ],
+        serialize=Road.serialize_feature
+    ),
+    'map_lod': LoadProfile(
+        options=[
+            load_only(Road.id, Road.name, Road.status, Road.progress, Road.map_coordinates_lod),
+            raiseload('*')
+        ],
+        serialize=Road.serialize_feature
+    )
+}
+
+def road_query(profile):
+    """Road query with the eager-loading options of the named profile"""
+    return Road.query.options(*ROAD_PROFILES[profile].options)
+
+# Read paths that skip ORM objects: select only these columns and turn each
+# row tuple into a dict with the keys serialize() produces. Dates and
+# datetimes stay as objects for the JSON provider to encode.
+RowProfile = namedtuple('RowProfile', ['fields', 'columns'])
+
+def row_profile(model, fields):
+    return RowProfile(fields, tuple(getattr(model, field) for field in fields))
+
+ROAD_SUMMARY_ROWS = row_profile(Road, ('id', 'name', 'length', 'budget', 'status', 'start_date', 'end_date', 'progress'))
+ROAD_DETAIL_ROWS = row_profile(Road, ROAD_SUMMARY_ROWS.fields + ('description', 'map_coordinates'))
+CONTRACTOR_ROWS = row_profile(Contractor, ('id', 'name', 'contact_email', 'contact_phone'))
+MILESTONE_ROWS = row_profile(Milestone, ('id', 'name', 'description', 'status'))
+PHOTO_ROWS = row_profile(Photo, ('id', 'url', 'caption', 'date_taken', 'road_id', 'srcset'))
+NOTIFICATION_ROWS = row_profile(Notification, ('id', 'user_id', 'message', 'is_read', 'created_at'))
+
+def row_dicts(rows, profile):
+    """Dicts keyed by the profile's fields for rows selected with its columns"""
+    fields = profile.fields
+    return (dict(zip(fields, row)) for row in rows)
+
+def related_rows(query, key):
+    """Group row dicts by the leading key column of each row"""
+    grouped = defaultdict(list)
+    for row in query:
+        grouped[row[0]].append(dict(zip(key, row[1:])))
+    return grouped
+
+def road_detail_dicts(session, rows, chunk_size=500):
+    """Detail dicts for ROAD_DETAIL_ROWS rows.
+
+    Contractors, milestones and photos are loaded with one query each per
+    chunk of roads, as selectinload would, but as plain rows.
+    """
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        ids = [row[0] for row in chunk]
+        contractors = related_rows(
+            session.query(road_contractor.c.road_id, *CONTRACTOR_ROWS.columns).select_from(Contractor)
+            .join(road_contractor, road_contractor.c.contractor_id == Contractor.id)
+            .filter(road_contractor.c.road_id.in_(ids)).order_by(Contractor.id),
+            CONTRACTOR_ROWS.fields)
+        milestones = related_rows(
+            session.query(road_milestone.c.road_id, *MILESTONE_ROWS.columns).select_from(Milestone)
+            .join(road_milestone, road_milestone.c.milestone_id == Milestone.id)
+            .filter(road_milestone.c.road_id.in_(ids)).order_by(Milestone.id),
+            MILESTONE_ROWS.fields)
+        photos = related_rows(
+            session.query(Photo.road_id, *PHOTO_ROWS.columns)
+            .filter(Photo.road_id.in_(ids)).order_by(Photo.id),
+            PHOTO_ROWS.fields)
+        for road in row_dicts(chunk, ROAD_DETAIL_ROWS):
+            road['map_coordinates'] = coordinates_to_list(road['map_coordinates'])
+            road['contractors'] = contractors.get(road['id'], [])
+            road['milestones'] = milestones.get(road['id'], [])
+            road['photos'] = photos.get(road['id'], [])
+            yield road
@@ -0,0 +1,118 @@
+"""Notification read state and the per-user unread counter.
+
+User.unread_notifications is adjusted in the same transaction as the
+notification rows it counts: ORM writes through a flush hook, read marks
+through mark_read, which flips a whole batch with one UPDATE and moves the
+counter by its row count. Writes that bypass both (raw SQL) are repaired
+with `flask reconcile-unread`.
+"""
+from collections import Counter
+
+from sqlalchemy import event, false, func, inspect, or_, select, update
+
+from models import db, Notification, User
+
+notification_table = Notification.__table__
+user_table = User.__table__
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    """No-op listener; active_history makes flush-time history carry the old value"""
+
+
+def _unread_delta(session):
+    """Per-user change in unread notifications caused by the current flush"""
+    delta = Counter()
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            delta[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification):
+            history = inspect(obj).attrs.is_read.history
+            was_read = history.deleted[0] if history.deleted else obj.is_read
+            if not was_read:
+                delta[obj.user_id] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Notification):
+            history = inspect(obj).attrs.is_read.history
+            if history.deleted and bool(history.deleted[0]) != bool(obj.is_read):
+                delta[obj.user_id] += -1 if obj.is_read else 1
+    return delta
+
+
+def _add_unread(session, user_id, amount):
+    session.execute(
+        update(user_table)
+        .where(user_table.c.id == user_id)
+        .values(unread_notifications=user_table.c.unread_notifications + amount)
+    )
+
+
+def count_unread(session, flush_context):
+    for user_id, amount in _unread_delta(session).items():
+        if amount:
+            _add_unread(session, user_id, amount)
+
+
+def mark_read(session, user_id, ids=None, before=None):
+    """Mark the user's notifications with id in ids, or id <= before, as read.
+
+    Returns how many were unread. Does not commit.
+    """
+    conditions = []
+    if ids:
+        conditions.append(notification_table.c.id.in_(ids))
+    if before is not None:
+        conditions.append(notification_table.c.id <= before)
+    if not conditions:
+        return 0
+    result = session.execute(
+        update(notification_table)
+        .where(notification_table.c.user_id == user_id,
+               notification_table.c.is_read == false(),
+               or_(*conditions))
+        .values(is_read=True)
+    )
+    if result.rowcount:
+        _add_unread(session, user_id, -result.rowcount)
+    return result.rowcount
+
+
+def unread_count(session, user_id):
+    return session.execute(
+        select(user_table.c.unread_notifications).where(user_table.c.id == user_id)
+    ).scalar()
+
+
+def count_unread_query():
+    """Correlated count of each user's unread notifications"""
+    return (
+        select(func.count(notification_table.c.id))
+        .where(notification_table.c.user_id == user_table.c.id, notification_table.c.is_read == false())
+        .scalar_subquery()
+    )
+
+
+def reconcile_unread(fix=False):
+    """Compare counters with a recount; return {user_id: (counter, expected)} mismatches"""
+    expected = count_unread_query()
+    rows = db.session.execute(
+        select(user_table.c.id, user_table.c.unread_notifications, expected)
+        .where(user_table.c.unread_notifications != expected)
+    ).all()
+    mismatches = {user_id: (counter, actual) for user_id, counter, actual in rows}
+    if fix and mismatches:
+        db.session.execute(
+            update(user_table)
+            .where(user_table.c.id.in_(mismatches))
+            .values(unread_notifications=count_unread_query())
+        )
+        db.session.commit()
+    return mismatches
+
+
+def init_app(app):
+    """Keep unread counters in step with ORM notification writes"""
+    if not event.contains(db.session, 'after_flush', count_unread):
+        event.listen(Notification.is_read, 'set', _load_old_value, active_history=True)
+        event.listen(db.session, 'after_flush', count_unread)
@@ -0,0 +1,82 @@
+"""Read-replica routing for db.session.
+
+Reads made while serving a GET/HEAD request go to one of the replica binds
+(SQLALCHEMY_BINDS keys starting with 'replica'); flushes, DML statements and
+everything after them in the same session go to the primary, as does all
+work outside a request (CLI commands, the stats worker).
+
+Replicas lag the primary, so reads also stay on the primary for
+REPLICA_LAG_WINDOW_MS after a write: one made by the same client (tracked in
+its Flask session cookie) or one committed by this process, whose in-process
+caches and indexes would otherwise be rebuilt from stale rows.
+"""
+import random
+import time
+
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+REPLICA_PREFIX = 'replica'
+
+# Time of the last commit that wrote through this process
+_last_process_write = 0.0
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for a list of replica URLs"""
+    return {f'{REPLICA_PREFIX}_{i}': url for i, url in enumerate(urls)}
+
+
+def recently_wrote():
+    window = current_app.config.get('REPLICA_LAG_WINDOW_MS', 5000) / 1000
+    last_write = max(session.get('last_write', 0), _last_process_write)
+    return time.time() - last_write < window
+
+
+def choose_replica(engines):
+    """Replica engine for this request's reads, or None to read from the primary"""
+    if not has_request_context() or request.method not in READ_METHODS:
+        return None
+    replicas = [engine for key, engine in engines.items() if key and key.startswith(REPLICA_PREFIX)]
+    if not replicas or recently_wrote():
+        return None
+    return random.choice(replicas)
+
+
+class RoutingSession(Session):
+    """Session that picks a replica for reads when the current request allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            if 'replica' not in self.info:
+                # One replica per session, so a request's reads see a single snapshot
+                self.info['replica'] = choose_replica(self._db.engines)
+            if self.info['replica'] is not None:
+                return self.info['replica']
+        elif bind is None:
+            # Later reads in this session must see its own writes
+            self.info['replica'] = None
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def record_write(db_session):
+    global _last_process_write
+    if db_session.info.pop('wrote', False):
+        _last_process_write = time.time()
+
+
+def remember_client_write(response):
+    """Pin the client's reads to the primary for the lag window after it sends a write"""
+    if request.method not in READ_METHODS and current_app.config.get('DATABASE_REPLICA_URLS'):
+        session['last_write'] = time.time()
+    return response
+
+
+def init_app(app):
+    if not event.contains(RoutingSession, 'after_commit', record_write):
+        event.listen(RoutingSession, 'after_commit', record_write)
+    app.after_request(remember_client_write)
@@ -0,0 +1,223 @@
+"""Full-text search over road, contractor and milestone text.
+
+SQLite keeps an FTS5 table filled by triggers; Postgres keeps a stored,
+generated tsvector column on each source table with a GIN index. Either way
+the database maintains the index itself, so ORM writes, bulk Core statements
+and raw SQL all stay in sync.
+"""
+import html
+import re
+
+from sqlalchemy import text
+
+# kind: (table, title column, body column); the order fixes each kind's rowid offset in FTS5
+SEARCH_SOURCES = {
+    'road': ('road', 'name', 'description'),
+    'contractor': ('contractor', 'name', None),
+    'milestone': ('milestone', 'name', 'description'),
+}
+
+KINDS = list(SEARCH_SOURCES)
+
+FTS_TABLE = 'search_index'
+
+TS_CONFIG = 'english'
+
+# Sentinels wrapped around matches by the database, swapped for <mark> after escaping
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+# Title matches count ten times body matches
+TITLE_WEIGHT = 10.0
+
+SNIPPET_TOKENS = 12
+
+TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return TERM.findall(query.lower())
+
+
+def highlight(value):
+    """HTML-escape a highlighted fragment and turn the match sentinels into <mark> tags"""
+    if value is None:
+        return None
+    return html.escape(value).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+# ------------------------------------------------------------------
+# SQLite FTS5
+# ------------------------------------------------------------------
+def _sqlite_rowid(kind, column='id'):
+    # rowid encodes the source row, so trigger updates and deletes hit one row by key
+    return f'{column} * {len(KINDS)} + {KINDS.index(kind)}'
+
+
+def _sqlite_body(body, prefix):
+    return f"coalesce({prefix}.{body}, '')" if body else "''"
+
+
+def _sqlite_install(connection):
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    for kind, (table, title, body) in SEARCH_SOURCES.items():
+        rowid = _sqlite_rowid(kind, 'new.id')
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{table}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES ({rowid}, new.{title}, {_sqlite_body(body, 'new')}); END"
+        )
+        columns = ', '.join(filter(None, (title, body)))
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{table}_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"UPDATE {FTS_TABLE} SET title = new.{title}, body = {_sqlite_body(body, 'new')} WHERE rowid = {rowid}; END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{table}_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = {_sqlite_rowid(kind, 'old.id')}; END"
+        )
+
+
+def _sqlite_rebuild(connection):
+    connection.exec_driver_sql(f'DELETE FROM {FTS_TABLE}')
+    for kind, (table, title, body) in SEARCH_SOURCES.items():
+        connection.exec_driver_sql(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, body) "
+            f"SELECT {_sqlite_rowid(kind)}, {title}, {_sqlite_body(body, table)} FROM {table}"
+        )
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def _sqlite_uninstall(connection):
+    for table, _, _ in SEARCH_SOURCES.values():
+        for action in ('insert', 'update', 'delete'):
+            connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{table}_{action}')
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _sqlite_search(session, terms, kinds, limit):
+    # Every term is a quoted prefix query, so "meru mau" matches "Meru-Maua Road"
+    match = ' '.join(f'"{term}"*' for term in terms)
+    kind_filter = ''
+    if kinds != KINDS:
+        offsets = ', '.join(str(KINDS.index(kind)) for kind in kinds)
+        kind_filter = f'AND rowid % {len(KINDS)} IN ({offsets})'
+    rows = session.execute(text(
+        f"SELECT rowid, "
+        f"highlight({FTS_TABLE}, 0, :start, :end) AS title, "
+        f"snippet({FTS_TABLE}, 1, :start, :end, '…', {SNIPPET_TOKENS}) AS snippet, "
+        f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match {kind_filter} "
+        f"ORDER BY rank LIMIT :limit"
+    ), {'start': MATCH_START, 'end': MATCH_END, 'match': match, 'limit': limit})
+    return [
+        {
+            'kind': KINDS[rowid % len(KINDS)],
+            'id': rowid // len(KINDS),
+            'title': highlight(title),
+            'snippet': highlight(snippet) or None,
+            # bm25() is lower-is-better; flip it so larger scores rank higher on both backends
+            'score': round(-rank, 4)
+        }
+        for rowid, title, snippet, rank in rows
+    ]
+
+
+# ------------------------------------------------------------------
+# Postgres tsvector
+# ------------------------------------------------------------------
+def _postgres_vector(title, body):
+    vector = f"setweight(to_tsvector('{TS_CONFIG}', coalesce({title}, '')), 'A')"
+    if body:
+        vector += f" || setweight(to_tsvector('{TS_CONFIG}', coalesce({body}, '')), 'B')"
+    return vector
+
+
+def _postgres_install(connection):
+    for table, title, body in SEARCH_SOURCES.values():
+        connection.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({_postgres_vector(title, body)}) STORED"
+        )
+        connection.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)'
+        )
+
+
+def _postgres_uninstall(connection):
+    for table, _, _ in SEARCH_SOURCES.values():
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS ix_{table}_search_vector')
+        connection.exec_driver_sql(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+
+def _postgres_search(session, terms, kinds, limit):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    matches = ' UNION ALL '.join(
+        f"SELECT '{kind}' AS kind, id, {title} AS title, {body or 'NULL'} AS body, "
+        f"ts_rank(search_vector, q.query, 1) AS rank "
+        f"FROM {table}, q WHERE search_vector @@ q.query"
+        for kind, (table, title, body) in SEARCH_SOURCES.items() if kind in kinds
+    )
+    # Headlines are only built for the page of results, after ranking
+    options = f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_TOKENS}, MinWords=4'
+    rows = session.execute(text(
+        f"WITH q AS (SELECT to_tsquery('{TS_CONFIG}', :tsquery) AS query), "
+        f"top AS ({matches} ORDER BY rank DESC LIMIT :limit) "
+        f"SELECT kind, id, "
+        f"ts_headline('{TS_CONFIG}', title, q.query, :title_options) AS title, "
+        f"CASE WHEN body IS NULL THEN NULL ELSE ts_headline('{TS_CONFIG}', body, q.query, :options) END AS snippet, "
+        f"rank FROM top, q ORDER BY rank DESC"
+    ), {'tsquery': tsquery, 'limit': limit, 'options': options, 'title_options': 'HighlightAll=true, ' + options})
+    return [
+        {'kind': kind, 'id': row_id, 'title': highlight(title), 'snippet': highlight(snippet) or None, 'score': round(rank, 4)}
+        for kind, row_id, title, snippet, rank in rows
+    ]
+
+
+# ------------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------------
+def install(connection):
+    """Create the search index structures if missing (idempotent)"""
+    if connection.dialect.name == 'postgresql':
+        _postgres_install(connection)
+    else:
+        _sqlite_install(connection)
+
+
+def rebuild(connection):
+    """Re-index every source row; generated tsvector columns need no rebuild"""
+    if connection.dialect.name != 'postgresql':
+        _sqlite_rebuild(connection)
+
+
+def uninstall(connection):
+    if connection.dialect.name == 'postgresql':
+        _postgres_uninstall(connection)
+    else:
+        _sqlite_uninstall(connection)
+
+
+def search(session, query, kinds=None, limit=20):
+    """Ranked, highlighted matches for every term of query as a prefix"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    kinds = [kind for kind in KINDS if kinds is None or kind in kinds]
+    if session.get_bind().dialect.name == 'postgresql':
+        return _postgres_search(session, terms, kinds, limit)
+    return _sqlite_search(session, terms, kinds, limit)
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter: the search structures are managed here, not by the models"""
+    if reflected and compare_to is None:
+        if type_ == 'table' and name.startswith(FTS_TABLE):
+            return False
+        if type_ == 'column' and name == 'search_vector':
+            return False
+        if type_ == 'index' and name.endswith('_search_vector'):
+            return False
+    return True
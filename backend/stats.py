@@ -0,0 +1,387 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, event, func, insert, inspect, select, update
+
+import versions
+from models import db, Road, RoadStats
+from utils import ROAD_STATS_FIELDS, road_stats_contribution
+
+# Road attributes that feed RoadStats
+TRACKED_ATTRIBUTES = ('status', 'budget', 'progress')
+
+road_stats = RoadStats.__table__
+road_table = Road.__table__
+
+logger = logging.getLogger(__name__)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    """No-op listener; active_history makes flush-time history carry the old value"""
+
+
+def _road_values(road, previous=False):
+    """Return (status, budget, progress) as of now, or before the pending flush"""
+    state = inspect(road)
+    values = []
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(road, name))
+    return values
+
+
+def road_stats_delta(session):
+    """Sum the RoadStats change caused by every Road in the current flush"""
+    delta = dict.fromkeys(ROAD_STATS_FIELDS, 0)
+
+    def apply(values, sign):
+        for field, amount in road_stats_contribution(*values).items():
+            delta[field] += sign * amount
+
+    for obj in session.new:
+        if isinstance(obj, Road):
+            apply(_road_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Road):
+            apply(_road_values(obj, previous=True), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Road) and session.is_modified(obj):
+            apply(_road_values(obj, previous=True), -1)
+            apply(_road_values(obj), 1)
+    return delta
+
+
+def _road_stats_columns():
+    progress = func.coalesce(Road.progress, 0)
+    return (
+        func.count(Road.id),
+        func.coalesce(func.sum(case((Road.status == 'completed', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Road.status == 'ongoing', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Road.status == 'planned', 1), else_=0)), 0),
+        func.coalesce(func.sum(Road.budget), 0),
+        func.coalesce(func.sum(Road.budget * progress / 100), 0)
+    )
+
+
+def compute_road_stats(connection):
+    """Full recompute of RoadStats totals with one aggregate query"""
+    row = connection.execute(select(*_road_stats_columns())).one()
+    return dict(zip(ROAD_STATS_FIELDS, (int(value) for value in row)))
+
+
+def compute_road_stats_version(connection):
+    """(totals, roads version) read by one statement, so the totals include exactly the writes up to that version"""
+    version = select(versions.data_version.c.version).where(versions.data_version.c.name == versions.ROADS)
+    *row, version = connection.execute(select(*_road_stats_columns(), version.scalar_subquery())).one()
+    return dict(zip(ROAD_STATS_FIELDS, (int(value) for value in row))), version or 0
+
+
+def apply_road_stats_delta(connection, delta):
+    """Add delta to the live RoadStats row, creating it from a full recompute if missing"""
+    result = connection.execute(
+        update(road_stats)
+        .where(road_stats.c.is_live.is_(True))
+        .values({field: road_stats.c[field] + delta[field] for field in ROAD_STATS_FIELDS})
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(road_stats).values(is_live=True, **compute_road_stats(connection)))
+
+
+def write_road_stats(connection, totals):
+    """Overwrite the live RoadStats row with totals, creating it if missing"""
+    result = connection.execute(update(road_stats).where(road_stats.c.is_live.is_(True)).values(**totals))
+    if result.rowcount == 0:
+        connection.execute(insert(road_stats).values(is_live=True, **totals))
+
+
+class StatsWorker:
+    """Applies committed RoadStats deltas off the request path.
+
+    The first delta after an idle period starts a wait of one interval;
+    everything committed during that wait is summed and written with a
+    single UPDATE, so a burst of PATCHes costs at most one write per interval.
+
+    Each delta carries the roads data version (versions.py) its transaction
+    committed. A recompute reads the version with its totals, and deltas
+    submitted meanwhile at or below it are dropped, since the totals
+    already include them.
+    """
+
+    def __init__(self, interval_ms=500):
+        self.interval = interval_ms / 1000
+        self.synchronous = False
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        self._pending = []
+        self._pending_writes = 0
+        self._pending_since = None
+        self._recompute = False
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('STATS_FLUSH_INTERVAL_MS', 500) / 1000
+        self.synchronous = not app.config.get('STATS_ASYNC', True)
+        atexit.register(self.flush)
+
+    def _enqueue(self):
+        if self.synchronous:
+            self.flush()
+            return
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so each forked gunicorn worker gets its own thread
+            self._thread = threading.Thread(target=self._run, name='stats-worker', daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def submit(self, delta, version=None):
+        """Queue a delta from a committed transaction and the roads version it committed"""
+        with self._lock:
+            self._pending.append((version, delta))
+            self._pending_writes += 1
+            if self._pending_since is None:
+                self._pending_since = time.time()
+        self._enqueue()
+
+    def request_recompute(self):
+        """Replace the live totals with a full recompute on the next flush"""
+        with self._lock:
+            self._recompute = True
+            self._pending_writes += 1
+            if self._pending_since is None:
+                self._pending_since = time.time()
+        self._enqueue()
+
+    def staleness(self):
+        """How far the live row lags behind committed road writes"""
+        with self._lock:
+            since = self._pending_since
+            return {
+                'pending_writes': self._pending_writes,
+                'pending_ms': 0 if since is None else int((time.time() - since) * 1000)
+            }
+
+    def flush(self):
+        """Write everything pending now"""
+        with self._lock:
+            pending, writes, since, recompute = self._pending, self._pending_writes, self._pending_since, self._recompute
+            self._reset()
+        if not writes or self.app is None:
+            return
+        delta = dict.fromkeys(ROAD_STATS_FIELDS, 0)
+        for _, change in pending:
+            for field in ROAD_STATS_FIELDS:
+                delta[field] += change[field]
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    if recompute:
+                        # Deltas already committed are part of the recompute
+                        totals, version = compute_road_stats_version(connection)
+                        write_road_stats(connection, totals)
+                    elif any(delta.values()):
+                        apply_road_stats_delta(connection, delta)
+        except Exception:
+            logger.exception("Failed to apply road stats; will retry")
+            with self._lock:
+                self._pending[:0] = pending
+                self._pending_writes += writes
+                self._pending_since = min(filter(None, (since, self._pending_since)), default=since)
+                self._recompute = self._recompute or recompute
+            self._wakeup.set()
+            return
+        if recompute:
+            self._drop_included(version)
+
+    def _drop_included(self, version):
+        """Forget deltas submitted since the drain whose transactions the recompute at version already saw"""
+        with self._lock:
+            kept = [entry for entry in self._pending if entry[0] is None or entry[0] > version]
+            self._pending_writes -= len(self._pending) - len(kept)
+            self._pending = kept
+            if not self._pending_writes:
+                self._pending_since = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+stats_worker = StatsWorker()
+
+
+class ViewCounter:
+    """Road detail views summed in memory and added to Road.view_count off the request path.
+
+    Like StatsWorker, the first view after an idle period starts a wait of
+    one interval and everything counted meanwhile is written together, so
+    views cost one executemany UPDATE per interval rather than one per
+    request. The counts are shared by every worker through the road table.
+    """
+
+    def __init__(self, interval_ms=5000):
+        self.interval = interval_ms / 1000
+        self.synchronous = False
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pending = Counter()
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('VIEW_FLUSH_INTERVAL_MS', 5000) / 1000
+        self.synchronous = not app.config.get('STATS_ASYNC', True)
+        atexit.register(self.flush)
+
+    def record(self, road_id):
+        with self._lock:
+            self._pending[road_id] += 1
+        if self.synchronous:
+            self.flush()
+            return
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so each forked gunicorn worker gets its own thread
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def flush(self):
+        """Write every pending view now"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending or self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(road_table)
+                        .where(road_table.c.id == bindparam('road_id'))
+                        .values(view_count=road_table.c.view_count + bindparam('views')),
+                        [{'road_id': road_id, 'views': views} for road_id, views in pending.items()]
+                    )
+        except Exception:
+            logger.exception("Failed to record road views; will retry")
+            with self._lock:
+                self._pending.update(pending)
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+view_counter = ViewCounter()
+
+
+def load_view_counts(session):
+    """(road_id, views) for every road that has been viewed"""
+    return session.execute(select(road_table.c.id, road_table.c.view_count).where(road_table.c.view_count > 0))
+
+
+def track_road_stats(session, flush_context):
+    delta = road_stats_delta(session)
+    if any(delta.values()):
+        pending = session.info.setdefault('road_stats_delta', dict.fromkeys(ROAD_STATS_FIELDS, 0))
+        for field in ROAD_STATS_FIELDS:
+            pending[field] += delta[field]
+
+
+def submit_road_stats(session):
+    delta = session.info.pop('road_stats_delta', None)
+    if delta is not None:
+        # The versions hooks run first (see create_app), so the commit's version is known
+        stats_worker.submit(delta, versions.committed(session, versions.ROADS))
+
+
+def discard_road_stats(session):
+    session.info.pop('road_stats_delta', None)
+
+
+def get_live_stats():
+    return RoadStats.query.filter_by(is_live=True).first()
+
+
+def snapshot_road_stats():
+    """Copy the live totals into a history row"""
+    live = get_live_stats()
+    if live is None:
+        return None
+    snapshot = RoadStats(is_live=False, **{field: getattr(live, field) for field in ROAD_STATS_FIELDS})
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def compact_road_stats(keep_days=30):
+    """Thin history older than keep_days to the last snapshot of each day"""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    snapshots = (
+        db.session.query(RoadStats.id, RoadStats.last_updated)
+        .filter(RoadStats.is_live.is_(False), RoadStats.last_updated < cutoff)
+        .order_by(RoadStats.last_updated.desc())
+    )
+    seen_days = set()
+    stale_ids = []
+    for snapshot_id, last_updated in snapshots:
+        day = last_updated.date()
+        if day in seen_days:
+            stale_ids.append(snapshot_id)
+        else:
+            seen_days.add(day)
+    for start in range(0, len(stale_ids), 500):
+        RoadStats.query.filter(RoadStats.id.in_(stale_ids[start:start + 500])).delete(synchronize_session=False)
+    db.session.commit()
+    return len(stale_ids)
+
+
+def reconcile_road_stats(fix=False):
+    """Compare live totals with a full recompute; return {field: (live, expected)} mismatches"""
+    expected = compute_road_stats(db.session.connection())
+    live = get_live_stats()
+    if live is None:
+        mismatches = {field: (None, value) for field, value in expected.items()}
+    else:
+        mismatches = {
+            field: (getattr(live, field), value)
+            for field, value in expected.items()
+            if getattr(live, field) != value
+        }
+    if fix and mismatches:
+        if live is None:
+            live = RoadStats(is_live=True)
+            db.session.add(live)
+        for field, value in expected.items():
+            setattr(live, field, value)
+        db.session.commit()
+    return mismatches
+
+
+def init_app(app):
+    """Collect road stats deltas per transaction and hand them to the worker on commit"""
+    stats_worker.init_app(app)
+    view_counter.init_app(app)
+    if not event.contains(db.session, 'after_flush', track_road_stats):
+        for name in TRACKED_ATTRIBUTES:
+            event.listen(getattr(Road, name), 'set', _load_old_value, active_history=True)
+        event.listen(db.session, 'after_flush', track_road_stats)
+        event.listen(db.session, 'after_commit', submit_road_stats)
+        event.listen(db.session, 'after_rollback', discard_road_stats)
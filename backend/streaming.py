@@ -0,0 +1,72 @@
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON = 'application/x-ndjson'
+
+# Rows fetched per database round trip while streaming
+YIELD_PER = 500
+
+# Serialized rows are buffered into chunks of roughly this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+def wants_ndjson():
+    """True when the client prefers newline-delimited JSON over a JSON array"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def json_envelope(envelope, key):
+    """Split an object around an empty list at key, e.g. a FeatureCollection's features"""
+    body = current_app.json.dumps({**envelope, key: []})
+    split = body.rindex('[]') + 1
+    return body[:split], body[split:]
+
+
+def chunked(parts):
+    """Join small strings into larger chunks to keep per-write overhead low"""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def json_parts(rows, serialize=None, envelope=None, key=None):
+    """Yield the pieces of a JSON array (or envelope around one) of serialized rows.
+
+    Without serialize, rows are encoded as they are.
+    """
+    dumps = current_app.json.dumps
+    if serialize is not None:
+        rows = map(serialize, rows)
+    head, tail = json_envelope(envelope, key) if envelope is not None else ('[', ']')
+    yield head
+    first = True
+    for row in rows:
+        yield dumps(row) if first else ',' + dumps(row)
+        first = False
+    yield tail
+
+
+def stream_json(rows, serialize=None, envelope=None, key=None, headers=None):
+    """Stream rows one serialized item at a time.
+
+    rows should be a lazily iterated query (e.g. with yield_per) so neither
+    the ORM objects nor the encoded body are ever held in full. Clients
+    asking for application/x-ndjson get one item per line; everyone else
+    gets a JSON array, or envelope with the array under key.
+    """
+    if wants_ndjson():
+        dumps = current_app.json.dumps
+        if serialize is not None:
+            rows = map(serialize, rows)
+        parts = (dumps(row) + '\n' for row in rows)
+        return Response(stream_with_context(chunked(parts)), mimetype=NDJSON, headers=headers)
+
+    parts = json_parts(rows, serialize, envelope, key)
+    return Response(stream_with_context(chunked(parts)), mimetype='application/json', headers=headers)
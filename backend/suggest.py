@@ -0,0 +1,273 @@
+"""In-memory typeahead over road, contractor and place names.
+
+Every word suffix of a normalized name ("meru maua road", "maua road",
+"road") sits in one sorted list, so a prefix lookup is a pair of bisects and
+"mau" finds "Meru-Maua Road". Places are the words of road names that are
+not road-type words ("Meru-Maua Road" serves Meru and Maua).
+
+Matches rank by popularity, then recency:
+- roads by detail views (Road.view_count, shared by every worker, plus the
+  views this worker counted since it last read them), then id
+- contractors by the number of roads they are linked to, then id
+- places by the number of roads naming them, then the newest of those roads
+
+Like RoadIndex, each worker keeps its own copy, loads it on first use,
+updates it after its own writes and rebuilds it when the shared data
+version moves.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+KINDS = ('road', 'contractor', 'place')
+
+WORD = re.compile(r'[^\W_]+')
+
+# Words in road names that describe the road rather than the place it serves
+ROAD_WORDS = frozenset({
+    'road', 'rd', 'highway', 'hwy', 'bypass', 'junction', 'link', 'access', 'feeder', 'street', 'st',
+    'avenue', 'ave', 'lane', 'drive', 'way', 'route', 'loop', 'ring', 'spur', 'bridge', 'and', 'the', 'to'
+})
+
+# Prefix ranges up to this many entries are ranked on every lookup; broader
+# ones keep a cached top list that writes update in place
+SCAN_LIMIT = 256
+TOP_CACHE_SIZE = 50
+
+# Sorts after every character a normalized key can contain
+KEY_END = '\U0010ffff'
+
+
+def normalize(text):
+    """Lower-cased words of text without accents, joined by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(WORD.findall(text.lower()))
+
+
+def name_keys(name):
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def place_names(road_name):
+    """Capitalised words of a road name that name places rather than the road"""
+    return {
+        normalize(word): word for word in WORD.findall(road_name or '')
+        if word[0].isupper() and len(word) > 1 and word.lower() not in ROAD_WORDS
+    }
+
+
+class SuggestIndex:
+    """Sorted (key, kind, ident) entries for prefix lookups, ranked by (popularity, recency)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._views = Counter()
+        self._reset()
+        self.loaded = False
+        # Shared data version (versions.py) the contents match
+        self.version = None
+        # time.monotonic() when the shared view counts were last read
+        self.views_read = 0.0
+
+    def _reset(self):
+        self._entries = []
+        self._names = {}
+        self._keys = {}
+        self._scores = {}
+        # ('contractor', id) / ('place', ident) -> ids of the roads that reference it
+        self._linked = defaultdict(set)
+        self._road_links = {}
+        # prefix -> {kinds: [(score, kind, ident), ...] best first}
+        self._top = defaultdict(dict)
+
+    def __len__(self):
+        return len(self._names)
+
+    def _score(self, item):
+        kind, ident = item
+        if kind == 'road':
+            return (self._views[ident], ident)
+        roads = self._linked.get(item, ())
+        return (len(roads), max(roads, default=0) if kind == 'place' else ident)
+
+    def _link(self, road_id, road_name, contractor_ids):
+        """Point the road's contractors and places at it; returns the items whose links changed"""
+        places = place_names(road_name)
+        for ident, word in places.items():
+            self._names.setdefault(('place', ident), word)
+        old = self._road_links.get(road_id, frozenset())
+        new = frozenset({('contractor', contractor_id) for contractor_id in contractor_ids} |
+                        {('place', ident) for ident in places})
+        for item in old - new:
+            self._linked[item].discard(road_id)
+        for item in new - old:
+            self._linked[item].add(road_id)
+        self._road_links[road_id] = new
+        return old ^ new
+
+    def build(self, roads, contractors, links):
+        """Replace the index contents.
+
+        roads are (id, name, views) rows, contractors (id, name) rows and
+        links (road_id, contractor_id) pairs.
+        """
+        road_contractors = defaultdict(set)
+        for road_id, contractor_id in links:
+            road_contractors[road_id].add(contractor_id)
+        with self._lock:
+            self._reset()
+            self._views = Counter()
+            for contractor_id, name in contractors:
+                self._names[('contractor', contractor_id)] = name
+            for road_id, name, views in roads:
+                self._names[('road', road_id)] = name
+                self._views[road_id] = views or 0
+                self._link(road_id, name, road_contractors.get(road_id, ()))
+            entries = []
+            for item, name in self._names.items():
+                self._keys[item] = keys = name_keys(name)
+                self._scores[item] = self._score(item)
+                entries.extend((key,) + item for key in keys)
+            entries.sort()
+            self._entries = entries
+            self._warm()
+            self.loaded = True
+
+    def _warm(self):
+        """Fill the cached top lists of every prefix too broad to rank per lookup"""
+        # Each broad prefix range splits into contiguous ranges one character longer
+        ranges = [(0, len(self._entries), '')]
+        while ranges:
+            start, stop, parent = ranges.pop()
+            i = start
+            while i < stop:
+                key = self._entries[i][0]
+                if len(key) == len(parent):
+                    i += 1
+                    continue
+                prefix = key[:len(parent) + 1]
+                end = bisect_left(self._entries, (prefix + KEY_END,), i, stop)
+                if end - i > SCAN_LIMIT:
+                    self._top[prefix][KINDS] = self._rank(i, end, KINDS, TOP_CACHE_SIZE)
+                    ranges.append((i, end, prefix))
+                i = end
+
+    def _discard_entries(self, item, keys):
+        for key in keys:
+            entry = (key,) + item
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def _put(self, item, name):
+        """Insert or re-rank one item, keeping cached top lists current"""
+        keys = name_keys(name)
+        old_keys = self._keys.get(item, [])
+        if keys != old_keys:
+            self._discard_entries(item, old_keys)
+            for key in keys:
+                insort(self._entries, (key,) + item)
+        old_score = self._scores.get(item)
+        self._names[item] = name
+        self._keys[item] = keys
+        self._scores[item] = score = self._score(item)
+        self._refresh_top(item, old_score, score, old_keys, keys)
+
+    def _remove(self, item):
+        old_keys = self._keys.pop(item, [])
+        self._discard_entries(item, old_keys)
+        self._names.pop(item, None)
+        self._linked.pop(item, None)
+        self._refresh_top(item, self._scores.pop(item, None), None, old_keys, [])
+
+    def _refresh_top(self, item, old_score, score, old_keys, keys):
+        # Only lists cached under a prefix of the item's old or new keys can hold it
+        kind, ident = item
+        prefixes = {key[:end] for key in (*old_keys, *keys) for end in range(1, len(key) + 1)}
+        for prefix in prefixes & self._top.keys():
+            cached = self._top[prefix]
+            matches = score is not None and any(key.startswith(prefix) for key in keys)
+            for kinds, top in list(cached.items()):
+                if kind not in kinds:
+                    continue
+                was_full = len(top) == TOP_CACHE_SIZE
+                if old_score is not None and (old_score, kind, ident) in top:
+                    top.remove((old_score, kind, ident))
+                    if was_full and (not matches or score < old_score):
+                        # A match outside the cached list may now outrank it
+                        del cached[kinds]
+                        continue
+                if matches and (len(top) < TOP_CACHE_SIZE or (score, kind, ident) > top[-1]):
+                    top.append((score, kind, ident))
+                    top.sort(reverse=True)
+                    del top[TOP_CACHE_SIZE:]
+
+    def upsert_road(self, road_id, name, contractor_ids=None):
+        """Index a created or renamed road; contractor_ids=None keeps its known contractors"""
+        with self._lock:
+            if contractor_ids is None:
+                contractor_ids = [ident for kind, ident in self._road_links.get(road_id, ()) if kind == 'contractor']
+            changed = self._link(road_id, name, contractor_ids)
+            self._put(('road', road_id), name)
+            for item in changed:
+                if item[0] == 'place' and not self._linked[item]:
+                    self._remove(item)
+                elif item in self._names:
+                    self._put(item, self._names[item])
+
+    def upsert_contractor(self, contractor_id, name):
+        with self._lock:
+            self._put(('contractor', contractor_id), name)
+
+    def update_views(self, counts):
+        """Take the shared view counts from (road_id, views) rows, re-ranking roads whose count moved"""
+        with self._lock:
+            for road_id, views in counts:
+                if self._views[road_id] == views:
+                    continue
+                self._views[road_id] = views
+                item = ('road', road_id)
+                if self.loaded and item in self._names:
+                    self._put(item, self._names[item])
+
+    def record_view(self, road_id):
+        """Count a road detail view towards its popularity until the shared counts are next read"""
+        item = ('road', road_id)
+        with self._lock:
+            # Ids the index does not hold are ignored, so the counter stays bounded by the roads
+            if self.loaded and item not in self._names:
+                return
+            self._views[road_id] += 1
+            if self.loaded:
+                self._put(item, self._names[item])
+
+    def _rank(self, start, stop, kinds, limit):
+        items = {entry[1:] for entry in self._entries[start:stop] if entry[1] in kinds}
+        scores = self._scores
+        return heapq.nlargest(limit, ((scores[item], *item) for item in items))
+
+    def suggest(self, query, limit=10, kinds=KINDS):
+        """Top matches whose name has a word starting with query, best first"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        kinds = tuple(kind for kind in KINDS if kind in kinds)
+        with self._lock:
+            start = bisect_left(self._entries, (prefix,))
+            stop = bisect_left(self._entries, (prefix + KEY_END,))
+            if stop - start <= SCAN_LIMIT or limit > TOP_CACHE_SIZE:
+                ranked = self._rank(start, stop, kinds, limit)
+            else:
+                top = self._top[prefix].get(kinds)
+                if top is None:
+                    top = self._top[prefix][kinds] = self._rank(start, stop, kinds, TOP_CACHE_SIZE)
+                ranked = top[:limit]
+            return [
+                {'kind': kind, 'id': None if kind == 'place' else ident, 'name': self._names[(kind, ident)]}
+                for _, kind, ident in ranked
+            ]
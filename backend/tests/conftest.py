@@ -0,0 +1,63 @@
+import pytest
+
+import app as meru
+from cache import payload_cache
+from config import config
+
+
+def make_config(tmp_path, **overrides):
+    """Config for an app on its own SQLite file under tmp_path"""
+    settings = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'meru_roads.db'}",
+        'DATABASE_REPLICA_URLS': [],
+        # Stats deltas are applied in the request, so tests see them at once
+        'STATS_ASYNC': False,
+        # Versions restart with every test database, so never trust a remembered one
+        'DATA_VERSION_CHECK_MS': 0,
+        # Cached responses would issue no SQL at all
+        'RESPONSE_CACHE_ENABLED': False,
+        'RESPONSE_CACHE_URL': None,
+        'TILE_CACHE_DIR': str(tmp_path / 'tile_cache'),
+        'MEDIA_ROOT': str(tmp_path / 'media'),
+        'MEDIA_SPOOL_DIR': str(tmp_path / 'media_spool'),
+        **overrides,
+    }
+    return type('TestConfig', (config,), settings)
+
+
+def seed(application):
+    result = application.test_cli_runner().invoke(args=['initdb'])
+    if result.exception is not None:
+        raise result.exception
+
+
+def reset_indexes():
+    """Forget in-process state built from another test's database"""
+    meru.road_index.loaded = False
+    meru.spatial_index.loaded = False
+    meru.suggestions.loaded = False
+    meru.road_metrics.version = None
+    payload_cache.clear()
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = meru.create_app(make_config(tmp_path))
+    reset_indexes()
+    seed(application)
+    yield application
+    with application.app_context():
+        for engine in meru.db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def engines(app):
+    with app.app_context():
+        return list(meru.db.engines.values())
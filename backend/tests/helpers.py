@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def capture_queries(*engines):
+    """Record (engine, statement, parameters) for every SQL statement the engines execute inside the block"""
+    statements = []
+    # Background threads (e.g. the stats worker) share the engines; ignore them
+    thread = threading.get_ident()
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append((conn.engine, statement, parameters))
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+
+
+def fetch(client, url):
+    """Request url and drain the body so queries made while streaming run too"""
+    response = client.get(url)
+    response.get_data()
+    response.close()
+    return response
+
+
+def fetch_queries(client, engines, url):
+    """(response, [(engine, statement, parameters), ...]) for one request"""
+    with capture_queries(*engines) as statements:
+        response = fetch(client, url)
+    return response, statements
+
+
+def full_scans(engine, statement, parameters):
+    """Tables the database plans to read in full for a SELECT.
+
+    A scan that walks an index (e.g. in ORDER BY ... LIMIT order) is not
+    counted. Postgres is asked with sequential scans disabled, so tiny test
+    tables do not make it prefer one that an index could avoid.
+    """
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            details = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+            scans = [detail.split()[1:] for detail in details if detail.startswith('SCAN ') and ' USING ' not in detail]
+            # Older SQLite versions print "SCAN TABLE road"
+            tables = [words[1] if words[0] == 'TABLE' and len(words) > 1 else words[0] for words in scans]
+            return [table for table in tables if not table.startswith('(') and table != 'CONSTANT']
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        lines = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        connection.rollback()
+        return [line.split(' on ', 1)[1].split()[0] for line in lines if 'Seq Scan on ' in line]
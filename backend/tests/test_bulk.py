@@ -0,0 +1,57 @@
+import json
+
+from models import db
+
+HEADER = b'name,length,budget,status,start_date,end_date,description\n'
+
+
+def road(name, length=3.5):
+    return {'name': name, 'length': length, 'budget': 1000000, 'status': 'planned',
+            'start_date': '2026-01-01', 'end_date': '2026-12-31', 'description': 'Bulk'}
+
+
+def post(client, body, mimetype):
+    response = client.post('/api/roads/bulk', data=body, content_type=mimetype)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {result['line']: result for result in lines[:-1]}, lines[-1]['summary']
+
+
+def ndjson(*rows):
+    return '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows).encode()
+
+
+def test_bad_lengths_are_row_errors(client):
+    body = ndjson(road('Kithoka Road'), '{"name": "NaN Road", "length": NaN}',
+                  road('Inf Road', 'inf'), road('Negative Road', -1), road('Gikumene Road', '0'))
+    results, summary = post(client, body, 'application/x-ndjson')
+    assert summary == {'created': 2, 'updated': 0, 'error': 3}
+    assert [results[line]['status'] for line in (1, 5)] == ['created', 'created']
+    assert all(results[line]['error'] == 'Invalid length' for line in (3, 4))
+
+
+def test_bad_encoding_is_a_row_error(client):
+    body = (HEADER
+            + b'Kaaga Road,2,500000,planned,2026-01-01,2026-06-30,Ok\n'
+            + b'Bad \xff Road,2,500000,planned,2026-01-01,2026-06-30,Latin-1\n'
+            + b'Gitoro Road,2,500000,planned,2026-01-01,2026-06-30,Ok\n')
+    results, summary = post(client, body, 'text/csv')
+    assert summary == {'created': 2, 'updated': 0, 'error': 1}
+    assert results[3] == {'line': 3, 'status': 'error', 'error': 'Invalid UTF-8'}
+    assert results[4]['status'] == 'created'
+
+
+def test_database_error_fails_only_its_row(app, client):
+    with app.app_context():
+        db.session.execute(db.text(
+            "CREATE TRIGGER reject_road BEFORE INSERT ON road WHEN NEW.name = 'Rejected Road' "
+            "BEGIN SELECT RAISE(ABORT, 'rejected by trigger'); END"
+        ))
+        db.session.commit()
+    results, summary = post(client, ndjson(road('Mwiteria Road'), road('Rejected Road'), road('Kooje Road')),
+                            'application/x-ndjson')
+    assert summary == {'created': 2, 'updated': 0, 'error': 1}
+    assert results[2] == {'line': 2, 'status': 'error', 'error': 'rejected by trigger'}
+    names = {road['name'] for road in client.get('/api/roads?limit=1000').get_json()}
+    assert {'Mwiteria Road', 'Kooje Road'} <= names
+    assert 'Rejected Road' not in names
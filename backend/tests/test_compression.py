@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+
+from compression import CODECS
+from tests.helpers import fetch
+
+
+@pytest.fixture(autouse=True)
+def min_size(app, monkeypatch):
+    # The seeded bodies are small; keep the threshold below them but above tiny ones
+    monkeypatch.setitem(app.config, 'COMPRESSION_MIN_SIZE', 64)
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def get(client, url, accept=None):
+    response = fetch(client, url) if accept is None else client.get(url, headers={'Accept-Encoding': accept})
+    return response, response.get_data()
+
+
+@pytest.mark.parametrize('url', ['/api/map/roads', '/api/roads?limit=1000'])
+@pytest.mark.parametrize('encoding', sorted(CODECS))
+def test_negotiated_body_matches_identity(client, url, encoding):
+    plain, plain_body = get(client, url)
+    encoded, encoded_body = get(client, url, encoding)
+    assert plain.headers.get('Content-Encoding') is None
+    assert encoded.headers['Content-Encoding'] == encoding
+    assert decompress(encoded_body, encoding) == plain_body
+    for response in (plain, encoded):
+        assert 'Accept-Encoding' in response.vary
+
+
+def test_refused_and_unknown_encodings_send_identity(client):
+    for accept in ('gzip;q=0', 'compress', 'identity'):
+        response, _ = get(client, '/api/map/roads', accept)
+        assert response.headers.get('Content-Encoding') is None
+        assert 'Accept-Encoding' in response.vary
+
+
+def test_preference_follows_quality(client):
+    response, _ = get(client, '/api/map/roads', 'br;q=0.1, zstd;q=0.1, gzip;q=0.9')
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_bodies_are_not_compressed(client):
+    response, _ = get(client, '/api/notifications/unread-count', 'gzip')
+    assert response.headers.get('Content-Encoding') is None
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_encodings_get_their_own_etag(client):
+    plain, _ = get(client, '/api/map/roads')
+    encoded, _ = get(client, '/api/map/roads', 'gzip')
+    assert encoded.get_etag()[0] == f'{plain.get_etag()[0]}-gzip'
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from coordinates import ENCODINGS, LineCoordinates, decode_array, encode_coordinates, vertex_count
+
+LINE = [[37.6496, 0.0463], [37.65123456, 0.04712345], [37.6401, -0.0012], [-179.9999999, -89.9999999], [180.0, 90.0]]
+
+# Largest error each encoding may introduce, in degrees
+TOLERANCE = {'f64': 0, 'f32': 1e-5, 'varint': 0.5 / 10_000_000}
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_round_trip(encoding):
+    data = encode_coordinates(LINE, encoding)
+    assert data[0] == ENCODINGS[encoding]
+    assert vertex_count(data) == len(LINE)
+    decoded = decode_array(data)
+    assert decoded.shape == (len(LINE), 2)
+    assert np.abs(decoded - np.asarray(LINE)).max() <= TOLERANCE[encoding]
+    assert LineCoordinates(data).tolist() == decoded.tolist()
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_round_trip_accepts_geojson_and_empty_lines(encoding):
+    geometry = {'type': 'LineString', 'coordinates': LINE[:2]}
+    assert decode_array(encode_coordinates(geometry, encoding)).shape == (2, 2)
+    assert decode_array(encode_coordinates([], encoding)).shape == (0, 2)
+
+
+def test_stored_road_reads_back(client):
+    created = client.post('/api/roads', json={
+        'name': 'Kinoru Link', 'length': 1.2, 'budget': 250000, 'status': 'planned',
+        'start_date': '2026-01-01', 'end_date': '2026-03-31', 'description': 'Link', 'map_coordinates': LINE[:3],
+    })
+    assert created.status_code == 201
+    stored = client.get(f"/api/roads/{created.get_json()['id']}").get_json()['map_coordinates']
+    assert np.abs(np.asarray(stored) - np.asarray(LINE[:3])).max() <= max(TOLERANCE.values())
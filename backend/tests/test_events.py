@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+import events
+from tests.test_versions import database_path
+
+STREAMS = ['/api/notifications/stream', '/api/roads/events']
+
+
+@pytest.mark.parametrize('url', STREAMS)
+def test_head_releases_subscription(client, url):
+    open_streams = events.broker.connections()
+    response = client.head(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+    assert events.broker.connections() == open_streams
+
+
+@pytest.mark.parametrize('url', STREAMS)
+def test_disconnect_releases_subscription(client, url):
+    open_streams = events.broker.connections()
+    response = client.get(url)
+    assert events.broker.connections() == open_streams + 1
+    assert next(response.response).startswith(b'retry:')
+    # The client goes away after the first message
+    response.close()
+    assert events.broker.connections() == open_streams
+
+
+@pytest.fixture
+def road_stream(app):
+    # Changes made while seeding go out before the stream opens
+    events.road_events.flush()
+    subscription = events.broker.subscribe(events.ROADS_TOPIC)
+    # Start from the current shared version, as a stream opened now would
+    events.road_events.check_version()
+    yield subscription
+    events.broker.unsubscribe(subscription)
+
+
+def next_message(subscription):
+    events.road_events.flush()
+    return subscription.events.get(timeout=2)[1]
+
+
+def test_foreign_write_sends_reload(app, road_stream):
+    # Committed by another process: no hook in this one sees it
+    with sqlite3.connect(database_path(app)) as connection:
+        connection.execute('UPDATE road SET progress = 99 WHERE id = 1')
+        connection.execute("UPDATE data_version SET version = version + 1 WHERE name = 'roads'")
+    events.road_events.check_version()
+    assert next_message(road_stream) == {'reload': True}
+
+
+def test_own_write_sends_no_reload(client, road_stream):
+    assert client.patch('/api/roads/1/progress', json={'progress': 99}).status_code == 200
+    assert next_message(road_stream)['roads'] == [{'id': 1, 'progress': 99, 'status': 'ongoing'}]
+    events.road_events.check_version()
+    events.road_events.flush()
+    assert road_stream.events.empty()
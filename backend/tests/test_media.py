@@ -0,0 +1,81 @@
+import io
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import media
+from models import db, Photo
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def png(width=800, height=600, colour=(200, 120, 40)):
+    buffer = io.BytesIO()
+    PIL.new('RGB', (width, height), colour).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def upload(client, body, road_id=1):
+    response = client.post(f'/api/roads/{road_id}/photos/upload', data=body, content_type='application/octet-stream')
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def stored_files(app, folder):
+    root = os.path.join(app.config['MEDIA_ROOT'], folder)
+    return [os.path.join(path, name) for path, _, names in os.walk(root) for name in names]
+
+
+class HeldPool:
+    """Stands in for the process pool, keeping every job pending until released"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, *args):
+        future = Future()
+        self.jobs.append(future)
+        return future
+
+
+def test_same_content_is_stored_and_resized_once(app, client):
+    body = png()
+    first = upload(client, body)
+    second = upload(client, body, road_id=2)
+    assert first['url'] == second['url']
+    assert len(stored_files(app, 'originals')) == 1
+
+    # Waits for the queued job
+    media.thumbnail_queue.shutdown()
+    with app.app_context():
+        srcsets = {photo.srcset for photo in Photo.query.filter(Photo.content_hash.isnot(None))}
+    assert len(srcsets) == 1 and None not in srcsets
+    srcset = srcsets.pop()
+    # Widths narrower than the 800 px original, then the original itself
+    assert [candidate.rsplit(' ', 1)[1] for candidate in srcset.split(', ')] == ['320w', '640w', '800w']
+    assert len(stored_files(app, 'thumbs')) == 2
+
+    # Made once already: a third upload gets the srcset at once
+    assert upload(client, body)['srcset'] == srcset
+
+
+def test_overlapping_uploads_queue_one_job(app, client, monkeypatch):
+    pool = HeldPool()
+    monkeypatch.setattr(media.thumbnail_queue, '_pool', lambda: pool)
+    body = png(colour=(10, 200, 90))
+    upload(client, body)
+    upload(client, body, road_id=2)
+    assert len(pool.jobs) == 1
+
+    # Once it ends, even unsuccessfully, the next upload of that content queues again
+    pool.jobs[0].set_exception(RuntimeError('worker died'))
+    upload(client, body, road_id=3)
+    assert len(pool.jobs) == 2
+    pool.jobs[1].set_exception(RuntimeError('worker died'))
+    assert os.listdir(app.config['MEDIA_SPOOL_DIR']) == []
+
+
+def test_rejects_what_is_not_an_image(client):
+    response = client.post('/api/roads/1/photos/upload', data=b'%PDF-1.7', content_type='application/octet-stream')
+    assert response.status_code == 400
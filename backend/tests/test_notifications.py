@@ -0,0 +1,53 @@
+from models import db, Notification, User
+import notifications
+
+
+def unread(client):
+    return client.get('/api/notifications/unread-count').get_json()['unread']
+
+
+def unread_ids(client):
+    return sorted(notification['id'] for notification in client.get('/api/notifications').get_json())
+
+
+def test_mark_read_by_ids_and_watermark(client):
+    ids = unread_ids(client)
+    assert len(ids) >= 3
+    assert unread(client) == len(ids)
+
+    # Unknown and repeated ids are ignored
+    response = client.post('/api/notifications/read', json={'ids': [ids[0], ids[0], 999999]})
+    assert response.get_json() == {'marked': 1, 'unread': len(ids) - 1}
+    assert client.post('/api/notifications/read', json={'ids': [ids[0]]}).get_json()['marked'] == 0
+
+    # before is inclusive
+    response = client.post('/api/notifications/read', json={'before': ids[-2]})
+    assert response.get_json() == {'marked': len(ids) - 2, 'unread': 1}
+    assert unread_ids(client) == [ids[-1]]
+    assert unread(client) == 1
+
+
+def test_invalid_requests_change_nothing(client):
+    before = unread(client)
+    for body in ({}, {'ids': 'all'}, {'ids': [True]}, {'before': '5'}, {'ids': list(range(1001))}):
+        assert client.post('/api/notifications/read', json=body).status_code == 400
+    assert unread(client) == before
+
+
+def test_counter_follows_orm_writes(app, client):
+    before = unread(client)
+    with app.app_context():
+        user = User.query.filter_by(email='admin@meruroads.co.ke').one()
+        db.session.add(Notification(user=user, message='Inspection booked'))
+        db.session.commit()
+        assert unread(client) == before + 1
+
+        notification = Notification.query.filter_by(message='Inspection booked').one()
+        notification.is_read = True
+        db.session.commit()
+        assert unread(client) == before
+
+        db.session.delete(Notification.query.filter_by(user_id=user.id, is_read=False).first())
+        db.session.commit()
+        assert unread(client) == before - 1
+        assert notifications.reconcile_unread() == {}
@@ -0,0 +1,27 @@
+import pytest
+
+from app import ROADS_MAX_PAGE_SIZE
+from tests.helpers import fetch, fetch_queries
+
+# One endpoint per entry, asked for few rows and then for every row
+ROW_COUNT_PAIRS = [
+    ('/api/roads?limit=1', f'/api/roads?limit={ROADS_MAX_PAGE_SIZE}'),
+    ('/api/roads?view=summary&limit=1', f'/api/roads?view=summary&limit={ROADS_MAX_PAGE_SIZE}'),
+    ('/api/roads/range?field=progress&min=100&max=100', '/api/roads/range?field=progress'),
+]
+
+
+@pytest.mark.parametrize('few, many', ROW_COUNT_PAIRS)
+def test_query_count_does_not_grow_with_rows(client, engines, few, many):
+    # Warm up first so lazily built in-process indexes are not counted
+    fetch(client, few)
+    counts = {}
+    rows = {}
+    for url in (few, many):
+        response, statements = fetch_queries(client, engines, url)
+        assert response.status_code == 200
+        counts[url] = len(statements)
+        rows[url] = len(response.get_json())
+    # Otherwise the check proves nothing
+    assert rows[many] > rows[few]
+    assert counts[many] == counts[few], f"Query count grows with rows returned: {counts}"
@@ -0,0 +1,39 @@
+import pytest
+
+from tests.helpers import fetch, fetch_queries, full_scans
+from utils import encode_cursor
+
+# Endpoints and the tables each may legitimately read in full (it returns all their rows)
+QUERY_PLAN_CHECKS = [
+    ('/api/roads?limit=10', ()),
+    *((f'/api/roads?sort={column}&limit=10', ()) for column in ('length', 'budget', 'status', 'start_date', 'end_date', 'progress')),
+    (f"/api/roads?sort=progress&order=desc&limit=10&after={encode_cursor(50, 1)}", ()),
+    ('/api/roads?view=summary&limit=10', ()),
+    ('/api/roads/1', ()),
+    ('/api/roads/range?field=budget&min=0', ()),
+    ('/api/road/1/milestones', ()),
+    ('/api/photos?road_id=1', ()),
+    ('/api/photos', ('photo',)),
+    ('/api/stats', ()),
+    ('/api/user', ()),
+    ('/api/notifications', ()),
+    ('/api/notifications/unread-count', ()),
+    ('/api/notifications/history?limit=10', ()),
+    (f"/api/notifications/history?limit=10&after={encode_cursor(2)}", ()),
+    ('/api/contractors', ('contractor',)),
+    ('/api/contractors/1', ()),
+    ('/api/map/roads?bbox=37.0,-1.0,39.0,1.0', ()),
+    ('/api/roads/geometry-report', ('road',)),
+]
+
+
+@pytest.mark.parametrize('url, allowed', QUERY_PLAN_CHECKS)
+def test_queries_use_indexes(client, engines, url, allowed):
+    # Warm up first so lazily built in-process indexes are not checked
+    fetch(client, url)
+    response, statements = fetch_queries(client, engines, url)
+    assert response.status_code == 200
+    selects = [entry for entry in statements if entry[1].lstrip().upper().startswith('SELECT')]
+    for engine, statement, parameters in selects:
+        scanned = [table for table in full_scans(engine, statement, parameters) if table not in allowed]
+        assert not scanned, f"{url} scans {', '.join(scanned)} in full:\n{statement}"
@@ -0,0 +1,28 @@
+from tests.helpers import fetch
+
+
+def walk_pages(client, url):
+    """Ids of every road listed by following X-Next-Cursor from url"""
+    ids = []
+    cursor = None
+    while True:
+        response = fetch(client, url + (f'&after={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        ids += [road['id'] for road in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return ids
+
+
+def test_pages_sorted_on_progress_list_every_road(client):
+    created = client.post('/api/roads', json={
+        'name': 'Nkubu Spur', 'length': 2.5, 'budget': 1000000, 'status': 'planned',
+        'start_date': '2026-01-01', 'end_date': '2026-12-31', 'description': 'Spur', 'progress': None,
+    })
+    assert created.status_code == 201
+    assert created.get_json()['progress'] == 0
+    every = {road['id'] for road in fetch(client, '/api/roads?limit=1000').get_json()}
+    for order in ('asc', 'desc'):
+        ids = walk_pages(client, f'/api/roads?sort=progress&order={order}&limit=2')
+        assert len(ids) == len(set(ids))
+        assert set(ids) == every
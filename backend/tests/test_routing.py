@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+import app as meru
+import routing
+from tests.conftest import make_config, reset_indexes, seed
+
+
+def road_row(path, road_id):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT name, progress FROM road WHERE id = ?', (road_id,)).fetchone()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / 'primary.db', tmp_path / 'replica.db'
+
+
+@pytest.fixture
+def app(tmp_path, paths, monkeypatch):
+    primary, replica = paths
+    application = meru.create_app(make_config(
+        tmp_path, SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}', DATABASE_REPLICA_URLS=[f'sqlite:///{replica}']
+    ))
+    reset_indexes()
+    seed(application)
+    with application.app_context():
+        for engine in meru.db.engines.values():
+            engine.dispose()
+    # The replica starts as a copy of the seeded primary
+    with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+        source.backup(target)
+    # Mark the replica's copy so tests can tell which database answered
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE road SET name = 'Replica copy', progress = 11 WHERE id = 1")
+    # Seeding just wrote through this process
+    monkeypatch.setattr(routing, '_last_process_write', 0.0)
+    yield application
+    with application.app_context():
+        for engine in meru.db.engines.values():
+            engine.dispose()
+    # db outlives this app; later test apps have no replica bind for create_all to find
+    for key in routing.replica_binds(application.config['DATABASE_REPLICA_URLS']):
+        meru.db.metadatas.pop(key, None)
+
+
+def test_reads_go_to_the_replica(client):
+    response = client.get('/api/roads/1')
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'Replica copy'
+
+
+def test_writes_go_to_the_primary(client, paths):
+    primary, replica = paths
+    response = client.patch('/api/roads/1/progress', json={'progress': 77})
+    assert response.status_code == 200
+    assert response.get_json()['progress'] == 77
+    assert road_row(primary, 1)[1] == 77
+    assert road_row(replica, 1) == ('Replica copy', 11)
+
+
+def test_client_reads_its_own_writes(app, client, monkeypatch):
+    client.patch('/api/roads/1/progress', json={'progress': 77})
+    # Only the client's cookie keeps it on the primary
+    monkeypatch.setattr(routing, '_last_process_write', 0.0)
+    assert client.get('/api/roads/1').get_json()['progress'] == 77
+    assert app.test_client().get('/api/roads/1').get_json()['progress'] == 11
+    # Once the lag window has passed the client reads from the replica again
+    app.config['REPLICA_LAG_WINDOW_MS'] = 0
+    assert client.get('/api/roads/1').get_json()['progress'] == 11
+
+
+def test_process_reads_its_own_writes(app, client):
+    client.patch('/api/roads/1/progress', json={'progress': 77})
+    # Another client, served by the worker that just wrote
+    assert app.test_client().get('/api/roads/1').get_json()['progress'] == 77
+    app.config['REPLICA_LAG_WINDOW_MS'] = 0
+    assert app.test_client().get('/api/roads/1').get_json()['progress'] == 11
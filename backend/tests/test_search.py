@@ -0,0 +1,58 @@
+from sqlalchemy import insert
+
+from models import db, Contractor, Road
+
+
+def new_road(client, name, description):
+    response = client.post('/api/roads', json={
+        'name': name, 'length': 1.0, 'budget': 100000, 'status': 'planned',
+        'start_date': '2026-01-01', 'end_date': '2026-12-31', 'description': description,
+    })
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def search(client, query, **params):
+    response = client.get('/api/search', query_string={'q': query, **params})
+    assert response.status_code == 200
+    return [(result['kind'], result['id']) for result in response.get_json()]
+
+
+def test_title_matches_outrank_body_matches(client):
+    body_match = new_road(client, 'Kaaga Feeder Road', 'Joins the Kithirune market road')
+    title_match = new_road(client, 'Kithirune Road', 'Gravel surface')
+    assert search(client, 'kithirune') == [('road', title_match), ('road', body_match)]
+    first, second = client.get('/api/search?q=kithi').get_json()
+    assert first['title'] == '<mark>Kithirune</mark> Road'
+    assert '<mark>Kithirune</mark>' in second['snippet']
+    assert first['score'] > second['score']
+
+
+def test_every_term_must_match_as_a_prefix(client):
+    road_id = new_road(client, 'Ntakira Gitoro Road', 'Resealing')
+    assert search(client, 'ntak gito') == [('road', road_id)]
+    assert search(client, 'ntak reseal') == [('road', road_id)]
+    assert search(client, 'ntak nowhere') == []
+
+
+def test_triggers_follow_writes(app, client):
+    road_id = new_road(client, 'Kinoru Road', 'Tarmac')
+    with app.app_context():
+        road = db.session.get(Road, road_id)
+        road.name = 'Ruiri Road'
+        db.session.commit()
+    assert search(client, 'kinoru') == []
+    assert search(client, 'ruiri') == [('road', road_id)]
+
+    with app.app_context():
+        # Core statements skip the ORM entirely; the triggers still see them
+        contractor_id = db.session.execute(
+            insert(Contractor).values(name='Ruiri Paving', contact_email='ruiri@example.com').returning(Contractor.id)
+        ).scalar()
+        db.session.commit()
+    assert search(client, 'ruiri', type='contractor') == [('contractor', contractor_id)]
+
+    with app.app_context():
+        db.session.delete(db.session.get(Road, road_id))
+        db.session.commit()
+    assert search(client, 'ruiri') == [('contractor', contractor_id)]
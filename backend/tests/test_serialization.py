@@ -0,0 +1,46 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+import serialization
+from models import db, Contractor, Notification, Photo, Road, User
+from tests.helpers import fetch
+
+# Endpoint, then the ORM rows and serialize() output it used to send
+ENDPOINTS = [
+    ('/api/roads?limit=1000', lambda: [road.serialize() for road in Road.query.order_by(Road.name, Road.id)]),
+    ('/api/roads/2', lambda: db.session.get(Road, 2).serialize()),
+    ('/api/contractors', lambda: [contractor.serialize() for contractor in Contractor.query.order_by(Contractor.id)]),
+    ('/api/photos?road_id=1', lambda: [photo.serialize() for photo in Photo.query.filter_by(road_id=1)]),
+    ('/api/notifications', lambda: [
+        notification.serialize() for notification in
+        Notification.query.join(User).filter(User.email == 'admin@meruroads.co.ke', Notification.is_read.is_(False))
+    ]),
+]
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson' and serialization.orjson is None:
+        pytest.skip('orjson is not installed')
+    if request.param == 'json':
+        monkeypatch.setattr(serialization, 'orjson', None)
+    return request.param
+
+
+@pytest.mark.parametrize('url, legacy', ENDPOINTS)
+def test_rows_match_orm_serialization(app, client, encoder, url, legacy):
+    body = fetch(client, url).get_data()
+    with app.app_context():
+        expected = legacy()
+    # Only the encoder changed; the parsed bodies must be the same
+    assert json.loads(body) == json.loads(json.dumps(expected))
+
+
+def test_dates_are_iso_8601(client, encoder):
+    # Flask's default provider would send HTTP dates such as "Sun, 15 Jan 2023 00:00:00 GMT"
+    road = fetch(client, '/api/roads/1').get_json()
+    assert date.fromisoformat(road['start_date']).isoformat() == road['start_date']
+    photo = fetch(client, '/api/photos?road_id=1').get_json()[0]
+    assert datetime.fromisoformat(photo['date_taken']).isoformat() == photo['date_taken']
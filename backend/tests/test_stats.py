@@ -0,0 +1,29 @@
+import stats
+from models import db, Road
+
+
+def live_totals():
+    live = stats.get_live_stats()
+    db.session.refresh(live)
+    return {field: getattr(live, field) for field in stats.ROAD_STATS_FIELDS}
+
+
+def test_delta_committed_during_recompute_is_counted_once(app, monkeypatch):
+    worker = stats.stats_worker
+    compute = stats.compute_road_stats_version
+
+    def racing(connection):
+        # Another request commits a road change after the recompute drained the queue but before it reads the roads
+        with monkeypatch.context() as patch:
+            patch.setattr(worker, '_enqueue', lambda: None)
+            db.session.get(Road, 1).budget += 1000
+            db.session.commit()
+        return compute(connection)
+
+    with app.app_context():
+        monkeypatch.setattr(stats, 'compute_road_stats_version', racing)
+        worker.request_recompute()
+        monkeypatch.setattr(stats, 'compute_road_stats_version', compute)
+        worker.flush()
+        assert worker.staleness()['pending_writes'] == 0
+        assert live_totals() == stats.compute_road_stats(db.session.connection())
@@ -0,0 +1,74 @@
+import random
+
+from suggest import SCAN_LIMIT, TOP_CACHE_SIZE, SuggestIndex
+
+ROADS = [
+    (1, 'Meru-Maua Road', 0),
+    (2, 'Maua Bypass', 5),
+    (3, 'Mérú Town Link', 2),
+    (4, 'Nkubu Junction', 0),
+]
+
+
+def build(roads=ROADS, contractors=(), links=()):
+    index = SuggestIndex()
+    index.build(roads, contractors, links)
+    return index
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+def test_any_word_prefix_matches_ignoring_case_and_accents():
+    index = build()
+    assert names(index.suggest('mau', kinds=('road',))) == ['Maua Bypass', 'Meru-Maua Road']
+    assert names(index.suggest('MERU', kinds=('road',))) == ['Mérú Town Link', 'Meru-Maua Road']
+    assert names(index.suggest('maua road', kinds=('road',))) == ['Meru-Maua Road']
+    assert index.suggest('ua') == []
+    assert index.suggest('  ') == []
+
+
+def test_places_rank_by_roads_naming_them_then_newest_road():
+    index = build(ROADS + [(5, 'Nkubu Kianjai Road', 0), (6, 'Mitunguu Road', 0)])
+    # Meru (roads 1 and 3) and Maua (1 and 2) tie on count, so Meru's newer road wins; Mitunguu has one
+    assert names(index.suggest('m', kinds=('place',))) == ['Meru', 'Maua', 'Mitunguu']
+    assert names(index.suggest('nk', kinds=('place',))) == ['Nkubu']
+    assert index.suggest('road', kinds=('place',)) == []
+
+
+def test_contractors_rank_by_linked_roads():
+    index = build(contractors=[(1, 'Mwangi Works'), (2, 'Murithi Builders')], links=[(1, 2), (2, 2), (3, 1)])
+    assert names(index.suggest('mu', kinds=('contractor',))) == ['Murithi Builders']
+    assert names(index.suggest('m', kinds=('contractor',))) == ['Murithi Builders', 'Mwangi Works']
+
+
+def test_top_k_matches_a_full_ranking_for_broad_prefixes():
+    rng = random.Random(7)
+    count = SCAN_LIMIT * 4
+    roads = [(i, f'Kathwana Feeder {i}', rng.randint(0, 20)) for i in range(1, count + 1)]
+    index = build(roads)
+    expected = sorted(roads, key=lambda road: (road[2], road[0]), reverse=True)
+    for limit in (1, 10, TOP_CACHE_SIZE):
+        assert [result['id'] for result in index.suggest('kath', limit, ('road',))] == [road[0] for road in expected[:limit]]
+
+    # Views and writes re-rank the cached top list in place
+    views = {road_id: road_views for road_id, _, road_views in roads}
+    last = expected[-1][0]
+    for _ in range(25):
+        index.record_view(last)
+    views[last] += 25
+    index.upsert_road(count + 1, 'Kathwana Market Road', [])
+    views[count + 1] = 0
+    expected = sorted(views, key=lambda road_id: (views[road_id], road_id), reverse=True)
+    assert [result['id'] for result in index.suggest('kath', TOP_CACHE_SIZE, ('road',))] == expected[:TOP_CACHE_SIZE]
+
+
+def test_endpoint_ranks_viewed_roads_first(client):
+    roads = client.get('/api/suggest?q=m&type=road&limit=20').get_json()
+    assert roads
+    least = roads[-1]['id']
+    for _ in range(3):
+        client.get(f'/api/roads/{least}')
+    assert client.get('/api/suggest?q=m&type=road&limit=1').get_json()[0]['id'] == least
+    assert client.get('/api/suggest?q=m&type=bridge').status_code == 400
@@ -0,0 +1,50 @@
+import math
+import os
+
+import versions
+from models import db, Road
+from tiles import lonlat_to_tile, tile_cache
+
+ZOOM = 14
+
+
+def tile_at(lon, lat):
+    return tuple(math.floor(value) for value in lonlat_to_tile([[lon, lat]], ZOOM)[0])
+
+
+def tile_url(x, y):
+    return f'/api/map/tiles/{ZOOM}/{x}/{y}.mvt'
+
+
+def current_version(app):
+    with app.app_context():
+        return versions.tracker.current(versions.ROADS)
+
+
+# On Maua Highway (road 1) only, and on Nkubu Bypass only
+MAUA = tile_at(37.65, 0.06)
+NKUBU = tile_at(37.62, -0.02)
+
+
+def test_tiles_follow_writes_from_other_processes(app, client):
+    assert b'Maua Highway' in client.get(tile_url(*MAUA)).get_data()
+    # Committed like another worker's write: this process's after_road_commit never runs
+    with app.app_context():
+        db.session.get(Road, 1).name = 'Kianjai Link'
+        db.session.commit()
+    data = client.get(tile_url(*MAUA)).get_data()
+    assert b'Kianjai Link' in data and b'Maua Highway' not in data
+
+
+def test_own_write_carries_untouched_tiles_forward(app, client):
+    client.get(tile_url(*MAUA))
+    client.get(tile_url(*NKUBU))
+    version = current_version(app)
+    assert os.path.exists(tile_cache.path(version, ZOOM, *NKUBU))
+
+    assert client.patch('/api/roads/1/progress', json={'progress': 99}).status_code == 200
+    assert current_version(app) == version + 1
+    assert os.path.exists(tile_cache.path(version + 1, ZOOM, *NKUBU))
+    assert not os.path.exists(tile_cache.path(version + 1, ZOOM, *MAUA))
+    assert not os.path.exists(tile_cache.path(version, ZOOM, *NKUBU))
+    assert client.get(tile_url(*MAUA)).status_code == 200
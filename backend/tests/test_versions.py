@@ -0,0 +1,81 @@
+import sqlite3
+
+import app as meru
+import versions
+from models import db, Road
+
+
+def database_path(app):
+    return app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+
+
+def shared_version(app):
+    with sqlite3.connect(database_path(app)) as connection:
+        return connection.execute("SELECT version FROM data_version WHERE name = 'roads'").fetchone()[0]
+
+
+def test_orm_write_bumps_version_once_per_transaction(app):
+    before = shared_version(app)
+    with app.app_context():
+        for road in Road.query.all():
+            road.progress = 50
+            db.session.flush()
+        db.session.commit()
+        assert versions.committed(db.session, versions.ROADS) == before + 1
+    assert shared_version(app) == before + 1
+
+
+def test_indexes_follow_writes_from_other_processes(app, client):
+    def map_ids():
+        features = client.get('/api/map/roads?bbox=38.0,1.0,38.1,1.1').get_json()['features']
+        return [feature['properties']['id'] for feature in features]
+
+    assert 1 not in [road['id'] for road in client.get('/api/roads/range?field=progress&min=99').get_json()]
+    assert client.get('/api/suggest?q=kianjai&type=road').get_json() == []
+    assert 1 not in map_ids()
+
+    # Committed like another worker's write: this process's after_road_commit never runs
+    with app.app_context():
+        road = db.session.get(Road, 1)
+        road.progress = 99
+        road.name = 'Kianjai Link'
+        road.map_coordinates = [[38.05, 1.05], [38.06, 1.06]]
+        db.session.commit()
+
+    assert 1 in [road['id'] for road in client.get('/api/roads/range?field=progress&min=99').get_json()]
+    assert [match['id'] for match in client.get('/api/suggest?q=kianjai&type=road').get_json()] == [1]
+    assert 1 in map_ids()
+
+
+def test_own_write_is_applied_in_place(app, client):
+    client.get('/api/roads/range?field=progress')
+    built = meru.road_index.version
+    response = client.patch('/api/roads/1/progress', json={'progress': 99})
+    assert response.status_code == 200
+    # Advanced to the new version rather than dropped for a rebuild
+    assert meru.road_index.version == built + 1 == shared_version(app)
+    assert 1 in [road['id'] for road in client.get('/api/roads/range?field=progress&min=99').get_json()]
+
+
+def test_views_are_shared(app, client):
+    client.get('/api/roads/2')
+    client.get('/api/roads/2')
+    with sqlite3.connect(database_path(app)) as connection:
+        assert connection.execute('SELECT view_count FROM road WHERE id = 2').fetchone()[0] == 2
+
+
+def test_missing_roads_are_not_counted(app, client):
+    assert client.get('/api/roads/999999').status_code == 404
+    assert 999999 not in meru.suggestions._views
+    assert 999999 not in meru.stats.view_counter._pending
+
+
+def test_map_payload_follows_writes_from_other_processes(app, client):
+    def names():
+        return {feature['properties']['name'] for feature in client.get('/api/map/roads').get_json()['features']}
+
+    assert 'Kianjai Link' not in names()
+    with app.app_context():
+        db.session.get(Road, 1).name = 'Kianjai Link'
+        db.session.commit()
+    assert 'Kianjai Link' in names()
@@ -0,0 +1,49 @@
+"""Image resizing run in the media worker processes.
+
+Kept free of Flask and database imports: the pool starts its workers with
+'spawn', and each one imports only this module.
+"""
+import os
+
+from PIL import Image, ImageOps
+
+FORMAT = 'WEBP'
+EXTENSION = '.webp'
+MIMETYPE = 'image/webp'
+QUALITY = 80
+
+ORIENTATION = 0x0112
+# EXIF orientations that swap width and height
+ROTATED = (5, 6, 7, 8)
+
+# Decompression-bomb guard; road photos from phones are well under this
+Image.MAX_IMAGE_PIXELS = 80_000_000
+
+
+def render_thumbnails(source, widths, out_dir):
+    """Write a copy of source scaled to each width narrower than it.
+
+    Returns (original width, [(width, path), ...]) with paths in out_dir.
+    """
+    with Image.open(source) as image:
+        original_width, original_height = image.size
+        if image.getexif().get(ORIENTATION) in ROTATED:
+            original_width, original_height = original_height, original_width
+        widths = sorted((width for width in widths if width < original_width), reverse=True)
+        if not widths:
+            return original_width, []
+        # Decoding a JPEG at a reduced scale is far cheaper than resizing its full-size pixels
+        image.draft('RGB', (widths[0], widths[0]))
+        # Phones record rotation in EXIF rather than in the pixels
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        outputs = []
+        for width in widths:
+            height = max(1, round(original_height * width / original_width))
+            # Each size is scaled from the next larger one, not from the original
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            path = os.path.join(out_dir, f'{width}{EXTENSION}')
+            image.save(path, FORMAT, quality=QUALITY, method=4)
+            outputs.append((width, path))
+    return original_width, outputs
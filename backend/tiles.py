@@ -0,0 +1,256 @@
+"""Mapbox Vector Tile (v2) encoding and an on-disk tile cache for the road network.
+
+The MVT format is a small protobuf schema, so it is written directly here
+rather than pulling in a protobuf toolchain.
+"""
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+EXTENT = 4096
+
+# Features within this many tile units outside the tile are included so
+# lines are not cut visibly at tile edges
+BUFFER = 64
+
+# Deeper tiles would push tile-space coordinates past 32 bits
+MAX_ZOOM = 18
+
+LINESTRING = 2
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint(number << 3 | wire_type)
+
+
+def _varint_field(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _bytes_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(value) for value in values))
+
+
+def _value(value):
+    """Encode a property value as an MVT Value message"""
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    if isinstance(value, int):
+        return _varint_field(5, value) if value >= 0 else _varint_field(6, _zigzag(value))
+    if isinstance(value, float):
+        return _field(3, 1) + np.float64(value).tobytes()
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def _line_geometry(points):
+    """MoveTo/LineTo command stream for integer tile-space points"""
+    deltas = np.diff(points, axis=0, prepend=[[0, 0]])
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    commands = [(1 & 0x7) | (1 << 3), int(zigzag[0, 0]), int(zigzag[0, 1])]
+    commands.append((2 & 0x7) | ((len(points) - 1) << 3))
+    commands.extend(int(v) for v in zigzag[1:].ravel())
+    return commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Encode one layer from (id, properties, points) features into tile bytes"""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+    for feature_id, properties, points in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags.extend((key_index[key], value_index[value_key]))
+        encoded_features.append(
+            _varint_field(1, feature_id)
+            + _packed_field(2, tags)
+            + _varint_field(3, LINESTRING)
+            + _packed_field(4, _line_geometry(points))
+        )
+    layer = (
+        _varint_field(15, 2)
+        + _bytes_field(1, name.encode('utf-8'))
+        + b''.join(_bytes_field(2, feature) for feature in encoded_features)
+        + b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+        + b''.join(_bytes_field(4, _value(value)) for value in values)
+        + _varint_field(5, extent)
+    )
+    return _bytes_field(3, layer)
+
+
+def lonlat_to_tile(coordinates, z):
+    """Fractional web-mercator tile coordinates for [lon, lat] pairs"""
+    points = np.asarray(coordinates, dtype=float)
+    scale = 2 ** z
+    lat = np.radians(np.clip(points[:, 1], -85.0511, 85.0511))
+    x = (points[:, 0] + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * scale
+    return np.column_stack((x, y))
+
+
+def tile_bounds(z, x, y, buffer=BUFFER, extent=EXTENT):
+    """(min_lon, min_lat, max_lon, max_lat) of a tile grown by buffer tile units"""
+    pad = buffer / extent
+    scale = 2 ** z
+
+    def lon(tx):
+        return tx / scale * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / scale))))
+
+    return (lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad))
+
+
+def tile_range(box, z, buffer=BUFFER, extent=EXTENT):
+    """Tile columns and rows at zoom z whose buffered extent touches box"""
+    corners = lonlat_to_tile([[box[0], box[3]], [box[2], box[1]]], z)
+    pad = buffer / extent
+    last = 2 ** z - 1
+    x0, y0 = (max(0, math.floor(v - pad)) for v in corners[0])
+    x1, y1 = (min(last, math.floor(v + pad)) for v in corners[1])
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def road_tile_features(roads, z, x, y, extent=EXTENT):
+    """(id, properties, points) for each road, projected into tile z/x/y"""
+    for road in roads:
+        coordinates = road.coordinates_for_zoom(z)
+        if not coordinates or len(coordinates) < 2:
+            continue
+        tile_points = (lonlat_to_tile(coordinates, z) - (x, y)) * extent
+        points = np.round(tile_points).astype(np.int64)
+        # Vertices that collapse onto the same tile unit add nothing
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(np.diff(points, axis=0) != 0, axis=1)
+        points = points[keep]
+        if len(points) < 2:
+            continue
+        properties = {'id': road.id, 'name': road.name, 'status': road.status, 'progress': road.progress}
+        yield road.id, properties, points
+
+
+class TileCache:
+    """Encoded tiles stored as {root}/{version}/{z}/{x}/{y}.mvt.
+
+    version is the shared data version the tiles were rendered at, so a
+    worker whose road index is behind never serves or overwrites tiles of a
+    newer one, and a write by any process sends every reader to a new
+    directory. The writer carries the tiles its write did not touch forward
+    with advance(); directories older than the previous version are pruned.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, str(version))
+
+    def path(self, version, z, x, y):
+        return os.path.join(self._version_dir(version), str(z), str(x), f'{y}.mvt')
+
+    def get(self, version, z, x, y, build):
+        """Path of the cached tile, building and storing it first if missing"""
+        path = self.path(version, z, x, y)
+        if not os.path.exists(path):
+            data = build()
+            new_version = not os.path.isdir(self._version_dir(version))
+            try:
+                self._write(path, data)
+            except FileNotFoundError:
+                # Pruned by a worker on a newer version while we wrote
+                self._write(path, data)
+            if new_version:
+                self.prune(version)
+        return path
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial tile
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def advance(self, old_version, new_version, boxes):
+        """Reuse tiles rendered at old_version for new_version, deleting those touching any of boxes.
+
+        Only valid when new_version differs from old_version by the write
+        that changed boxes. Returns False if there was nothing to reuse or
+        new_version already has tiles.
+        """
+        if self.root is None:
+            return False
+        try:
+            # Atomic, and fails if another worker already rendered tiles at new_version
+            os.rename(self._version_dir(old_version), self._version_dir(new_version))
+        except OSError:
+            return False
+        for box in boxes:
+            self.invalidate(new_version, box)
+        self.prune(new_version)
+        return True
+
+    def prune(self, version):
+        """Delete tiles of versions before the one preceding version"""
+        if self.root is None or not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if entry.name.isdigit() and int(entry.name) < version - 1:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def invalidate(self, version, box):
+        """Delete cached tiles of version at every zoom whose buffered extent touches box"""
+        root = self._version_dir(version) if self.root is not None else None
+        if root is None or box is None or not os.path.isdir(root):
+            return 0
+        removed = 0
+        for zoom_entry in os.scandir(root):
+            if not zoom_entry.name.isdigit():
+                continue
+            columns, rows = tile_range(box, int(zoom_entry.name))
+            # Walk only what is cached, which is far smaller than the range at deep zooms
+            for column_entry in os.scandir(zoom_entry.path):
+                if not column_entry.name.isdigit() or int(column_entry.name) not in columns:
+                    continue
+                for tile_entry in os.scandir(column_entry.path):
+                    row = tile_entry.name.split('.', 1)[0]
+                    if row.isdigit() and int(row) in rows:
+                        os.remove(tile_entry.path)
+                        removed += 1
+        return removed
+
+
+tile_cache = TileCache()
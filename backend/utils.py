@@ -1,76 +1,127 @@
-def quick_sort(arr, key_func, reverse=False):
-    """In-place QuickSort implementation with custom key function"""
-    if len(arr) <= 1:
-        return arr
-    
-    pivot = arr[len(arr) // 2]
-    if reverse:
-        left = [x for x in arr if key_func(x) > key_func(pivot)]
-        middle = [x for x in arr if key_func(x) == key_func(pivot)]
-        right = [x for x in arr if key_func(x) < key_func(pivot)]
-    else:
-        left = [x for x in arr if key_func(x) < key_func(pivot)]
-        middle = [x for x in arr if key_func(x) == key_func(pivot)]
-        right = [x for x in arr if key_func(x) > key_func(pivot)]
-    
-    return quick_sort(left, key_func, reverse) + middle + quick_sort(right, key_func, reverse)
+import base64
+import json
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
 
-def binary_search(arr, x, key_func):
-    """Binary search with custom key function"""
-    low = 0
-    high = len(arr) - 1
-    mid = 0
-    
-    while low <= high:
-        mid = (high + low) // 2
-        mid_val = key_func(arr[mid])
-        
-        if mid_val < x:
-            low = mid + 1
-        elif mid_val > x:
-            high = mid - 1
-        else:
-            return arr[mid]
-    return None
-
-def sort_and_search_roads(roads, sort_by='name', search_query=None, reverse=False):
-    """Sort roads using QuickSort and search using Binary Search"""
-    # Sort roads
-    key_func = lambda road: getattr(road, sort_by).lower() if isinstance(getattr(road, sort_by), str) else getattr(road, sort_by)
-    sorted_roads = quick_sort(roads, key_func, reverse)
-    
-    # Search if query provided
-    if search_query:
-        if sort_by in ['name', 'status']:
-            # For string fields, use partial matching
-            return [road for road in sorted_roads if search_query.lower() in getattr(road, sort_by).lower()]
-        else:
-            # For numeric fields, use exact match
-            return binary_search(sorted_roads, search_query, key_func)
-    
-    return sorted_roads
+
+ROAD_INDEX_COLUMNS = ('name', 'length', 'budget', 'status', 'start_date', 'end_date', 'progress')
+
+def index_key(value):
+    """Sort key used by RoadIndex: strings compare case-insensitively"""
+    return value.lower() if isinstance(value, str) else value
+
+class RoadIndex:
+    """Roads kept pre-sorted by every sortable column for in-memory range queries.
+
+    Each column holds a sorted list of (key, road_id) pairs, so lookups are a
+    pair of bisects and ties keep every matching road instead of the first.
+    """
+
+    def __init__(self, columns=ROAD_INDEX_COLUMNS):
+        self.columns = tuple(columns)
+        self._rows = {}
+        self._keys = {column: [] for column in self.columns}
+        self._lock = threading.RLock()
+        self.loaded = False
+        # Shared data version (versions.py) the contents match
+        self.version = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, road_id):
+        return road_id in self._rows
+
+    def _values(self, road):
+        if isinstance(road, dict):
+            return tuple(index_key(road.get(column)) for column in self.columns)
+        return tuple(index_key(getattr(road, column)) for column in self.columns)
+
+    def build(self, roads):
+        """Replace the index contents with roads using one decorate-sort per column"""
+        rows = {}
+        for road in roads:
+            road_id = road['id'] if isinstance(road, dict) else road.id
+            rows[road_id] = self._values(road)
+        keys = {}
+        for position, column in enumerate(self.columns):
+            keys[column] = sorted(
+                (values[position], road_id) for road_id, values in rows.items()
+                if values[position] is not None
+            )
+        with self._lock:
+            self._rows = rows
+            self._keys = keys
+            self.loaded = True
+
+    def _discard(self, road_id):
+        old_values = self._rows.pop(road_id, None)
+        if old_values is None:
+            return
+        for position, column in enumerate(self.columns):
+            if old_values[position] is None:
+                continue
+            keys = self._keys[column]
+            i = bisect_left(keys, (old_values[position], road_id))
+            if i < len(keys) and keys[i] == (old_values[position], road_id):
+                del keys[i]
+
+    def upsert(self, road):
+        """Insert or re-position a single road after it was created or changed"""
+        road_id = road['id'] if isinstance(road, dict) else road.id
+        values = self._values(road)
+        with self._lock:
+            self._discard(road_id)
+            self._rows[road_id] = values
+            for position, column in enumerate(self.columns):
+                if values[position] is not None:
+                    insort(self._keys[column], (values[position], road_id))
+
+    def remove(self, road_id):
+        with self._lock:
+            self._discard(road_id)
+
+    def range(self, column, low=None, high=None, reverse=False):
+        """Return ids of every road whose column lies in [low, high], in sort order"""
+        with self._lock:
+            keys = self._keys[column]
+            start = 0 if low is None else bisect_left(keys, (index_key(low),))
+            stop = len(keys) if high is None else bisect_right(keys, (index_key(high), math.inf))
+            ids = [road_id for _, road_id in keys[start:stop]]
+        if reverse:
+            ids.reverse()
+        return ids
+
+    def sorted_ids(self, column, reverse=False):
+        """Return every indexed road id ordered by column"""
+        return self.range(column, reverse=reverse)
+
+ROAD_STATS_FIELDS = ('total_roads', 'completed_roads', 'in_progress_roads', 'planned_roads',
+                     'budget_allocated', 'budget_spent')
+
+def road_stats_contribution(status, budget, progress):
+    """Amount a single road adds to each RoadStats field"""
+    progress = progress or 0
+    return {
+        'total_roads': 1,
+        'completed_roads': 1 if status == 'completed' else 0,
+        'in_progress_roads': 1 if status == 'ongoing' else 0,
+        'planned_roads': 1 if status == 'planned' else 0,
+        'budget_allocated': budget,
+        # Whole shillings per road so running totals match a full recompute exactly
+        'budget_spent': budget * progress // 100
+    }
 
 def calculate_road_stats(roads):
     """Calculate statistics based on road data"""
-    stats = {
-        'total_roads': len(roads),
-        'completed_roads': 0,
-        'in_progress_roads': 0,
-        'planned_roads': 0,
-        'budget_allocated': 0,
-        'budget_spent': 0
-    }
+    stats = dict.fromkeys(ROAD_STATS_FIELDS, 0)
     
     for road in roads:
-        stats['budget_allocated'] += road.budget
-        stats['budget_spent'] += road.budget * (road.progress / 100)
-        
-        if road.status == 'completed':
-            stats['completed_roads'] += 1
-        elif road.status == 'ongoing':
-            stats['in_progress_roads'] += 1
-        elif road.status == 'planned':
-            stats['planned_roads'] += 1
+        contribution = road_stats_contribution(road.status, road.budget, road.progress)
+        for field in ROAD_STATS_FIELDS:
+            stats[field] += contribution[field]
     
     return stats
 
@@ -80,4 +131,26 @@ def format_currency(amount):
 
 def format_date(date_obj):
     """Format date for display"""
-    return date_obj.strftime('%b %d, %Y')
\ No newline at end of file
+    return date_obj.strftime('%b %d, %Y')
+
+def like_pattern(text):
+    """Build a LIKE pattern matching text anywhere, escaping SQL wildcards"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def encode_cursor(*values):
+    """Encode keyset position values as an opaque URL-safe cursor"""
+    values = [v.isoformat() if isinstance(v, date) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
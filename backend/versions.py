@@ -0,0 +1,116 @@
+"""Shared version counters for data that workers cache in process.
+
+RoadIndex, GridIndex, LineMetricsCache and SuggestIndex are built from the
+road tables and kept in each worker. Every transaction that changes those
+tables bumps the 'roads' row of data_version, so a worker can tell its
+copies are stale whichever process (or CLI command) made the change.
+
+ORM writes are bumped by a flush hook; bulk statements, which skip the
+flush, call touch() themselves. Workers read the version at most once per
+DATA_VERSION_CHECK_MS and rebuild what was built at an older one. After its
+own commit a worker knows the new version at once (committed()), so it can
+apply the write to copies that were current just before it instead of
+rebuilding them.
+"""
+import threading
+import time
+
+from sqlalchemy import event, insert, select, update
+
+from models import db, Contractor, DataVersion, Road
+
+ROADS = 'roads'
+
+# Models whose rows feed each dataset
+DATASETS = {ROADS: (Road, Contractor)}
+
+data_version = DataVersion.__table__
+
+
+def bump(session, name):
+    """Add one to name's version inside the session's transaction; returns the new version"""
+    result = session.execute(
+        update(data_version).where(data_version.c.name == name).values(version=data_version.c.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(data_version).values(name=name, version=1))
+    return session.execute(select(data_version.c.version).where(data_version.c.name == name)).scalar()
+
+
+def touch(session, name):
+    """Mark name as changed by the session's transaction, bumping its version once per transaction"""
+    pending = session.info.setdefault('data_versions', {})
+    if name not in pending:
+        pending[name] = bump(session, name)
+
+
+def _changed(session, models):
+    return (
+        any(isinstance(obj, models) for obj in session.new)
+        or any(isinstance(obj, models) for obj in session.deleted)
+        or any(isinstance(obj, models) and session.is_modified(obj) for obj in session.dirty)
+    )
+
+
+def track_versions(session, flush_context):
+    for name, models in DATASETS.items():
+        if _changed(session, models):
+            touch(session, name)
+
+
+def publish_versions(session):
+    committed = session.info.pop('data_versions', {})
+    session.info['committed_versions'] = committed
+    for name, version in committed.items():
+        tracker.seen(name, version)
+
+
+def discard_versions(session):
+    session.info.pop('data_versions', None)
+
+
+def committed(session, name):
+    """Version of name made by the session's last commit, or None if it did not change name"""
+    return session.info.get('committed_versions', {}).get(name)
+
+
+class VersionTracker:
+    """This process's view of the shared versions, re-read at most once per interval"""
+
+    def __init__(self, interval_ms=1000):
+        self.interval = interval_ms / 1000
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config.get('DATA_VERSION_CHECK_MS', 1000) / 1000
+
+    def current(self, name):
+        """Version of name, read through db.session so it matches the rows read next"""
+        known = self._known.get(name)
+        if known is not None and time.monotonic() - known[1] < self.interval:
+            return known[0]
+        version = db.session.execute(select(data_version.c.version).where(data_version.c.name == name)).scalar()
+        version = version or 0
+        with self._lock:
+            self._known[name] = (version, time.monotonic())
+        return version
+
+    def seen(self, name, version):
+        """Record a version this process just committed"""
+        with self._lock:
+            known = self._known.get(name)
+            if known is None or version > known[0]:
+                self._known[name] = (version, time.monotonic())
+
+
+tracker = VersionTracker()
+
+
+def init_app(app):
+    """Bump dataset versions in the transactions that change them"""
+    tracker.init_app(app)
+    if not event.contains(db.session, 'after_flush', track_versions):
+        event.listen(db.session, 'after_flush', track_versions)
+        event.listen(db.session, 'after_commit', publish_versions)
+        event.listen(db.session, 'after_rollback', discard_versions)
@@ -32,12 +32,23 @@ export const api = {
   getRoad: (id) => 
     fetchData(`/roads/${id}`),
   
+  // Typeahead for the search box; served from memory, cheap enough per keystroke
+  getSuggestions: (query, limit = 10) => 
+    fetchData(`/suggest?q=${encodeURIComponent(query)}&limit=${limit}`),
+  
   updateProgress: (id, progress) => 
     fetchData(`/roads/${id}/progress`, {
       method: 'PATCH',
       body: JSON.stringify({ progress })
     }),
   
+  // Batched {roads: [{id, progress, status}], stats} deltas; {reload: true} means refetch
+  streamRoadEvents: (onMessage) => {
+    const source = new EventSource(`${API_BASE}/roads/events`);
+    source.addEventListener('roads', (event) => onMessage(JSON.parse(event.data)));
+    return source;
+  },
+  
   // Stats endpoint
   getStats: () => 
     fetchData('/stats'),
@@ -49,6 +60,33 @@ export const api = {
   getNotifications: () => 
     fetchData('/notifications'),
   
+  // Badge count from the user's maintained counter
+  getUnreadCount: () => 
+    fetchData('/notifications/unread-count'),
+  
+  // Newest first; pass the returned `next` back as `after` for the following page
+  getNotificationHistory: async (after = null, limit = 50) => {
+    const response = await fetch(`${API_BASE}/notifications/history?limit=${limit}${after ? `&after=${after}` : ''}`);
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    return { items: await response.json(), next: response.headers.get('X-Next-Cursor') };
+  },
+  
+  // Either a list of ids, or { before: id } to mark everything up to an id
+  markNotificationsRead: ({ ids = [], before = null } = {}) => 
+    fetchData('/notifications/read', {
+      method: 'POST',
+      body: JSON.stringify({ ids, before })
+    }),
+  
+  // Pushes each new notification; EventSource reconnects and resumes via Last-Event-ID
+  streamNotifications: (onNotification) => {
+    const source = new EventSource(`${API_BASE}/notifications/stream`);
+    source.addEventListener('notification', (event) => onNotification(JSON.parse(event.data)));
+    return source;
+  },
+  
   // Photo endpoints
   getPhotos: (roadId = null) => 
     fetchData(`/photos${roadId ? `?road_id=${roadId}` : ''}`),
@@ -59,6 +97,19 @@ export const api = {
       body: JSON.stringify({ url, caption })
     }),
   
+  // Sends the file as the raw body; the photo's srcset is null until its thumbnails are made
+  uploadPhoto: async (roadId, file, caption = '') => {
+    const response = await fetch(`${API_BASE}/roads/${roadId}/photos/upload?caption=${encodeURIComponent(caption)}`, {
+      method: 'POST',
+      headers: { 'Content-Type': file.type },
+      body: file
+    });
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    return response.json();
+  },
+  
   // Map data
   getMapRoads: () => 
     fetchData('/map/roads'),